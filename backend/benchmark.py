@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Offline benchmarks for the checker's parsing and history code.
+
+Every PDF in report_fixtures/ is timed through the fetch-free parse path
+(full pdfplumber table extraction, the layout-template fast path and
+parse_beach_rows), followed by determine_status_from_indicator, validate_status
+and the history read/write functions on generated data. Each stage reports the
+median wall time and the peak memory allocated while it runs.
+
+Results can be saved as a baseline and later runs are compared against it;
+a stage that gets slower than the threshold makes the run exit with status 1.
+
+Usage:
+    python benchmark.py [--runs N] [--save-baseline] [--threshold 0.25]
+    python benchmark.py record      # save the live report into report_fixtures/ (needs network)
+"""
+
+import os
+import io
+import csv
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta, timezone
+
+import pdfplumber
+
+from check_status import (
+    BEACH_COORDINATES, PDF_URL, determine_status_from_indicator, validate_status, parse_beach_rows
+)
+from pdf_layout import find_report_table, learn_layout_template, extract_table_with_template
+from history_writer import HistoryWriter
+from daily_snapshot_helper import load_last_logged_dates
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(BACKEND_DIR, 'report_fixtures')
+BASELINE_FILE = os.path.join(BACKEND_DIR, 'benchmark_baseline.json')
+
+HISTORY_ROWS = 100_000
+CLASSIFY_SAMPLES = 10_000
+
+
+def measure(function, runs):
+    """Returns (median seconds, peak bytes) for function; memory is traced on a separate run."""
+    with redirect_stdout(io.StringIO()):
+        tracemalloc.start()
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            function()
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    return timings[len(timings) // 2], peak
+
+
+def _open_page(pdf_bytes, extract):
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        return extract(pdf.pages[0])
+
+
+def parse_stages(pdf_path):
+    """Stages for one report fixture."""
+    with open(pdf_path, 'rb') as f:
+        pdf_bytes = f.read()
+    name = os.path.splitext(os.path.basename(pdf_path))[0]
+
+    def learn(page):
+        table = find_report_table(page)
+        return table.extract(), learn_layout_template(page, table)
+
+    table, template = _open_page(pdf_bytes, learn)
+
+    return [
+        (f"parse_full[{name}]", lambda: _open_page(pdf_bytes, lambda page: find_report_table(page).extract())),
+        (f"parse_template[{name}]", lambda: _open_page(pdf_bytes, lambda page: extract_table_with_template(page, template))),
+        (f"parse_beach_rows[{name}]", lambda: parse_beach_rows(table)),
+    ]
+
+
+def classify_stages():
+    indicators = ["🟢", "🟡", "🔴", "⚫", "", None, "Open 🟢"] * (CLASSIFY_SAMPLES // 7)
+    notes = [("unknown", "Open"), ("green", "Alert Category 2 BGA level"),
+             ("green", "Closed due to E. coli"), ("yellow", ""), ("red", "Advisory posted")] * (CLASSIFY_SAMPLES // 5)
+    return [
+        ("determine_status_from_indicator", lambda: [determine_status_from_indicator(i) for i in indicators]),
+        ("validate_status", lambda: [validate_status(status, note) for status, note in notes]),
+    ]
+
+
+def history_stages(work_dir):
+    """Stages for the history CSV, run against generated files in work_dir."""
+    beach_names = list(BEACH_COORDINATES)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    rows = [
+        {
+            'beach_name': beach_names[index % len(beach_names)],
+            'status': 'green',
+            'date': 'Aug 1 2025 10:00AM',
+            'note': 'Open'
+        }
+        for index in range(HISTORY_ROWS)
+    ]
+    times = [start + timedelta(minutes=6 * index) for index in range(HISTORY_ROWS)]
+
+    read_file = os.path.join(work_dir, 'history_read.csv')
+    writer = HistoryWriter(read_file)
+    for row, record_time in zip(rows, times):
+        writer.add(row, record_time=record_time)
+    writer.flush()
+
+    write_file = os.path.join(work_dir, 'history_write.csv')
+
+    def write_history():
+        if os.path.exists(write_file):
+            os.remove(write_file)
+        history = HistoryWriter(write_file)
+        for row, record_time in zip(rows, times):
+            history.add(row, record_time=record_time)
+        history.flush()
+
+    def read_full_history():
+        with open(read_file, 'r', newline='', encoding='utf-8') as f:
+            return sum(1 for _ in csv.DictReader(f))
+
+    return [
+        (f"history_write[{HISTORY_ROWS}]", write_history),
+        (f"history_read_full[{HISTORY_ROWS}]", read_full_history),
+        (f"load_last_logged_dates[{HISTORY_ROWS}]", lambda: load_last_logged_dates(beach_names, history_file=read_file)),
+    ]
+
+
+def run_benchmarks(runs):
+    fixtures = sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.pdf')))
+    if not fixtures:
+        print(f"No report fixtures found in {FIXTURES_DIR}. Run: python synthetic_report.py fixtures")
+
+    work_dir = tempfile.mkdtemp(prefix='beach-benchmark-')
+    try:
+        stages = [stage for path in fixtures for stage in parse_stages(path)]
+        stages += classify_stages()
+        stages += history_stages(work_dir)
+
+        results = {}
+        for name, function in stages:
+            seconds, peak = measure(function, runs)
+            results[name] = {'ms': round(seconds * 1000, 3), 'peak_kb': round(peak / 1024, 1)}
+        return results
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def report(results, baseline, threshold):
+    """Prints the results next to the baseline and returns the names of regressed stages."""
+    regressions = []
+    print(f"{'stage':<45} {'ms':>10} {'peak KB':>10} {'baseline':>10} {'change':>8}")
+    for name, result in results.items():
+        line = f"{name:<45} {result['ms']:>10.3f} {result['peak_kb']:>10.1f}"
+        previous = baseline.get(name)
+        if previous and previous['ms'] > 0:
+            change = (result['ms'] - previous['ms']) / previous['ms']
+            line += f" {previous['ms']:>10.3f} {change:>+7.0%}"
+            if change > threshold:
+                line += "  ⚠️ slower"
+                regressions.append(name)
+        print(line)
+    return regressions
+
+
+def record_live_report():
+    """Downloads the live report into report_fixtures/, named by date and content hash."""
+    import hashlib
+    import requests
+
+    response = requests.get(PDF_URL, timeout=20)
+    response.raise_for_status()
+    digest = hashlib.sha256(response.content).hexdigest()[:12]
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    path = os.path.join(FIXTURES_DIR, f"recorded_{datetime.now(timezone.utc):%Y%m%d}_{digest}.pdf")
+    if os.path.exists(path):
+        print(f"Report already recorded as {path}")
+        return
+    with open(path, 'wb') as f:
+        f.write(response.content)
+    print(f"✅ Recorded live report to {path} ({len(response.content)} bytes)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline parsing and history benchmarks")
+    parser.add_argument("command", nargs="?", default="run", choices=["run", "record"])
+    parser.add_argument("--runs", type=int, default=10, help="timed runs per stage (median is reported)")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown before a stage is flagged")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record_live_report()
+        sys.exit(0)
+
+    results = run_benchmarks(args.runs)
+
+    try:
+        with open(BASELINE_FILE, 'r') as f:
+            baseline = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        baseline = {}
+
+    regressions = report(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {BASELINE_FILE}")
+    elif regressions:
+        print(f"❌ {len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
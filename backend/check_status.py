@@ -1,22 +1,37 @@
 import requests
-import pdfplumber
 import io
+import re
 import os
 import json
-import csv
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from datetime import datetime, timezone
+import time
+
+from history_writer import HistoryWriter, HISTORY_FILE
+from history_rollups import update_history_rollup
+from status_feed import publish_status
+from subscribers import sync_subscribers, load_subscriber_cache, build_beach_index
+from notification_dispatcher import NotificationDispatcher, make_job, enqueue_outbox, drain_outbox, OUTBOX_FILE
+from notification_digest import DigestScheduler, digest_mode_enabled
+from report_fetcher import REPORT_CACHE_FILE
+from report_sources import register_source, load_source_config, fetch_sources, commit_report_cache
+import http_transport
+from metrics import begin_run, end_run, record, stage
+from pdf_layout import (
+    LAYOUT_TEMPLATE_FILE, load_layout_template, save_layout_template, learn_layout_template,
+    find_report_table, extract_table_with_template, table_matches_beaches
+)
 
 # Import daily snapshot helper
 try:
-    from daily_snapshot_helper import should_log_daily_snapshot
+    from daily_snapshot_helper import should_log_daily_snapshot, load_last_logged_dates
 except ImportError:
-    def should_log_daily_snapshot(beach_name):
+    def should_log_daily_snapshot(beach_name, last_logged=None, now=None):
         """Fallback function if helper module isn't available"""
         return False
 
+    def load_last_logged_dates(beach_names=None):
+        """Fallback function if helper module isn't available"""
+        return {}
+
 # Try to load environment variables from .env file if it exists
 try:
     from dotenv import load_dotenv
@@ -26,16 +41,29 @@ except ImportError:
     pass
 
 NTFY_TOPIC = "lakewood-beach-water-quality-report"
-CLOUDFLARE_WORKER_URL = "https://beach-api.terrencefradet.workers.dev"
+NTFY_URL = os.environ.get("NTFY_URL", "https://ntfy.sh")
+CLOUDFLARE_WORKER_URL = os.environ.get("CLOUDFLARE_WORKER_URL", "https://beach-api.terrencefradet.workers.dev")
 CF_API_TOKEN = os.environ.get("CF_API_TOKEN")
 PDF_TARGET_BEACH = "Leddy Beach South"
 DISPLAY_BEACH_NAME = "Lakewood Beach"
 PDF_URL = "https://anrweb.vt.gov/FPR/SwimWater/CityOfBurlingtonPublicReport.aspx"
 STATUS_FILE = "current_status.txt"
+# Set FORCE_REPORT_REFRESH=true to ignore the cache and parse the report even if it hasn't changed
+FORCE_REPORT_REFRESH = os.environ.get("FORCE_REPORT_REFRESH", "false").lower() == "true"
+# Optional SQLite mirror of the history CSV (see history_db.py)
+HISTORY_DB_FILE = os.environ.get("HISTORY_DB_FILE")
+
+# Results returned by main(); the watcher (watcher.py) adapts its polling to them
+CHECK_FAILED = "failed"
+CHECK_UNCHANGED = "unchanged"
+CHECK_UPDATED = "updated"
+CHECK_CHANGED = "changed"
 
 # Get the project root directory (one level up from backend)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-JSON_OUTPUT_FILE = os.path.join(PROJECT_ROOT, "status.json")
+# Where the files served to the web apps live (the repo root); load tests point it elsewhere
+PUBLIC_DATA_DIR = os.environ.get("PUBLIC_DATA_DIR", PROJECT_ROOT)
+JSON_OUTPUT_FILE = os.path.join(PUBLIC_DATA_DIR, "status.json")
 
 # Email configuration
 EMAIL_SENDER = os.environ.get("EMAIL_SENDER", "beach-status@yourdomain.com")
@@ -62,42 +90,55 @@ BEACH_COORDINATES = {
 }
 
 
+# Status rules, compiled once at import: the batch reclassifier (report_archive.py)
+# runs them over every archived report. The first rule whose pattern is found wins.
+INDICATOR_STATUS_RULES = [
+    (re.compile("[🟢⚫]"), "green"),
+    (re.compile("🟡"), "yellow"),
+    (re.compile("🔴"), "red"),
+]
+# Checked against the note column, which takes priority over the parsed icon
+NOTE_STATUS_RULES = [
+    (re.compile(r"alert|category 2", re.IGNORECASE), "yellow"),
+    # If the note says "open", the status is green (the initial status is not consulted)
+    (re.compile(r"open", re.IGNORECASE), "green"),
+    (re.compile(r"closed", re.IGNORECASE), "red"),
+]
+
+
+def _match_status(rules, text, default):
+    for pattern, status in rules:
+        if pattern.search(text):
+            return status
+    return default
+
+
 def determine_status_from_indicator(status_text):
     """Helper function to determine status from the indicator"""
-    status_text = str(status_text).lower()
-    if "🟢" in status_text or "⚫" in status_text:
-        return "green"
-    elif "🟡" in status_text:
-        return "yellow"
-    elif "🔴" in status_text:
-        return "red"
-    return "unknown"
+    return _match_status(INDICATOR_STATUS_RULES, str(status_text), "unknown")
 
 def validate_status(initial_status, note):
     """
     Determines the final status color, giving priority to the text in the 'note' column.
     This is more reliable than relying only on the parsed icon.
     """
-    # Use lowercase for case-insensitive matching
-    note_lower = note.lower()
-
-    # --- NEW, MORE ROBUST LOGIC ---
-    if "alert" in note_lower or "category 2" in note_lower:
-        return "yellow"
-    
-    # This is the key fix: We no longer check the initial_status for "Open".
-    # If the note says "open", the status is green.
-    if "open" in note_lower:
-        return "green"
-    
-    if "closed" in note_lower:
-        return "red"
-    
     # If the note doesn't contain a clear status keyword,
     # then we can fall back to whatever we parsed from the icon.
-    return initial_status
+    return _match_status(NOTE_STATUS_RULES, note, initial_status)
+
+def _cached_subscribers():
+    """The subscriber list from the last successful sync, or None if there isn't one."""
+    cache = load_subscriber_cache()
+    if cache:
+        print(f"Using {len(cache['subscriptions'])} subscribers from the last successful sync.")
+        return cache['subscriptions']
+    return None
 
 def get_subscribers():
+    """
+    Returns {email: [beach, ...]} for every subscriber. When the Worker can't be reached,
+    the list from the last successful sync is used; None if there is none either.
+    """
     if not CF_API_TOKEN:
         print("Error: CF_API_TOKEN environment variable is not set.")
         print("To fix this, you need to:")
@@ -105,16 +146,12 @@ def get_subscribers():
         print("2. Set it as an environment variable: export CF_API_TOKEN='your_token_here'")
         print("3. Or create a .env file in the backend directory with: CF_API_TOKEN=your_token_here")
         print("4. Or run the script with: CF_API_TOKEN=your_token_here python check_status.py")
-        return []
+        return _cached_subscribers()
     
     print("Fetching subscriber list from Cloudflare Worker...")
     try:
-        url = f"{CLOUDFLARE_WORKER_URL}/get-subscribers"
-        headers = {"X-API-Token": CF_API_TOKEN}
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
-        data = response.json()
-        subscribers = data.get("subscribers", [])
+        # Pages in only what changed since the cached list (nothing at all if the version is unchanged)
+        subscribers = sync_subscribers(CLOUDFLARE_WORKER_URL, CF_API_TOKEN)
         print(f"Found {len(subscribers)} subscribers.")
         return subscribers
     except requests.exceptions.HTTPError as e:
@@ -124,158 +161,363 @@ def get_subscribers():
             print("Please check your token and try again.")
         else:
             print(f"HTTP Error: {e}")
-        return []
+        return _cached_subscribers()
     except Exception as e:
         print(f"Failed to fetch subscribers from Cloudflare: {e}")
-        return []
+        return _cached_subscribers()
 
-def get_all_beach_statuses():
+def extract_report_table(pdf_bytes, source=None, save_template=True):
     """
-    Scrapes the PDF report and returns a list of dictionaries,
+    Runs pdfplumber over the report and returns the raw table rows, header included.
+
+    The cached layout template is tried first; if its result doesn't line up with
+    the known beach list, the full "lines" table extraction runs and the template
+    is re-learned from it (and saved, unless save_template is False).
+
+    source is a report_sources entry (page, coordinates, template_file); the
+    Burlington report is assumed when it isn't given.
+    """
+    # pdfplumber is slow to import and only needed when the report actually has to be parsed
+    import pdfplumber
+
+    known_beaches = source["coordinates"] if source else BEACH_COORDINATES
+    template_file = source["template_file"] if source else LAYOUT_TEMPLATE_FILE
+
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        page = pdf.pages[source["page"] if source else 0]
+
+        template = load_layout_template(template_file)
+        if template:
+            table = extract_table_with_template(page, template)
+            if table_matches_beaches(table, known_beaches):
+                return table
+            print("Report layout doesn't match the cached template. Falling back to full table extraction.")
+
+        found_table = find_report_table(page)
+        if not found_table:
+            return None
+        table = found_table.extract()
+        if save_template and table_matches_beaches(table, known_beaches):
+            save_layout_template(learn_layout_template(page, found_table), template_file)
+        return table
+
+
+def parse_beach_rows(table, coordinates=BEACH_COORDINATES):
+    """
+    Turns the raw report table into a list of dictionaries,
     one for each beach found in the table.
     """
-    try:
-        response = requests.get(PDF_URL, timeout=20)
-        response.raise_for_status()
-        
-        all_beaches = [] # Initialize an empty list to store all beach data
-        
-        with pdfplumber.open(io.BytesIO(response.content)) as pdf:
-            page = pdf.pages[0]
-            # Use a slightly more robust setting for table extraction
-            table = page.extract_table(table_settings={"vertical_strategy": "lines", "horizontal_strategy": "lines"})
-            
-            if not table or len(table) < 2: 
-                print("Could not parse a valid PDF table.")
-                return [] # Return empty list on failure
-
-            # Loop through each row in the table, skipping the header (table[0])
-            for row in table[1:]:
-                # Basic check to ensure the row has data and a name in the first column
-                if not row or not row[0]:
-                    continue
-
-                try:
-                    beach_name = str(row[0]).strip()
-                    # The rest of the parsing logic is the same as before
-                    initial_status = determine_status_from_indicator(row[1])
-                    date_updated = str(row[2]).strip() if len(row) > 2 and row[2] else "N/A"
-                    note = str(row[3]).strip() if len(row) > 3 and row[3] else ""
-                    final_status = validate_status(initial_status, note)
-                    
-                    beach_data = {
-                        "beach_name": beach_name,
-                        "status": final_status,
-                        "date": date_updated,
-                        "note": note,
-                        "coordinates": BEACH_COORDINATES.get(beach_name)
-                    }
-                    all_beaches.append(beach_data)
-                except (IndexError, TypeError) as e:
-                    print(f"Skipping a malformed row in the PDF table: {row}. Error: {e}")
-                    continue
-
-            return all_beaches
+    if not table or len(table) < 2: 
+        print("Could not parse a valid PDF table.")
+        return [] # Return empty list on failure
+
+    all_beaches = [] # Initialize an empty list to store all beach data
+
+    # Loop through each row in the table, skipping the header (table[0])
+    for row in table[1:]:
+        # Basic check to ensure the row has data and a name in the first column
+        if not row or not row[0]:
+            continue
+
+        try:
+            beach_name = str(row[0]).strip()
+            # The rest of the parsing logic is the same as before
+            initial_status = determine_status_from_indicator(row[1])
+            date_updated = str(row[2]).strip() if len(row) > 2 and row[2] else "N/A"
+            note = str(row[3]).strip() if len(row) > 3 and row[3] else ""
+            final_status = validate_status(initial_status, note)
             
+            beach_data = {
+                "beach_name": beach_name,
+                "status": final_status,
+                "date": date_updated,
+                "note": note,
+                "coordinates": coordinates.get(beach_name)
+            }
+            all_beaches.append(beach_data)
+        except (IndexError, TypeError) as e:
+            print(f"Skipping a malformed row in the PDF table: {row}. Error: {e}")
+            continue
+
+    return all_beaches
+
+
+# The City of Burlington report is always watched; more jurisdictions can be listed in REPORT_SOURCES_FILE
+register_source("burlington", PDF_URL, extract_report_table, BEACH_COORDINATES, template_file=LAYOUT_TEMPLATE_FILE)
+load_source_config(default_parser=extract_report_table)
+
+
+def fetch_beach_statuses(cache_file=REPORT_CACHE_FILE, force=False, dry_run=False):
+    """
+    Fetches every registered report and returns (beaches, report_changed, cache_update).
+
+    Each report is requested conditionally using the validators in cache_file;
+    when a source hasn't republished its report (304, or identical bytes) the
+    table rows cached from its last parse are reused. report_changed is True
+    when at least one report was parsed. force ignores the cached validators
+    but still updates the cache. Pass cache_file=None to fetch and parse without
+    touching the cache; dry_run also leaves the layout templates alone.
+    Nothing is written to the cache until commit_report_cache(cache_update).
+    """
+    try:
+        return fetch_sources(parse_beach_rows, cache_file=cache_file, force=force, dry_run=dry_run)
     except Exception as e:
         print(f"Error fetching or parsing PDF for all beaches: {e}")
-        return [] # Return an empty list on critical failure
+        return [], False, None # Return an empty list on critical failure
+
+
+def get_all_beach_statuses():
+    """
+    Scrapes the PDF report and returns a list of dictionaries,
+    one for each beach found in the table.
+    """
+    all_beaches, _, _ = fetch_beach_statuses(cache_file=None)
+    return all_beaches
+
+
+def send_topic_notification(job):
+    """Posts one job to the ntfy.sh topic (for anyone subscribed to the topic)."""
+    response = http_transport.post("ntfy", f"{NTFY_URL}/{NTFY_TOPIC}",
+                                   data=job['body'].encode('utf-8'),
+                                   headers={"Title": job['subject']})
+    response.raise_for_status()
+
+
+def email_enabled():
+    return bool(EMAIL_PASSWORD) and EMAIL_PASSWORD != "your_email_password"
+
+
+def deliver_notifications(jobs=None, outbox_file=OUTBOX_FILE):
+    """
+    Drains the outbox when jobs is None, otherwise delivers jobs.
+    Anything that can't be delivered now is kept in the outbox for the next run.
+    """
+    senders = {"ntfy": send_topic_notification}
+    pool = None
+    if email_enabled():
+        # smtplib and the MIME classes are only imported on runs that send email
+        from email_delivery import SMTPPool, make_email_sender
+        # Gmail SMTP over a small pool of authenticated sessions; they connect on first use
+        pool = SMTPPool(SMTP_SERVER, SMTP_PORT, EMAIL_SENDER, EMAIL_PASSWORD)
+        senders["email"] = make_email_sender(pool, EMAIL_SENDER)
+    dispatcher = NotificationDispatcher(senders)
+
+    try:
+        if jobs is None:
+            drain_outbox(dispatcher, outbox_file)
+        else:
+            with stage("deliver") as info:
+                undelivered = dispatcher.dispatch(jobs)
+                info["rows"] = len(jobs) - len(undelivered)
+                info["errors"] = len(undelivered)
+            enqueue_outbox(undelivered, outbox_file)
+    finally:
+        if pool:
+            pool.close()
+
+
+def display_name(beach_name):
+    return DISPLAY_BEACH_NAME if beach_name == PDF_TARGET_BEACH else beach_name
+
+
+def format_status_change(change):
+    message = (f"{display_name(change['beach_name'])} status changed from "
+               f"{change['old_status'].upper()} to {change['new_status'].upper()}.")
+    if change['note']:
+        message += f" Note: {change['note']}"
+    return message
+
+
+def format_status_changes(changes):
+    """One message for a recipient's changed beaches; a single change keeps the one-line form."""
+    if len(changes) == 1:
+        return format_status_change(changes[0])
+    return "Beach status changes:\n" + "\n".join(f"- {format_status_change(change)}" for change in changes)
+
+
+def group_changes_by_recipient(changes, beach_index):
+    """
+    Collects each recipient's changed beaches so they get one message.
+    Only the subscribers of changed beaches are visited.
+    Returns {message: [email, ...]}, grouping recipients who follow the same changes.
+    """
+    recipient_changes = {}
+    for change in changes:
+        for email in beach_index.get(change['beach_name'], ()):
+            recipient_changes.setdefault(email, []).append(change)
+    return group_recipient_messages(recipient_changes)
+
 
+def group_recipient_messages(recipient_changes):
+    """Turns {email: [change, ...]} into {message: [email, ...]}."""
+    messages = {}
+    for email, their_changes in recipient_changes.items():
+        messages.setdefault(format_status_changes(their_changes), []).append(email)
+    return messages
 
-def send_notifications(message, email_list):
-    print(f"Sending notifications for message: {message}")
+
+def send_notifications(recipient_messages, topic_message=None):
+    """
+    Sends each message in {message: [email, ...]} to its recipients, and
+    topic_message (if any) to the ntfy.sh topic.
+    """
+    subject = "Beach Status Change!"
+    recipient_count = sum(len(emails) for emails in recipient_messages.values())
     
     # Test mode: only send to test email
     if TEST_MODE:
         print(f"🧪 TEST MODE: Only sending to {TEST_EMAIL}")
-        email_list = [TEST_EMAIL]
+        all_messages = list(recipient_messages) or ([topic_message] if topic_message else [])
+        recipient_messages = {"\n\n".join(all_messages): [TEST_EMAIL]} if all_messages else {}
     else:
-        print(f"Sending notifications to {len(email_list)} subscribers...")
+        print(f"Sending {len(recipient_messages)} distinct message(s) to {recipient_count} subscribers...")
     
+    jobs = []
     # Send to the ntfy.sh topic (for anyone subscribed to the topic)
-    try:
-        requests.post(f"https://ntfy.sh/{NTFY_TOPIC}", 
-                    data=message.encode('utf-8'), 
-                    headers={"Title": "Beach Status Change!"})
-        print("Topic notification sent successfully")
-    except Exception as e:
-        print(f"Failed to send topic notification: {e}")
-    
-    # Send individual emails to each subscriber using a simple email service
-    for email in email_list:
-        try:
-            # Option 1: Use Gmail SMTP (if credentials are configured)
-            if EMAIL_PASSWORD and EMAIL_PASSWORD != "your_email_password":
-                # Create a MIME message
-                msg = MIMEMultipart()
-                msg['From'] = EMAIL_SENDER
-                msg['To'] = email
-                msg['Subject'] = "Beach Status Change!"
-                
-                # Attach the message to the MIME message
-                msg.attach(MIMEText(message, 'plain'))
-                
-                # Connect to the SMTP server
-                with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                    server.starttls() # Secure the connection
-                    server.login(EMAIL_SENDER, EMAIL_PASSWORD)
-                    server.send_message(msg)
-                print(f"Email sent to {email} via Gmail SMTP")
-            else:
-                # Option 2: Use a webhook service (placeholder)
-                email_data = {
-                    "to": email,
-                    "subject": "Beach Status Change!",
-                    "message": message,
-                    "from": "beach-status@yourdomain.com"
-                }
+    if topic_message:
+        print(f"Sending topic notification: {topic_message}")
+        jobs.append(make_job("ntfy", NTFY_TOPIC, subject, topic_message))
+
+    # Individual emails to each subscriber
+    for message, email_list in recipient_messages.items():
+        if email_enabled():
+            jobs += [make_job("email", email, subject, message) for email in email_list]
+        else:
+            # Use a webhook service (placeholder)
+            for email in email_list:
                 print(f"Email notification prepared for {email} (webhook service)")
-            
-        except Exception as e:
-            print(f"Failed to send email to {email}: {e}")
+
+    deliver_notifications(jobs)
     
-    if not EMAIL_PASSWORD or EMAIL_PASSWORD == "your_email_password":
+    if not email_enabled():
         print("\nTo enable email sending, you can:")
         print("1. Set up Gmail SMTP: Add EMAIL_SENDER and EMAIL_PASSWORD to your .env file")
         print("2. Use SendGrid: Sign up for free tier and configure API key")
         print("3. Use EmailJS: Set up email service integration")
 
+
+def notify_status_changes(changes, now=None):
+    """Notifies the subscribers of every changed beach, one message per recipient."""
+    if digest_mode_enabled():
+        send_digests(changes, now)
+        return
+
+    # The subscriber list is loaded and indexed by beach once per run
+    with stage("subscriber_fetch") as info:
+        subscribers = get_subscribers() or {}
+        info["rows"] = len(subscribers)
+    beach_index = build_beach_index(subscribers)
+    recipient_messages = group_changes_by_recipient(changes, beach_index)
+
+    # The ntfy topic is for the beach shown on the main page
+    target_change = next((change for change in changes if change['beach_name'] == PDF_TARGET_BEACH), None)
+    topic_message = format_status_change(target_change) if target_change else None
+
+    if not recipient_messages and not topic_message:
+        print("No subscribers found to notify.")
+        return
+    send_notifications(recipient_messages, topic_message)
+
+def send_digests(changes=(), now=None):
+    """
+    Digest mode (NOTIFY_SETTLE_MINUTES, see notification_digest.py): changes are
+    held until they settle, and each recipient gets one message with the net
+    changes that are due. Runs without changes call this too, so held changes
+    go out once their window has passed.
+    """
+    scheduler = DigestScheduler.load()
+    for beach_name in scheduler.observe(changes, now):
+        print(f"{display_name(beach_name)} changed back before its change was sent; nothing to send.")
+
+    released = []
+    if scheduler.has_due_changes(now):
+        # The subscriber list is only needed when a change is ready to go out
+        with stage("subscriber_fetch") as info:
+            subscribers = get_subscribers()
+            info["rows"] = len(subscribers or {})
+        if subscribers is None:
+            # Releasing now would mark the changes as notified without anyone to send them to
+            print("⚠️ No subscriber list available; settled changes stay held until the next run.")
+        else:
+            released = scheduler.release(now)
+            scheduler.queue(released, build_beach_index(subscribers))
+    digests = scheduler.take_digests(now)
+    # Saved before sending: undelivered messages are kept in the outbox, not resent from here
+    scheduler.save()
+
+    held = scheduler.held()
+    if held:
+        print(f"Holding changes for {len(held)} beach(es) until they settle: {', '.join(map(display_name, held))}")
+    target_change = next((change for change in released if change['beach_name'] == PDF_TARGET_BEACH), None)
+    topic_message = format_status_change(target_change) if target_change else None
+    if not digests and not topic_message:
+        if released:
+            print("No subscribers found to notify.")
+        return
+    print(f"Sending {len(released)} settled change(s) as {len(digests)} digest(s).")
+    send_notifications(group_recipient_messages(digests), topic_message)
+
+
 def test_pdf_parsing():
-    """Test function to verify parsing"""
-    result = get_all_beach_statuses()
+    """Test function to verify parsing (writes nothing)"""
+    result, _, _ = fetch_beach_statuses(dry_run=True)
     print("Test Results:")
     print(json.dumps(result, indent=2))
     return result
 
 
-def write_to_history(beach_data):
-    """Appends a new record to the historical data CSV file."""
-    # The columns for our historical log
-    fieldnames = ['record_timestamp_utc', 'beach_name', 'status', 'last_updated_from_pdf', 'note']
-    
-    # Get the current time in UTC for our own record-keeping
-    record_time = datetime.now(timezone.utc).isoformat()
-    
-    # Check if the history file exists to decide whether to write headers
-    file_exists = os.path.isfile('historical_status.csv')
-    
-    with open('historical_status.csv', 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        
-        if not file_exists:
-            writer.writeheader() # Write headers only if the file is new
-            
-        writer.writerow({
-            'record_timestamp_utc': record_time,
-            'beach_name': beach_data['beach_name'],
-            'status': beach_data['status'],
-            'last_updated_from_pdf': beach_data['date'],
-            'note': beach_data['note']
-        })
+def write_to_history(history):
+    """
+    Appends the rows queued on a HistoryWriter to the history CSV in one locked batch,
+    mirrors them into HISTORY_DB_FILE and folds them into the rollups. Returns the rows written.
+    """
+    with stage("history_write") as info:
+        written_rows = history.flush()
+        info["rows"] = len(written_rows)
+        info["bytes"] = history.bytes_written
+    if HISTORY_DB_FILE and written_rows:
+        from history_db import HistoryStore
+        with stage("history_db"), HistoryStore(HISTORY_DB_FILE) as store:
+            store.insert_rows(written_rows)
+
+    # Fold this run's rows into the precomputed rollups used by the overview page
+    try:
+        with stage("rollup") as info:
+            update_history_rollup(written_rows)
+            info["rows"] = len(written_rows)
+    except Exception as e:
+        print(f"Failed to update history rollup: {e}")
+    return written_rows
 
 
-def main():
+def main(fetched=None, now=None):
+    """
+    Runs one check and returns what it found: CHECK_FAILED, CHECK_UNCHANGED
+    (report not republished), CHECK_UPDATED (republished, no status changes)
+    or CHECK_CHANGED.
+
+    fetched is an optional (beaches, report_changed, cache_update) result of fetch_beach_statuses
+    from the caller; otherwise the report is fetched here. now (UTC) stamps the
+    history rows and decides daily snapshots and held digests; it defaults to the
+    current time and is only set by simulations. Each stage of the run is timed
+    and counted (see metrics.py).
+    """
+    begin_run()
+    result = CHECK_FAILED
+    try:
+        result = run_check(fetched, now)
+        return result
+    finally:
+        end_run(result)
+
+
+def run_check(fetched=None, now=None):
+    """The stages of one check; main() wraps it with the metrics for the run."""
     print("--- Starting Beach Status Check ---")
+
+    # 0. Retry notifications a previous run couldn't deliver
+    if os.path.exists(OUTBOX_FILE) and os.path.getsize(OUTBOX_FILE) > 0:
+        deliver_notifications()
     
     # 1. Load the last known state of ALL beaches from status.json
     last_known_states = {}
@@ -288,11 +530,11 @@ def main():
     except (FileNotFoundError, json.JSONDecodeError):
         print(f"{JSON_OUTPUT_FILE} not found. Will treat all statuses as new.")
 
-    # 2. Fetch all NEW beach data
-    all_new_data = get_all_beach_statuses()
+    # 2. Fetch all NEW beach data (the last parse is reused if the report hasn't changed)
+    all_new_data, report_changed, cache_update = fetched or fetch_beach_statuses(force=FORCE_REPORT_REFRESH)
     if not all_new_data:
         print("Failed to retrieve any beach data. Exiting.")
-        return
+        return CHECK_FAILED
 
     # 3. --- ENHANCED: HISTORICAL LOGGING ---
     # Option: Log daily snapshots regardless of changes for timeline visualization
@@ -300,59 +542,163 @@ def main():
     
     changes_found = 0
     logged_today = set()
+    # Beaches whose status changed, collected in this pass for a single grouped fan-out
+    status_changes = []
+    # Rows for this run are collected here and appended to the CSV in one atomic write
+    history = HistoryWriter(HISTORY_FILE, keep_intervals=True)
+
+    # Look up when each beach was last logged once, instead of rescanning the CSV per beach
+    last_logged = load_last_logged_dates([beach['beach_name'] for beach in all_new_data]) if DAILY_LOGGING else {}
     
+    diff_start = time.perf_counter()
     for new_beach_data in all_new_data:
         beach_name = new_beach_data['beach_name']
         # Get the old state for this specific beach, if it exists
         old_beach_data = last_known_states.get(beach_name, {})
         
-        # Check if the status OR the note has changed
-        status_changed = (new_beach_data.get('status') != old_beach_data.get('status') or 
-                         new_beach_data.get('note') != old_beach_data.get('note'))
+        # Check if the status OR the note has changed (an unchanged report can't have changes)
+        status_changed = report_changed and (new_beach_data.get('status') != old_beach_data.get('status') or 
+                                             new_beach_data.get('note') != old_beach_data.get('note'))
         
+        old_status = old_beach_data.get('status', 'unknown')
+        if report_changed and new_beach_data['status'] not in ("error", old_status):
+            status_changes.append({
+                "beach_name": beach_name,
+                "old_status": old_status,
+                "new_status": new_beach_data['status'],
+                "note": new_beach_data.get('note', "")
+            })
+
         if status_changed:
             print(f"Change detected for {beach_name}! Logging to history.")
-            write_to_history(new_beach_data)
+            history.add(new_beach_data, record_time=now)
             logged_today.add(beach_name)
             changes_found += 1
-        elif DAILY_LOGGING and should_log_daily_snapshot(beach_name):
+        elif DAILY_LOGGING and should_log_daily_snapshot(beach_name, last_logged, now):
             print(f"Daily snapshot for {beach_name} - logging to history.")
-            write_to_history(new_beach_data)
+            history.add(new_beach_data, record_time=now)
             logged_today.add(beach_name)
-    
+
+    record("diff", time.perf_counter() - diff_start, rows=len(all_new_data))
+
+    write_to_history(history)
+
     if changes_found == 0 and not DAILY_LOGGING:
         print("No meaningful changes detected in any beach status.")
     elif DAILY_LOGGING:
         print(f"Historical logging complete: {changes_found} changes + {len(logged_today) - changes_found} daily snapshots.")
 
-    # 4. Write the complete new data to status.json (this happens every run)
-    with open(JSON_OUTPUT_FILE, 'w') as f:
-        json.dump(all_new_data, f, indent=2)
-    print(f"Updated {JSON_OUTPUT_FILE} with data for {len(all_new_data)} beaches.")
-
-    # 5. Handle notifications for the specific target beach (logic is unchanged)
-    target_beach_data = next((beach for beach in all_new_data if beach["beach_name"] == PDF_TARGET_BEACH), None)
-    if target_beach_data:
-        old_target_status = last_known_states.get(PDF_TARGET_BEACH, {}).get('status', 'unknown')
-        new_target_status = target_beach_data['status']
-        print(f"Last known status for {DISPLAY_BEACH_NAME}: {old_target_status.upper()}")
-        print(f"Newly fetched status for {DISPLAY_BEACH_NAME}: {new_target_status.upper()}")
-        
-        if new_target_status != "error" and new_target_status != old_target_status:
-            print("Status for target beach has changed! Sending notifications.")
-            subscriber_emails = get_subscribers()
-            message = f"{DISPLAY_BEACH_NAME} status changed from {old_target_status.upper()} to {new_target_status.upper()}."
-            if target_beach_data["note"]: message += f" Note: {target_beach_data['note']}"
-            if subscriber_emails: 
-                send_notifications(message, subscriber_emails)
-            else:
-                print("No subscribers found to notify.")
-        else:
-            print("Status for target beach has not changed.")
-            
+    if not report_changed:
+        print("Report unchanged since the last run. Skipping status.json update and notifications.")
+        if digest_mode_enabled():
+            # Changes held by an earlier run go out once they have settled
+            send_digests(now=now)
+        commit_report_cache(cache_update)
+        print("--- Check Complete ---")
+        return CHECK_UNCHANGED
+
+    # 4. Write the complete new data to status.json (only if its content changed) and
+    #    append the differences to the change feed
+    with stage("status_write") as info:
+        seq = publish_status(all_new_data, last_known_states, JSON_OUTPUT_FILE)
+        if seq is not None:
+            info["rows"] = len(all_new_data)
+            info["bytes"] = os.path.getsize(JSON_OUTPUT_FILE)
+    if seq is None:
+        print(f"{JSON_OUTPUT_FILE} is already up to date.")
+    else:
+        print(f"Updated {JSON_OUTPUT_FILE} with data for {len(all_new_data)} beaches (change feed seq {seq}).")
+
+    # 5. Notify the subscribers of every beach whose status changed
+    if status_changes:
+        for change in status_changes:
+            print(f"Status for {display_name(change['beach_name'])} changed: "
+                  f"{change['old_status'].upper()} -> {change['new_status'].upper()}")
+        notify_status_changes(status_changes, now)
+    elif digest_mode_enabled():
+        send_digests(now=now)
+    else:
+        print("No beach status changes to notify.")
+
+    # Only now is the report's parse remembered; a run that died before this point
+    # gets the report again next time instead of a 304
+    commit_report_cache(cache_update)
     print("--- Check Complete ---")
+    return CHECK_CHANGED if status_changes else CHECK_UPDATED
+
+
+def send_test_notification(email=None):
+    """Sends a test message to one address (TEST_EMAIL by default) and the ntfy topic."""
+    global TEST_MODE, TEST_EMAIL
+    TEST_MODE = True
+    TEST_EMAIL = email or TEST_EMAIL
+    message = f"This is a test notification from the {DISPLAY_BEACH_NAME} status checker."
+    send_notifications({message: [TEST_EMAIL]}, topic_message=message)
+
+
+def run_cli(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Beach water quality checker")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("check", help="fetch the report once, log history and notify on changes (default)")
+    parse_command = commands.add_parser("parse", help="fetch and parse the report and print the beach statuses")
+    parse_command.add_argument("--dry-run", action="store_true",
+                               help="don't update the layout template (parse never updates the report cache)")
+    parse_command.add_argument("--force", action="store_true", help="parse even if the report hasn't changed")
+    notify_command = commands.add_parser("notify-test", help="send a test notification without checking the report")
+    notify_command.add_argument("--email", help=f"address to send the test email to (default {TEST_EMAIL})")
+    backfill_command = commands.add_parser("backfill", help="add simulated history for the known beaches (offline)")
+    backfill_command.add_argument("days", nargs="?", type=int, default=30)
+    backfill_command.add_argument("--seed", type=int, help="seed for a reproducible backfill")
+    commands.add_parser("daemon", help="keep checking on an adaptive schedule (see watcher.py)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="run the command under cProfile and write the stats to FILE")
+    args = parser.parse_args(argv)
+
+    if args.profile:
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        try:
+            return profiler.runcall(run_command, args)
+        finally:
+            profiler.dump_stats(args.profile)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(15)
+            print(f"Profile written to {args.profile} (view it with: python -m pstats {args.profile})")
+    return run_command(args)
+
+
+def run_command(args):
+    """Runs one parsed run_cli command and returns the exit status."""
+    if args.command == "parse":
+        # The cache isn't committed: the next check still has to publish this report
+        beaches, report_changed, _ = fetch_beach_statuses(force=args.force, dry_run=args.dry_run)
+        if not report_changed:
+            print("Report unchanged since the last run; showing the cached parse.")
+        print(json.dumps(beaches, indent=2))
+        return 0 if beaches else 1
+
+    if args.command == "notify-test":
+        send_test_notification(args.email)
+        return 0
+
+    if args.command == "backfill":
+        from daily_snapshot_helper import backfill_historical_data
+        backfill_historical_data(args.days, seed=args.seed)
+        return 0
+
+    if args.command == "daemon":
+        # Keep checking on an adaptive schedule instead of running once
+        from watcher import run_watcher
+        run_watcher()
+        return 0
+
+    # check: the report is fetched and parsed once (inside the run, so its stages are measured)
+    return 1 if main() == CHECK_FAILED else 0
 
 
 if __name__ == "__main__":
-    test_pdf_parsing()  # Run test first
-    main()             # Then run main program
+    import sys
+    sys.exit(run_cli())
@@ -7,105 +7,115 @@ import os
 import csv
 from datetime import datetime, timezone
 
-def should_log_daily_snapshot(beach_name):
+from history_writer import HISTORY_FILE
+from history_intervals import load_latest_intervals
+
+def _read_lines_reversed(path, block_size=64 * 1024):
+    """Yields the lines of a file from last to first, reading it in blocks from the end."""
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b'\n')
+            # The first piece may be the tail of a line that starts in the previous block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.rstrip(b'\r').decode('utf-8', errors='replace')
+        if remainder.strip():
+            yield remainder.rstrip(b'\r').decode('utf-8', errors='replace')
+
+def load_last_logged_dates(beach_names=None, history_file=HISTORY_FILE):
+    """
+    Builds a {beach_name: date} index of the most recent history record for each beach.
+    The CSV is scanned backwards from the end and the scan stops as soon as every beach
+    in beach_names has been seen, so the cost depends on how recently the beaches were
+    logged rather than on how long the history is.
+
+    When the interval history next to the CSV is current, its header already holds
+    the latest record of every beach and the CSV isn't read at all.
+    """
+    last_logged = {}
+    if not os.path.isfile(history_file):
+        return last_logged
+
+    latest = load_latest_intervals(history_file)
+    if latest is not None:
+        for beach_name, interval in latest.items():
+            if beach_names is None or beach_name in beach_names:
+                last_logged[beach_name] = datetime.fromisoformat(interval['end'].replace('Z', '+00:00')).date()
+        return last_logged
+
+    wanted = set(beach_names) if beach_names is not None else None
+
+    for line in _read_lines_reversed(history_file):
+        try:
+            fields = next(csv.reader([line]))
+            beach_name = fields[1]
+            record_date = datetime.fromisoformat(fields[0].replace('Z', '+00:00')).date()
+        except (csv.Error, IndexError, ValueError):
+            # Header row, or a fragment of a note that spans several lines
+            continue
+
+        if beach_name in last_logged:
+            continue
+        last_logged[beach_name] = record_date
+
+        if wanted is not None and wanted.issubset(last_logged):
+            break
+
+    return last_logged
+
+def should_log_daily_snapshot(beach_name, last_logged=None, now=None):
     """
     Check if we should log a daily snapshot for this beach.
-    Returns True if no record exists for today for this beach.
+    Returns True if no record exists for today (the UTC day of now) for this beach.
+
+    Pass the index from load_last_logged_dates() as last_logged to answer
+    from memory instead of reading the history file.
     """
-    if not os.path.isfile('historical_status.csv'):
-        return True
-    
-    today = datetime.now(timezone.utc).date()
-    
-    try:
-        with open('historical_status.csv', 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                if row['beach_name'] == beach_name:
-                    # Parse the timestamp
-                    record_date = datetime.fromisoformat(row['record_timestamp_utc'].replace('Z', '+00:00')).date()
-                    if record_date == today:
-                        return False  # Already logged today
-    except Exception as e:
-        print(f"Error checking daily snapshot for {beach_name}: {e}")
-        return True
-    
-    return True
-
-def backfill_historical_data(days_back=30):
+    today = (now or datetime.now(timezone.utc)).date()
+
+    if last_logged is None:
+        try:
+            last_logged = load_last_logged_dates([beach_name])
+        except Exception as e:
+            print(f"Error checking daily snapshot for {beach_name}: {e}")
+            return True
+
+    return last_logged.get(beach_name) != today
+
+def backfill_historical_data(days_back=30, beaches=None, seed=None):
     """
-    Backfill historical data with dummy records for testing timeline.
-    Creates records for the past N days with mostly green status and some variations.
+    Backfill historical data with simulated records for testing timeline.
+    Creates one record per beach for each of the past N days, mostly green with
+    multi-day advisories and closures (see synthetic_history.py). Works offline:
+    beaches is a list of beach records or names, BEACH_COORDINATES by default.
     """
-    from check_status import get_all_beach_statuses, write_to_history
-    import random
-    from datetime import timedelta
-    
+    from synthetic_history import write_synthetic_history
+
     print(f"🔄 Backfilling {days_back} days of historical data...")
-    
-    # Get current beach list
-    current_beaches = get_all_beach_statuses()
-    if not current_beaches:
-        print("❌ Could not fetch current beach data for backfill")
+
+    if beaches is None:
+        from check_status import BEACH_COORDINATES
+        beaches = list(BEACH_COORDINATES)
+    beach_names = [beach['beach_name'] if isinstance(beach, dict) else beach for beach in beaches]
+    if not beach_names:
+        print("❌ No beaches to backfill")
         return
-    
-    base_date = datetime.now(timezone.utc) - timedelta(days=days_back)
-    
-    for day in range(days_back):
-        date_for_day = base_date + timedelta(days=day)
-        
-        for beach in current_beaches:
-            # Simulate mostly green with occasional yellow/red
-            status_choice = random.choices(
-                ['green', 'yellow', 'red'], 
-                weights=[85, 12, 3],  # 85% green, 12% yellow, 3% red
-                k=1
-            )[0]
-            
-            notes = {
-                'green': 'Open',
-                'yellow': random.choice(['Alert Category 1 BGA level', 'Advisory posted']),
-                'red': random.choice(['Alert Category 3 BGA level', 'Closed due to contamination'])
-            }
-            
-            # Create fake beach data for this day
-            fake_beach_data = {
-                'beach_name': beach['beach_name'],
-                'status': status_choice,
-                'date': date_for_day.strftime('%b %d %Y %I:%M%p'),
-                'note': notes[status_choice]
-            }
-            
-            # Temporarily override the timestamp in write_to_history
-            original_write = write_to_history
-            
-            def write_with_date(beach_data):
-                """Write to history with custom date"""
-                fieldnames = ['record_timestamp_utc', 'beach_name', 'status', 'last_updated_from_pdf', 'note']
-                file_exists = os.path.isfile('historical_status.csv')
-                
-                with open('historical_status.csv', 'a', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    if not file_exists:
-                        writer.writeheader()
-                    writer.writerow({
-                        'record_timestamp_utc': date_for_day.isoformat(),
-                        'beach_name': beach_data['beach_name'],
-                        'status': beach_data['status'],
-                        'last_updated_from_pdf': beach_data['date'],
-                        'note': beach_data['note']
-                    })
-            
-            write_with_date(fake_beach_data)
-        
-        print(f"📅 Backfilled day {day + 1}/{days_back}: {date_for_day.strftime('%Y-%m-%d')}")
-    
-    print(f"✅ Backfill complete! Added {days_back * len(current_beaches)} historical records")
+
+    written = write_synthetic_history(HISTORY_FILE, beach_names, days_back, seed=seed, keep_intervals=True)
+    print(f"✅ Backfill complete! Added {written} historical records")
 
 if __name__ == "__main__":
     import sys
     if len(sys.argv) > 1 and sys.argv[1] == "backfill":
         days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
-        backfill_historical_data(days)
+        seed = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        backfill_historical_data(days, seed=seed)
     else:
-        print("Usage: python daily_snapshot_helper.py backfill [days]")
\ No newline at end of file
+        print("Usage: python daily_snapshot_helper.py backfill [days] [seed]")
\ No newline at end of file
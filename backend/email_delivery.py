@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Pooled SMTP delivery for subscriber notifications.
+
+A small pool of connected, authenticated SMTP sessions is shared by a few worker
+threads, so a status change costs one STARTTLS + login per pooled session instead
+of one per subscriber. The MIME message is rendered once; only the To header is
+prepended for each recipient. A session that drops is reconnected and the send
+retried once. A refused login is final for the pool: every later send fails
+with the same error instead of trying to log in again, and the dispatcher
+leaves the remaining email jobs in the outbox (too many failed logins can get
+the account locked).
+
+Usage:
+    python email_delivery.py bench [count] [pool_size]   # against a local smtp_sink stand-in
+"""
+
+import os
+import time
+import smtplib
+import threading
+from email import policy
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from concurrent.futures import ThreadPoolExecutor
+
+from notification_dispatcher import PermanentDeliveryError, ChannelUnavailable
+
+SMTP_POOL_SIZE = int(os.environ.get("SMTP_POOL_SIZE", "4"))
+# Local stand-ins (smtp_sink.py, aiosmtpd, python -m smtpd) don't speak TLS
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+# How long a send waits for a pooled session before it fails (and the job is retried or outboxed)
+SMTP_POOL_WAIT_SECONDS = float(os.environ.get("SMTP_POOL_WAIT_SECONDS", "60"))
+
+
+class SMTPPoolTimeout(smtplib.SMTPException):
+    """No pooled session became available in time."""
+
+
+def _session_dropped(error):
+    """True for errors after which the session can't be reused (as opposed to e.g. a refused recipient)."""
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        # 421: the server is closing the connection
+        return error.smtp_code == 421
+    # SMTPException subclasses OSError, so only plain socket errors get here
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+
+class SMTPPool:
+    """
+    Hands out up to `size` SMTP sessions, connecting them lazily.
+    Sessions are returned to the pool after each send and reused. A send that finds
+    every session busy waits for one to come back or for a slot to free up (a
+    dropped session gives its slot back), and fails with SMTPPoolTimeout after wait_seconds.
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=SMTP_POOL_SIZE,
+                 use_starttls=SMTP_STARTTLS, timeout=30, wait_seconds=SMTP_POOL_WAIT_SECONDS):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = max(1, size)
+        self.use_starttls = use_starttls
+        self.timeout = timeout
+        self.wait_seconds = wait_seconds
+        self._idle = []
+        self._created = 0
+        self._available = threading.Condition()
+        self.reconnects = 0
+        # Set by the first refused login; the pool never tries to log in again
+        self.auth_error = None
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_starttls:
+            server.starttls() # Secure the connection
+        if self.password:
+            server.login(self.username, self.password)
+        return server
+
+    def _acquire(self, fresh=False):
+        """An idle session (most recently used first), or a new one; fresh always connects a new one."""
+        deadline = time.monotonic() + self.wait_seconds
+        with self._available:
+            while True:
+                if self.auth_error is not None:
+                    raise self.auth_error
+                if self._idle and not fresh:
+                    return self._idle.pop()
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise SMTPPoolTimeout(-1, f"no SMTP session available within {self.wait_seconds:.0f}s")
+                self._available.wait(remaining)
+        return self._open_session()
+
+    def _release(self, server):
+        with self._available:
+            self._idle.append(server)
+            self._available.notify()
+
+    def _free_slot(self):
+        with self._available:
+            self._created -= 1
+            self._available.notify()
+
+    def _open_session(self):
+        """Connects a session whose pool slot has already been reserved."""
+        try:
+            return self._connect()
+        except smtplib.SMTPAuthenticationError as e:
+            with self._available:
+                self.auth_error = self.auth_error or e
+                self._created -= 1
+                # Wake every waiter so they fail now rather than at their deadline
+                self._available.notify_all()
+            raise
+        except Exception:
+            self._free_slot()
+            raise
+
+    def _discard(self, server):
+        try:
+            server.close()
+        except Exception:
+            pass
+        self._free_slot()
+
+    def sendmail(self, sender, recipient, message_bytes):
+        """Sends one message on a pooled session, reconnecting once if the session dropped."""
+        server = self._acquire()
+        for attempt in range(2):
+            try:
+                server.sendmail(sender, [recipient], message_bytes)
+            except Exception as e:
+                if not _session_dropped(e):
+                    # The session itself is fine (e.g. the recipient was refused), so keep it
+                    self._release(server)
+                    raise
+                self._discard(server)
+                if attempt == 1:
+                    raise
+                # Retry on a fresh connection rather than another idle session that may be stale too
+                self.reconnects += 1
+                server = self._acquire(fresh=True)
+                continue
+            self._release(server)
+            return
+
+    def close(self):
+        with self._available:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for server in idle:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+
+def render_message(sender, subject, body):
+    """
+    Renders the message once, without a To header.
+    Returns bytes that only need "To: <recipient>" prepended.
+    """
+    msg = MIMEMultipart()
+    msg['From'] = sender
+    msg['Subject'] = subject
+    msg.attach(MIMEText(body, 'plain'))
+    return msg.as_bytes(policy=policy.SMTP)
+
+
+def address_message(rendered, recipient):
+    if '\r' in recipient or '\n' in recipient:
+        raise ValueError(f"Invalid recipient address: {recipient!r}")
+    return b"To: " + recipient.encode('utf-8') + b"\r\n" + rendered
+
+
+def make_email_sender(pool, sender):
+    """
+    Returns a notification_dispatcher sender for the "email" channel.
+    Each distinct subject/body is rendered once and reused for every recipient.
+    """
+    rendered = {}
+
+    def send_email(job):
+        key = (job['subject'], job['body'])
+        if key not in rendered:
+            rendered[key] = render_message(sender, job['subject'], job['body'])
+        try:
+            pool.sendmail(sender, job['recipient'], address_message(rendered[key], job['recipient']))
+        except (ValueError, smtplib.SMTPRecipientsRefused) as e:
+            # A malformed or rejected address fails the same way every time
+            raise PermanentDeliveryError(str(e)) from e
+        except smtplib.SMTPAuthenticationError as e:
+            raise ChannelUnavailable(f"SMTP login refused: {e}") from e
+
+    return send_email
+
+
+def send_bulk_email(pool, sender, subject, body, recipients):
+    """
+    Delivers the same message to every recipient over the pool.
+    Returns (sent, failed) where failed is a list of (recipient, error).
+    """
+    rendered = render_message(sender, subject, body)
+    failed = []
+    sent = 0
+
+    def deliver(recipient):
+        pool.sendmail(sender, recipient, address_message(rendered, recipient))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = {executor.submit(deliver, recipient): recipient for recipient in recipients}
+        for future, recipient in futures.items():
+            try:
+                future.result()
+                sent += 1
+            except Exception as e:
+                failed.append((recipient, e))
+    elapsed = time.perf_counter() - start
+
+    rate = sent / elapsed if elapsed > 0 else float(sent)
+    print(f"Delivered {sent}/{len(recipients)} emails in {elapsed:.2f}s ({rate:.1f} msg/s, "
+          f"{pool.size} pooled sessions, {pool.reconnects} reconnects)")
+    return sent, failed
+
+
+if __name__ == "__main__":
+    import sys
+    from smtp_sink import SMTPSink
+
+    if len(sys.argv) < 2 or sys.argv[1] != "bench":
+        print("Usage: python email_delivery.py bench [count] [pool_size]")
+        sys.exit(1)
+
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    pool_size = int(sys.argv[3]) if len(sys.argv) > 3 else SMTP_POOL_SIZE
+
+    sink = SMTPSink().start()
+    recipients = [f"subscriber{index}@example.com" for index in range(count)]
+    sender = "beach-status@example.com"
+    body = "Lakewood Beach status changed from GREEN to YELLOW."
+
+    # The old approach for comparison: a new connection and MIME message per subscriber
+    start = time.perf_counter()
+    for recipient in recipients:
+        msg = MIMEMultipart()
+        msg['From'] = sender
+        msg['To'] = recipient
+        msg['Subject'] = "Beach Status Change!"
+        msg.attach(MIMEText(body, 'plain'))
+        with smtplib.SMTP('127.0.0.1', sink.port) as server:
+            server.send_message(msg)
+    elapsed = time.perf_counter() - start
+    print(f"One connection per email: {count} emails in {elapsed:.2f}s ({count / elapsed:.1f} msg/s)")
+
+    pool = SMTPPool('127.0.0.1', sink.port, size=pool_size, use_starttls=False)
+    try:
+        send_bulk_email(pool, sender, "Beach Status Change!", body, recipients)
+    finally:
+        pool.close()
+        sink.shutdown()
+    print(f"Sink received {sink.messages} messages")
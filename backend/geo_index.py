@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Nearest-beach queries over the beach coordinates.
+
+Beaches are indexed in a KD-tree over their positions as 3D unit vectors. The
+straight-line (chord) distance between two unit vectors grows with the
+great-circle distance, so an ordinary Euclidean KD-tree answers geographic
+nearest-k and within-radius queries exactly. That holds across the poles and
+the antimeridian, where lat/lon boxes break down. Distances are reported in
+kilometres on a spherical Earth, the same as the haversine formula gives.
+
+There is one tree per status. "Nearest open beach" only searches the green
+beaches, so a query stays a few dozen distance checks even when most beaches
+are closed. A query for several statuses merges their trees' results.
+
+    index = GeoIndex(beaches)                   # status.json records, or {name: {"lat", "lon"}}
+    index.nearest(44.49, -73.23, k=3)           # [(km, beach), ...] open beaches by default
+    index.within(44.49, -73.23, 5, statuses=None)
+
+haversine_km() is the vectorized reference distance. It uses numpy when it is
+installed and a plain loop otherwise.
+
+Usage:
+    python geo_index.py nearest LAT LON [k]
+    python geo_index.py within LAT LON KM
+    python geo_index.py bench [beaches]
+"""
+
+import os
+import json
+import math
+import heapq
+
+try:
+    import numpy as np
+except ImportError:
+    # numpy is optional; haversine_km falls back to a loop
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+# Beaches per KD-tree leaf; leaves are scanned linearly
+LEAF_SIZE = 16
+OPEN_STATUSES = ('green',)
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUBLIC_DATA_DIR = os.environ.get("PUBLIC_DATA_DIR", PROJECT_ROOT)
+STATUS_FILE = os.path.join(PUBLIC_DATA_DIR, "status.json")
+
+
+def haversine_km(lat, lon, lats, lons):
+    """Great-circle distances in km from (lat, lon) to each of lats/lons."""
+    if np is not None:
+        lat1, lon1 = np.radians(lat), np.radians(lon)
+        lat2, lon2 = np.radians(np.asarray(lats, dtype=float)), np.radians(np.asarray(lons, dtype=float))
+        a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    cos_lat1 = math.cos(lat1)
+    distances = []
+    for lat2, lon2 in zip(lats, lons):
+        lat2, lon2 = math.radians(lat2), math.radians(lon2)
+        a = math.sin((lat2 - lat1) / 2) ** 2 + cos_lat1 * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+        distances.append(2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a))))
+    return distances
+
+
+def _unit_vector(lat, lon):
+    lat, lon = math.radians(lat), math.radians(lon)
+    cos_lat = math.cos(lat)
+    return (cos_lat * math.cos(lon), cos_lat * math.sin(lon), math.sin(lat))
+
+
+def _chord_to_km(chord_squared):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(chord_squared) / 2))
+
+
+def _km_to_chord_squared(km):
+    if km >= math.pi * EARTH_RADIUS_KM:
+        return 4.0
+    return (2 * math.sin(km / (2 * EARTH_RADIUS_KM))) ** 2
+
+
+class _KDTree:
+    """A static KD-tree over 3D points; nodes are (axis, split, left, right) or a leaf list of indices."""
+
+    def __init__(self, points):
+        self.points = points
+        self.root = self._build(list(range(len(points)))) if points else None
+
+    def _build(self, indices):
+        if len(indices) <= LEAF_SIZE:
+            return indices
+        # Split on the axis with the widest spread, at the median
+        spreads = [max(self.points[i][axis] for i in indices) - min(self.points[i][axis] for i in indices)
+                   for axis in range(3)]
+        axis = spreads.index(max(spreads))
+        indices.sort(key=lambda i: self.points[i][axis])
+        middle = len(indices) // 2
+        split = self.points[indices[middle]][axis]
+        return (axis, split, self._build(indices[:middle]), self._build(indices[middle:]))
+
+    def nearest(self, query, k):
+        """[(chord_squared, index)] of the k closest points, closest first."""
+        if k < 1:
+            return []
+        heap = []  # max-heap of (-chord_squared, index)
+        points = self.points
+        qx, qy, qz = query
+
+        def visit(node):
+            if isinstance(node, list):
+                for i in node:
+                    x, y, z = points[i]
+                    d = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+                    if len(heap) < k:
+                        heapq.heappush(heap, (-d, i))
+                    elif d < -heap[0][0]:
+                        heapq.heapreplace(heap, (-d, i))
+                return
+            axis, split, left, right = node
+            gap = query[axis] - split
+            near, far = (left, right) if gap < 0 else (right, left)
+            visit(near)
+            if len(heap) < k or gap * gap < -heap[0][0]:
+                visit(far)
+
+        if self.root is not None:
+            visit(self.root)
+        return sorted((-d, i) for d, i in heap)
+
+    def within(self, query, chord_squared):
+        """[(chord_squared, index)] of every point within chord_squared of query."""
+        found = []
+        points = self.points
+        qx, qy, qz = query
+
+        def visit(node):
+            if isinstance(node, list):
+                for i in node:
+                    x, y, z = points[i]
+                    d = (x - qx) ** 2 + (y - qy) ** 2 + (z - qz) ** 2
+                    if d <= chord_squared:
+                        found.append((d, i))
+                return
+            axis, split, left, right = node
+            gap = query[axis] - split
+            near, far = (left, right) if gap < 0 else (right, left)
+            visit(near)
+            if gap * gap <= chord_squared:
+                visit(far)
+
+        if self.root is not None:
+            visit(self.root)
+        return found
+
+
+class GeoIndex:
+    """
+    Nearest-k and within-radius queries over beaches, filtered by status.
+    Beaches without coordinates are left out.
+    """
+
+    def __init__(self, beaches):
+        if isinstance(beaches, dict):
+            # A coordinate map such as BEACH_COORDINATES; status unknown
+            beaches = [{"beach_name": name, "status": "unknown", "coordinates": coordinates}
+                       for name, coordinates in beaches.items()]
+
+        by_status = {}
+        for beach in beaches:
+            coordinates = beach.get("coordinates")
+            if not coordinates:
+                continue
+            by_status.setdefault(beach.get("status", "unknown"), []).append(beach)
+
+        self.trees = {}
+        for status, members in by_status.items():
+            tree = _KDTree([_unit_vector(b["coordinates"]["lat"], b["coordinates"]["lon"]) for b in members])
+            self.trees[status] = (tree, members)
+
+    def __len__(self):
+        return sum(len(members) for _, members in self.trees.values())
+
+    def _trees_for(self, statuses):
+        if statuses is None:
+            return list(self.trees.values())
+        return [self.trees[status] for status in statuses if status in self.trees]
+
+    def nearest(self, lat, lon, k=1, statuses=OPEN_STATUSES):
+        """The k closest beaches with one of statuses (None for any) as [(km, beach)], closest first."""
+        query = _unit_vector(lat, lon)
+        candidates = []
+        for tree, members in self._trees_for(statuses):
+            candidates += [(d, members[i]) for d, i in tree.nearest(query, k)]
+        candidates.sort(key=lambda item: item[0])
+        return [(_chord_to_km(d), beach) for d, beach in candidates[:k]]
+
+    def within(self, lat, lon, radius_km, statuses=OPEN_STATUSES):
+        """Every beach within radius_km with one of statuses (None for any) as [(km, beach)], closest first."""
+        query = _unit_vector(lat, lon)
+        chord_squared = _km_to_chord_squared(radius_km)
+        found = []
+        for tree, members in self._trees_for(statuses):
+            found += [(d, members[i]) for d, i in tree.within(query, chord_squared)]
+        found.sort(key=lambda item: item[0])
+        return [(_chord_to_km(d), beach) for d, beach in found]
+
+
+def load_index(status_file=STATUS_FILE):
+    with open(status_file, 'r', encoding='utf-8') as f:
+        return GeoIndex(json.load(f))
+
+
+def _print_results(results):
+    if not results:
+        print("No matching beaches.")
+    for km, beach in results:
+        print(f"{km:8.2f} km  {beach['status']:7s} {beach['beach_name']}")
+
+
+def _bench(count):
+    import time
+    import random
+
+    rng = random.Random(1)
+    statuses = ['green'] * 85 + ['yellow'] * 12 + ['red'] * 3
+    # Beaches scattered along the shores of the northeastern US and Canada
+    beaches = [{"beach_name": f"Beach {i}", "status": rng.choice(statuses),
+                "coordinates": {"lat": rng.uniform(38, 48), "lon": rng.uniform(-80, -66)}} for i in range(count)]
+    start = time.perf_counter()
+    index = GeoIndex(beaches)
+    print(f"Built the index for {count} beaches in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    queries = [(rng.uniform(38, 48), rng.uniform(-80, -66)) for _ in range(2000)]
+    for label, run in [
+        ("nearest open beach", lambda q: index.nearest(q[0], q[1], 1)),
+        ("nearest 5 open beaches", lambda q: index.nearest(q[0], q[1], 5)),
+        ("open beaches within 10 km", lambda q: index.within(q[0], q[1], 10)),
+        ("nearest closed beach", lambda q: index.nearest(q[0], q[1], 1, statuses=('red',))),
+    ]:
+        start = time.perf_counter()
+        for query in queries:
+            run(query)
+        print(f"{label:28s} {(time.perf_counter() - start) / len(queries) * 1000:.3f} ms per query")
+
+    # The tree must agree with the brute-force haversine distances
+    lat, lon = queries[0]
+    open_beaches = [b for b in beaches if b["status"] == "green"]
+    distances = haversine_km(lat, lon, [b["coordinates"]["lat"] for b in open_beaches],
+                             [b["coordinates"]["lon"] for b in open_beaches])
+    best = min(range(len(open_beaches)), key=lambda i: distances[i])
+    km, beach = index.nearest(lat, lon, 1)[0]
+    agrees = beach is open_beaches[best] and abs(km - float(distances[best])) < 1e-6
+    print(f"Brute-force check ({'numpy' if np is not None else 'pure Python'} haversine): "
+          f"{'✅ agrees' if agrees else '❌ differs'}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "nearest" and len(sys.argv) >= 4:
+        k = int(sys.argv[4]) if len(sys.argv) > 4 else 1
+        _print_results(load_index().nearest(float(sys.argv[2]), float(sys.argv[3]), k))
+    elif command == "within" and len(sys.argv) >= 5:
+        _print_results(load_index().within(float(sys.argv[2]), float(sys.argv[3]), float(sys.argv[4])))
+    elif command == "bench":
+        _bench(int(sys.argv[2]) if len(sys.argv) > 2 else 20000)
+    else:
+        print("Usage: python geo_index.py nearest LAT LON [k] | within LAT LON KM | bench [beaches]")
+        sys.exit(1)
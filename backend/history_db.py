@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Optional SQLite store for beach status history, kept alongside historical_status.csv.
+
+Records are keyed on (beach_name, record_timestamp_utc). A small latest_status
+table is maintained by a trigger, so "latest status per beach" never scans the
+history, and the date/status index keeps per-day counts proportional to the
+days asked for rather than to the size of the store.
+
+Usage:
+    python history_db.py import [csv_file] [db_file]
+    python history_db.py export [csv_file] [db_file]   (defaults to historical_status_export.csv)
+    python history_db.py latest [db_file]
+    python history_db.py history BEACH FROM_DATE TO_DATE [db_file]
+    python history_db.py counts FROM_DATE TO_DATE [db_file]
+"""
+
+import os
+import csv
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+from history_writer import HISTORY_FILE, HISTORY_FIELDNAMES
+
+HISTORY_DB_FILE = 'historical_status.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    beach_name TEXT NOT NULL,
+    record_timestamp_utc TEXT NOT NULL,
+    record_date TEXT NOT NULL,
+    status TEXT NOT NULL,
+    last_updated_from_pdf TEXT,
+    note TEXT,
+    PRIMARY KEY (beach_name, record_timestamp_utc)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_history_date_status
+    ON history (record_date, status, beach_name);
+
+CREATE INDEX IF NOT EXISTS idx_history_timestamp
+    ON history (record_timestamp_utc);
+
+CREATE TABLE IF NOT EXISTS latest_status (
+    beach_name TEXT PRIMARY KEY,
+    record_timestamp_utc TEXT NOT NULL,
+    status TEXT NOT NULL,
+    last_updated_from_pdf TEXT,
+    note TEXT
+);
+
+CREATE TRIGGER IF NOT EXISTS history_latest_status AFTER INSERT ON history
+BEGIN
+    INSERT INTO latest_status (beach_name, record_timestamp_utc, status, last_updated_from_pdf, note)
+    VALUES (NEW.beach_name, NEW.record_timestamp_utc, NEW.status, NEW.last_updated_from_pdf, NEW.note)
+    ON CONFLICT (beach_name) DO UPDATE SET
+        record_timestamp_utc = excluded.record_timestamp_utc,
+        status = excluded.status,
+        last_updated_from_pdf = excluded.last_updated_from_pdf,
+        note = excluded.note
+    WHERE excluded.record_timestamp_utc > latest_status.record_timestamp_utc;
+END;
+"""
+
+
+def _normalize_timestamp(timestamp):
+    """Returns the timestamp as a UTC ISO string so that text order matches time order."""
+    parsed = datetime.fromisoformat(timestamp.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+
+class HistoryStore:
+    """Thin wrapper around the SQLite history database."""
+
+    def __init__(self, db_file=HISTORY_DB_FILE):
+        self.db_file = db_file
+        self.conn = sqlite3.connect(db_file)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def insert_rows(self, rows):
+        """
+        Inserts history rows (dicts in the CSV schema) in one transaction.
+        Rows already in the store are ignored. Returns the number of new rows.
+        """
+        def to_params(row):
+            timestamp = _normalize_timestamp(row['record_timestamp_utc'])
+            return (row['beach_name'], timestamp, timestamp[:10], row['status'],
+                    row.get('last_updated_from_pdf', ''), row.get('note', ''))
+
+        with self.conn:
+            cursor = self.conn.executemany(
+                "INSERT OR IGNORE INTO history "
+                "(beach_name, record_timestamp_utc, record_date, status, last_updated_from_pdf, note) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (to_params(row) for row in rows)
+            )
+        print(f"Stored {cursor.rowcount} new history records in {self.db_file}.")
+        return cursor.rowcount
+
+    def latest_status_per_beach(self):
+        """Returns the most recent record for every beach."""
+        cursor = self.conn.execute(
+            "SELECT beach_name, record_timestamp_utc, status, last_updated_from_pdf, note "
+            "FROM latest_status ORDER BY beach_name"
+        )
+        return [dict(row) for row in cursor]
+
+    def beach_history(self, beach_name, start_date, end_date):
+        """
+        Returns the records for one beach between two dates (YYYY-MM-DD), inclusive,
+        oldest first.
+        """
+        cursor = self.conn.execute(
+            "SELECT record_timestamp_utc, beach_name, status, last_updated_from_pdf, note "
+            "FROM history WHERE beach_name = ? AND record_timestamp_utc >= ? AND record_timestamp_utc < ? "
+            "ORDER BY record_timestamp_utc",
+            (beach_name, start_date, _day_after(end_date))
+        )
+        return [dict(row) for row in cursor]
+
+    def status_counts_per_day(self, start_date, end_date):
+        """
+        Returns {date: {status: number_of_beaches}} for each day between two dates
+        (YYYY-MM-DD), inclusive. A beach logged with two statuses on one day counts
+        towards both.
+        """
+        cursor = self.conn.execute(
+            "SELECT record_date, status, COUNT(DISTINCT beach_name) AS beaches "
+            "FROM history WHERE record_date BETWEEN ? AND ? "
+            "GROUP BY record_date, status ORDER BY record_date",
+            (start_date, end_date)
+        )
+        counts = {}
+        for row in cursor:
+            counts.setdefault(row['record_date'], {})[row['status']] = row['beaches']
+        return counts
+
+    def import_csv(self, csv_file=HISTORY_FILE):
+        """Loads every row of a history CSV into the store. Returns the number of new rows."""
+        with open(csv_file, 'r', newline='', encoding='utf-8') as f:
+            return self.insert_rows(csv.DictReader(f))
+
+    def export_csv(self, csv_file):
+        """Writes the whole store out in the historical_status.csv format, oldest first."""
+        cursor = self.conn.execute(
+            "SELECT record_timestamp_utc, beach_name, status, last_updated_from_pdf, note "
+            "FROM history ORDER BY record_timestamp_utc"
+        )
+        count = 0
+        with open(csv_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDNAMES)
+            writer.writeheader()
+            for row in cursor:
+                writer.writerow(dict(row))
+                count += 1
+        return count
+
+
+def _day_after(date_string):
+    """Returns the ISO date following date_string, used as an exclusive upper bound."""
+    return (date.fromisoformat(date_string) + timedelta(days=1)).isoformat()
+
+
+if __name__ == "__main__":
+    import sys
+    import json
+
+    args = sys.argv[1:]
+    command = args.pop(0) if args else None
+
+    if command == "import":
+        csv_file = args[0] if len(args) > 0 else HISTORY_FILE
+        db_file = args[1] if len(args) > 1 else HISTORY_DB_FILE
+        if not os.path.isfile(csv_file):
+            print(f"❌ {csv_file} not found")
+            sys.exit(1)
+        with HistoryStore(db_file) as store:
+            store.import_csv(csv_file)
+    elif command == "export":
+        # Never overwrite the live history CSV unless asked to explicitly
+        csv_file = args[0] if len(args) > 0 else 'historical_status_export.csv'
+        db_file = args[1] if len(args) > 1 else HISTORY_DB_FILE
+        with HistoryStore(db_file) as store:
+            count = store.export_csv(csv_file)
+        print(f"✅ Exported {count} records to {csv_file}")
+    elif command == "latest":
+        with HistoryStore(args[0] if args else HISTORY_DB_FILE) as store:
+            print(json.dumps(store.latest_status_per_beach(), indent=2))
+    elif command == "history" and len(args) >= 3:
+        with HistoryStore(args[3] if len(args) > 3 else HISTORY_DB_FILE) as store:
+            print(json.dumps(store.beach_history(args[0], args[1], args[2]), indent=2))
+    elif command == "counts" and len(args) >= 2:
+        with HistoryStore(args[2] if len(args) > 2 else HISTORY_DB_FILE) as store:
+            print(json.dumps(store.status_counts_per_day(args[0], args[1]), indent=2))
+    else:
+        print("Usage: python history_db.py import|export [csv_file] [db_file]")
+        print("       python history_db.py latest [db_file]")
+        print("       python history_db.py history BEACH FROM_DATE TO_DATE [db_file]")
+        print("       python history_db.py counts FROM_DATE TO_DATE [db_file]")
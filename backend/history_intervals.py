@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+"""
+Interval-encoded (run-length) form of the history CSV.
+
+Most history rows repeat the previous row for the same beach: a daily snapshot
+of "green, Open" day after day. The interval file stores one record per beach
+per uninterrupted run of the same status and note:
+
+    {"beach": ..., "status": ..., "note": ..., "start": ..., "end": ..., "count": N,
+     "times": [microseconds between consecutive records], "pdf": [[last_updated_from_pdf, repeats], ...]}
+
+(times is run-length encoded as well: [delta, repeats] stands for repeated equal gaps.)
+
+start and end are the record timestamps of the first and last row exactly as
+they appear in the CSV, so readers that only need "what was the status, and
+since when" never expand the run. times and pdf make the encoding lossless:
+together with the beach order they reproduce the CSV row for row.
+
+The history is kept in three files next to the CSV, in step with it via HistoryWriter:
+
+- historical_status_intervals.jsonl holds the closed intervals. It only ever
+  grows: when a beach's status changes, its finished interval is appended.
+- historical_status_intervals_tail<N>.jsonl holds the rows of the open (latest)
+  intervals, one JSON list per row. New rows are only appended to it; an
+  interval's rows are read back and encoded once, when the interval closes.
+  Once more of the tail belongs to closed intervals than to open ones, the live
+  rows are copied to the next generation N+1.
+- historical_status_intervals_open.json holds, for every beach, where its open
+  interval stands (status, note, start, end, count) and where its rows begin in
+  the tail, plus the beach order, the CSV size the history was built from and
+  how many bytes of the other two files belong to it. It is rewritten on every
+  flush, but its size depends on the number of beaches, not on the history.
+
+A flush therefore costs about the size of the rows it adds, however long a beach
+has kept its status.
+
+If the CSV changes behind their back, readers fall back to the CSV and the
+next write rebuilds both files.
+
+Usage:
+    python history_intervals.py from-csv [history.csv]     # (re)build the interval file
+    python history_intervals.py to-csv [output.csv]        # expand it back into CSV rows
+    python history_intervals.py verify [history.csv]       # round-trip check and size comparison
+"""
+
+import os
+import csv
+import json
+from datetime import datetime, timedelta, timezone
+
+INTERVALS_FORMAT = "beach-history-intervals"
+INTERVALS_VERSION = 3
+# Column order of a tail row (the CSV's)
+TAIL_FIELDS = ('record_timestamp_utc', 'beach_name', 'status', 'last_updated_from_pdf', 'note')
+
+
+def intervals_path(history_file):
+    """historical_status.csv -> historical_status_intervals.jsonl"""
+    return os.path.splitext(history_file)[0] + "_intervals.jsonl"
+
+
+def open_intervals_path(path):
+    """historical_status_intervals.jsonl -> historical_status_intervals_open.json"""
+    return os.path.splitext(path)[0] + "_open.json"
+
+
+def tail_path(path, generation):
+    """historical_status_intervals.jsonl -> historical_status_intervals_tail<generation>.jsonl"""
+    return f"{os.path.splitext(path)[0]}_tail{generation}.jsonl"
+
+
+def _write_atomically(path, text):
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', newline='', encoding='utf-8') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+
+
+def _interval_line(interval):
+    return json.dumps(interval, ensure_ascii=False, separators=(',', ':')) + "\n"
+
+
+def _tail_line(row):
+    return (json.dumps([row[field] for field in TAIL_FIELDS], ensure_ascii=False, separators=(',', ':'))
+            + "\n").encode('utf-8')
+
+
+def _iter_tail(data, offset):
+    """Yields (offset, row) for the tail lines in data, which starts at offset in the tail file."""
+    for line in data.splitlines(keepends=True):
+        yield offset, dict(zip(TAIL_FIELDS, json.loads(line)))
+        offset += len(line)
+
+
+def _append_at(path, size, data):
+    """Appends data at size, cutting off anything a writer that died left past it."""
+    with open(path, 'r+b') as f:
+        f.truncate(size)
+        f.seek(size)
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def _parse_time(text):
+    return datetime.fromisoformat(text.replace('Z', '+00:00')).astimezone(timezone.utc)
+
+
+def _time_style(text, parsed):
+    """How a timestamp string can be rebuilt from its datetime, or None if it can't."""
+    if parsed.isoformat() == text:
+        return "iso"
+    if parsed.isoformat(timespec='microseconds') == text:
+        return "us"
+    return None
+
+
+def _format_time(parsed, style):
+    return parsed.isoformat(timespec='microseconds') if style == "us" else parsed.isoformat()
+
+
+def _microseconds(delta):
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+
+def _append_delta(times, delta):
+    """times is run-length encoded too: an int is one delta, [delta, n] is n equal deltas."""
+    if times and isinstance(times[-1], list) and times[-1][0] == delta:
+        times[-1][1] += 1
+    elif times and times[-1] == delta:
+        times[-1] = [delta, 2]
+    else:
+        times.append(delta)
+
+
+def _expand_deltas(times):
+    deltas = []
+    for entry in times:
+        if isinstance(entry, list):
+            deltas.extend([entry[0]] * entry[1])
+        else:
+            deltas.append(entry)
+    return deltas
+
+
+class IntervalHistory:
+    """In-memory interval history: header plus a chronological list of intervals."""
+
+    def __init__(self, csv_size=0):
+        self.beaches = []          # beach order, used to order rows that share a timestamp
+        self.intervals = []
+        self.csv_size = csv_size
+        self._open = {}            # beach -> index of its latest interval
+        self._last_parsed = {}     # beach -> datetime of its latest row
+
+    def add_row(self, row):
+        """
+        Appends one CSV row. Returns False (and adds nothing) if the row is older than the
+        latest row for its beach, since an interval can only be extended forwards.
+        """
+        beach = row['beach_name']
+        timestamp = row['record_timestamp_utc']
+        parsed = _parse_time(timestamp)
+        style = _time_style(timestamp, parsed)
+
+        if beach in self._last_parsed and parsed < self._last_parsed[beach]:
+            return False
+        if beach not in self._open:
+            self.beaches.append(beach)
+
+        index = self._open.get(beach)
+        current = self.intervals[index] if index is not None else None
+        if (current is not None and current['status'] == row['status'] and current['note'] == row['note']
+                and (style or "raw") == current['ts']):
+            _append_delta(current['times'], _microseconds(parsed - self._last_parsed[beach]))
+            if current['ts'] == "raw":
+                current['raw_times'].append(timestamp)
+            current['end'] = timestamp
+            current['count'] += 1
+            pdf = current['pdf']
+            if pdf[-1][0] == row['last_updated_from_pdf']:
+                pdf[-1][1] += 1
+            else:
+                pdf.append([row['last_updated_from_pdf'], 1])
+        else:
+            interval = {
+                'beach': beach,
+                'status': row['status'],
+                'note': row['note'],
+                'start': timestamp,
+                'end': timestamp,
+                'count': 1,
+                'ts': style or "raw",
+                'times': [],
+                'pdf': [[row['last_updated_from_pdf'], 1]]
+            }
+            if interval['ts'] == "raw":
+                # Timestamps that don't survive a datetime round trip are kept verbatim
+                interval['raw_times'] = [timestamp]
+            self._open[beach] = len(self.intervals)
+            self.intervals.append(interval)
+
+        self._last_parsed[beach] = parsed
+        return True
+
+    @staticmethod
+    def _interval_rows(interval):
+        """Yields (datetime, row) for each CSV row of one interval."""
+        parsed = _parse_time(interval['start'])
+        pdf_dates = [date for date, repeats in interval['pdf'] for _ in range(repeats)]
+        deltas = _expand_deltas(interval['times'])
+        for position in range(interval['count']):
+            if position:
+                parsed = parsed + timedelta(microseconds=deltas[position - 1])
+            if interval['ts'] == "raw":
+                timestamp = interval['raw_times'][position]
+            else:
+                timestamp = _format_time(parsed, interval['ts'])
+            yield parsed, {
+                'record_timestamp_utc': timestamp,
+                'beach_name': interval['beach'],
+                'status': interval['status'],
+                'last_updated_from_pdf': pdf_dates[position],
+                'note': interval['note']
+            }
+
+    def iter_rows(self):
+        """Expands the intervals back into CSV rows, in the CSV's order."""
+        order = {beach: position for position, beach in enumerate(self.beaches)}
+        rows = []
+        for interval in self.intervals:
+            rows.extend((parsed, order[interval['beach']], row) for parsed, row in self._interval_rows(interval))
+        # Rows of one run share (or nearly share) a timestamp and were written in beach order
+        rows.sort(key=lambda item: (item[0], item[1]))
+        for _, _, row in rows:
+            yield row
+
+    def iter_day_records(self):
+        """
+        Yields (beach, day, status, timestamp) once for every UTC day an interval has a
+        record on, without expanding the rows; per beach, days come in order. timestamp is
+        the end of the interval, an upper bound for its records.
+        """
+        for interval in self.intervals:
+            parsed = _parse_time(interval['start'])
+            last_day = None
+            for delta in [0] + _expand_deltas(interval['times']):
+                if delta:
+                    parsed = parsed + timedelta(microseconds=delta)
+                day = parsed.date()
+                if day != last_day:
+                    yield interval['beach'], day.isoformat(), interval['status'], interval['end']
+                    last_day = day
+
+    def latest_per_beach(self):
+        """{beach: latest interval}"""
+        return {beach: self.intervals[index] for beach, index in self._open.items()}
+
+    def _closed_intervals(self):
+        open_indexes = set(self._open.values())
+        return [interval for index, interval in enumerate(self.intervals) if index not in open_indexes]
+
+    def save(self, path):
+        """Writes all three files from scratch."""
+        previous = OpenIntervals.load(path)
+        header = json.dumps({'format': INTERVALS_FORMAT, 'version': INTERVALS_VERSION}) + "\n"
+        closed = header + "".join(_interval_line(interval) for interval in self._closed_intervals())
+        _write_atomically(path, closed)
+
+        generation = previous.generation + 1 if previous is not None else 0
+        tail, cursors = [], {}
+        size = 0
+        for beach, interval in self.latest_per_beach().items():
+            cursors[beach] = _cursor(interval, size)
+            for _, row in self._interval_rows(interval):
+                tail.append(_tail_line(row))
+                size += len(tail[-1])
+        with open(tail_path(path, generation), 'wb') as f:
+            f.write(b"".join(tail))
+            f.flush()
+            os.fsync(f.fileno())
+
+        OpenIntervals(path, {
+            'format': INTERVALS_FORMAT,
+            'version': INTERVALS_VERSION,
+            'csv_size': self.csv_size,
+            'closed_size': len(closed.encode('utf-8')),
+            'generation': generation,
+            'tail_size': size,
+            'dead_rows': 0,
+            'beaches': self.beaches,
+            'open': cursors
+        }).save(previous)
+
+    @classmethod
+    def load(cls, path):
+        """Returns the whole interval history in path, or None if it is missing or unreadable."""
+        state = OpenIntervals.load(path)
+        if state is None:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                header = json.loads(f.readline())
+                if header.get('format') != INTERVALS_FORMAT or header.get('version') != INTERVALS_VERSION:
+                    return None
+                closed = [json.loads(line) for line in f.read(state.closed_size - f.tell()).splitlines()]
+            # The open intervals are encoded from their rows in the tail
+            latest = state.fold({beach: cursor['tail_from'] for beach, cursor in state.cursors.items()})
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if {beach: interval['count'] for beach, interval in latest.latest_per_beach().items()} != \
+                {beach: cursor['count'] for beach, cursor in state.cursors.items()}:
+            return None
+
+        history = cls(state.csv_size)
+        history.beaches = state.beaches
+        history.intervals = closed + latest.intervals
+        history._open = {beach: index + len(closed) for beach, index in latest._open.items()}
+        history._last_parsed = latest._last_parsed
+        return history
+
+
+def _cursor(interval, tail_from):
+    cursor = {key: interval[key] for key in ('status', 'note', 'start', 'end', 'count', 'ts')}
+    cursor['tail_from'] = tail_from
+    return cursor
+
+
+class OpenIntervals:
+    """
+    The open end of an interval history as kept in historical_status_intervals_open.json:
+    a cursor per beach (its open interval's status, note, start, end, count, timestamp
+    style, and the tail offset where its rows begin). Enough to extend the history
+    without reading any interval's rows.
+    """
+
+    def __init__(self, path, state):
+        self.path = path
+        self.state = state
+        self.cursors = state['open']
+        self.beaches = state['beaches']
+
+    csv_size = property(lambda self: self.state['csv_size'])
+    closed_size = property(lambda self: self.state['closed_size'])
+    generation = property(lambda self: self.state['generation'])
+
+    @property
+    def tail_file(self):
+        return tail_path(self.path, self.generation)
+
+    @classmethod
+    def load(cls, path):
+        """The open-interval state of the history in path, or None if it is missing, unreadable or incomplete."""
+        try:
+            with open(open_intervals_path(path), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('format') != INTERVALS_FORMAT or state.get('version') != INTERVALS_VERSION:
+                return None
+            open_intervals = cls(path, state)
+            if (os.path.getsize(path) < state['closed_size']
+                    or os.path.getsize(open_intervals.tail_file) < state['tail_size']):
+                return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            return None
+        return open_intervals
+
+    def save(self, previous=None):
+        """Records this state; previous is the one it replaces, whose old tail generation is removed."""
+        _write_atomically(open_intervals_path(self.path), json.dumps(self.state, ensure_ascii=False))
+        if previous is not None and previous.generation != self.generation:
+            try:
+                os.remove(previous.tail_file)
+            except OSError:
+                pass
+
+    def latest(self):
+        """{beach: {status, note, start, end, count}} for the open interval of every beach."""
+        return {beach: {key: cursor[key] for key in ('status', 'note', 'start', 'end', 'count')}
+                for beach, cursor in self.cursors.items()}
+
+    def fold(self, starts):
+        """Encodes the tail rows of each beach in starts ({beach: tail offset}) from its offset on."""
+        history = IntervalHistory()
+        if not starts:
+            return history
+        begin = min(starts.values())
+        with open(self.tail_file, 'rb') as f:
+            f.seek(begin)
+            data = f.read(self.state['tail_size'] - begin)
+        for offset, row in _iter_tail(data, begin):
+            start = starts.get(row['beach_name'])
+            if start is not None and offset >= start:
+                history.add_row(row)
+        return history
+
+    def extend(self, rows, csv_size):
+        """
+        Appends rows to the tail, and any intervals they close to the closed file, then
+        records the new state. Returns False (and writes nothing) if a row is older than
+        the latest row for its beach, since an interval can only be extended forwards.
+        """
+        tail_size = offset = self.state['tail_size']
+        lines = []
+        # beach -> tail offset of the first of its intervals that these rows close
+        closing = {}
+        last_parsed = {}
+        for row in rows:
+            beach = row['beach_name']
+            timestamp = row['record_timestamp_utc']
+            parsed = _parse_time(timestamp)
+            style = _time_style(timestamp, parsed) or "raw"
+            cursor = self.cursors.get(beach)
+            if cursor is not None:
+                if beach not in last_parsed:
+                    last_parsed[beach] = _parse_time(cursor['end'])
+                if parsed < last_parsed[beach]:
+                    return False
+            last_parsed[beach] = parsed
+
+            if cursor is not None and (cursor['status'], cursor['note'], cursor['ts']) == (row['status'], row['note'], style):
+                cursor['end'] = timestamp
+                cursor['count'] += 1
+            else:
+                if cursor is None:
+                    self.beaches.append(beach)
+                else:
+                    closing.setdefault(beach, cursor['tail_from'])
+                self.cursors[beach] = _cursor({'status': row['status'], 'note': row['note'], 'start': timestamp,
+                                               'end': timestamp, 'count': 1, 'ts': style}, offset)
+            lines.append(_tail_line(row))
+            offset += len(lines[-1])
+
+        data = b"".join(lines)
+        _append_at(self.tail_file, tail_size, data)
+        self.state['tail_size'] = tail_size + len(data)
+
+        if closing:
+            # Each closing beach's rows up to its open interval, encoded now that they are final
+            closed = self.fold(closing)._closed_intervals()
+            lines = "".join(_interval_line(interval) for interval in closed).encode('utf-8')
+            _append_at(self.path, self.state['closed_size'], lines)
+            self.state['closed_size'] += len(lines)
+            self.state['dead_rows'] += sum(interval['count'] for interval in closed)
+        self.state['csv_size'] = csv_size
+
+        previous = None
+        if self.state['dead_rows'] > sum(cursor['count'] for cursor in self.cursors.values()):
+            previous = OpenIntervals(self.path, dict(self.state))
+            self._compact()
+        self.save(previous)
+        return True
+
+    def _compact(self):
+        """Copies the rows of the open intervals into the next tail generation."""
+        with open(self.tail_file, 'rb') as f:
+            data = f.read(self.state['tail_size'])
+        kept = []
+        size = 0
+        moved = set()
+        for offset, row in _iter_tail(data, 0):
+            cursor = self.cursors[row['beach_name']]
+            if offset < cursor['tail_from']:
+                continue
+            if row['beach_name'] not in moved:
+                moved.add(row['beach_name'])
+                cursor['tail_from'] = size
+            kept.append(_tail_line(row))
+            size += len(kept[-1])
+        self.state['generation'] += 1
+        with open(self.tail_file, 'wb') as f:
+            f.write(b"".join(kept))
+            f.flush()
+            os.fsync(f.fileno())
+        self.state['tail_size'] = size
+        self.state['dead_rows'] = 0
+
+
+def _sort_key(row):
+    try:
+        return _parse_time(row['record_timestamp_utc'])
+    except (KeyError, TypeError, ValueError):
+        return datetime.max.replace(tzinfo=timezone.utc)
+
+
+def build_from_csv(history_file):
+    """
+    Builds the interval history for a whole CSV. Rows appended out of time order
+    (e.g. by a backfill) are placed by their timestamp; malformed rows are reported and skipped.
+    """
+    history = IntervalHistory()
+    skipped = 0
+    if os.path.isfile(history_file):
+        with open(history_file, 'r', newline='', encoding='utf-8') as f:
+            rows = list(csv.DictReader(f))
+        # Stable sort: already ordered files (the normal case) keep their exact row order
+        if any(rows[i]['record_timestamp_utc'] > rows[i + 1]['record_timestamp_utc'] for i in range(len(rows) - 1)):
+            rows.sort(key=_sort_key)
+        for row in rows:
+            try:
+                added = history.add_row(row)
+            except (KeyError, TypeError, ValueError):
+                added = False
+            skipped += not added
+        history.csv_size = os.path.getsize(history_file)
+    if skipped:
+        print(f"⚠️ {skipped} malformed rows of {history_file} were left out of the interval history.")
+    return history
+
+
+def load_latest_intervals(history_file):
+    """
+    {beach: {status, note, start, end, count}} for the open interval of every beach,
+    read from the open-interval file alone. None if it isn't in step with the CSV.
+    """
+    open_intervals = OpenIntervals.load(intervals_path(history_file))
+    try:
+        if open_intervals is None or os.path.getsize(history_file) != open_intervals.csv_size:
+            return None
+    except OSError:
+        return None
+    return open_intervals.latest()
+
+
+def load_current(history_file):
+    """The interval history for history_file if it is in step with the CSV, else None."""
+    history = IntervalHistory.load(intervals_path(history_file))
+    if history is None:
+        return None
+    try:
+        if os.path.getsize(history_file) != history.csv_size:
+            return None
+    except OSError:
+        return None
+    return history
+
+
+def extend_intervals(history_file, rows, csv_size_before, csv_size_after):
+    """
+    Extends the interval history after rows were appended to the CSV (called by HistoryWriter).
+    The rows are appended to the tail; only the intervals they close are read back from it
+    and appended to the closed file. The files are rebuilt from the CSV when they are
+    missing, out of step, or a row is out of order.
+    """
+    path = intervals_path(history_file)
+    open_intervals = OpenIntervals.load(path)
+    if open_intervals is None or open_intervals.csv_size != csv_size_before \
+            or not open_intervals.extend(rows, csv_size_after):
+        build_from_csv(history_file).save(path)
+
+
+def load_history_rows(history_file):
+    """All history rows, expanded from the interval file when it is current, otherwise read from the CSV."""
+    history = load_current(history_file)
+    if history is not None:
+        return list(history.iter_rows())
+    if not os.path.isfile(history_file):
+        return []
+    with open(history_file, 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    from history_writer import HISTORY_FILE, HISTORY_FIELDNAMES
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "from-csv":
+        history_file = sys.argv[2] if len(sys.argv) > 2 else HISTORY_FILE
+        history = build_from_csv(history_file)
+        history.save(intervals_path(history_file))
+        print(f"Wrote {len(history.intervals)} intervals for {len(history.beaches)} beaches to {intervals_path(history_file)}")
+
+    elif command == "to-csv":
+        output_file = sys.argv[2] if len(sys.argv) > 2 else 'historical_status_from_intervals.csv'
+        history = IntervalHistory.load(intervals_path(HISTORY_FILE))
+        if history is None:
+            print(f"No interval history at {intervals_path(HISTORY_FILE)}. Run: python history_intervals.py from-csv")
+            sys.exit(1)
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=HISTORY_FIELDNAMES)
+            writer.writeheader()
+            writer.writerows(history.iter_rows())
+        print(f"Wrote {sum(interval['count'] for interval in history.intervals)} rows to {output_file}")
+
+    elif command == "verify":
+        history_file = sys.argv[2] if len(sys.argv) > 2 else HISTORY_FILE
+        with open(history_file, 'r', newline='', encoding='utf-8') as f:
+            original = list(csv.DictReader(f))
+
+        start = time.perf_counter()
+        history = build_from_csv(history_file)
+        encode_ms = (time.perf_counter() - start) * 1000
+        rows = list(history.iter_rows())
+
+        path = intervals_path(history_file) + '.verify'
+        history.save(path)
+        start = time.perf_counter()
+        open_intervals = OpenIntervals.load(path)
+        latest = open_intervals.latest()
+        read_ms = (time.perf_counter() - start) * 1000
+        files = (path, open_intervals_path(path), open_intervals.tail_file)
+        interval_size = sum(os.path.getsize(file) for file in files)
+        tail_size = os.path.getsize(open_intervals.tail_file)
+        for file in files:
+            os.remove(file)
+
+        print(f"Rows: {len(original)} -> {len(history.intervals)} intervals (encoded in {encode_ms:.1f} ms)")
+        print(f"Size: {os.path.getsize(history_file)} bytes CSV, {interval_size} bytes intervals "
+              f"({tail_size} of them the open intervals' rows, kept unencoded in the tail)")
+        print(f"Latest status for {len(latest)} beaches read in {read_ms:.1f} ms")
+        if rows == original:
+            print("✅ Round trip is lossless")
+        elif rows == sorted(original, key=_sort_key):
+            print("✅ Round trip is lossless (rows come back in timestamp order; the CSV has out-of-order appends)")
+        else:
+            print("❌ Round trip differs from the CSV")
+            sys.exit(1)
+
+    else:
+        print("Usage: python history_intervals.py from-csv [history.csv] | to-csv [output.csv] | verify [history.csv]")
+        sys.exit(1)
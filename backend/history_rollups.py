@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Precomputed history rollups for the overview page.
+
+Instead of the browser downloading and scanning historical_status.csv, the checker
+keeps a small history_rollup.json next to status.json with, for every beach:
+  - daily:           the last logged status of each UTC day (recent days only)
+  - open_percentage: share of logged days that were green over the last 7, 30 and 90 days
+  - streak:          the status of the latest day and how many consecutive days it has held
+
+The rollup is updated from the rows appended by each run rather than rebuilt from the CSV;
+the history is only read in full when the rollup file does not exist yet (from the
+interval-encoded history when it is current, which is much smaller than the CSV).
+"""
+
+import os
+import json
+from datetime import date, datetime, timedelta, timezone
+
+from history_writer import HISTORY_FILE
+from history_intervals import load_current, load_history_rows
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUBLIC_DATA_DIR = os.environ.get("PUBLIC_DATA_DIR", PROJECT_ROOT)
+ROLLUP_FILE = os.path.join(PUBLIC_DATA_DIR, "history_rollup.json")
+
+OPEN_PERCENTAGE_WINDOWS = [7, 30, 90]
+# How many days of per-day statuses to keep in the rollup (also what the timeline shows)
+DAILY_RETENTION_DAYS = 120
+
+
+def _record_date(row):
+    return datetime.fromisoformat(row['record_timestamp_utc'].replace('Z', '+00:00')).astimezone(timezone.utc).date()
+
+
+def _open_percentages(daily, today):
+    percentages = {}
+    for window in OPEN_PERCENTAGE_WINDOWS:
+        logged = open_days = 0
+        for offset in range(window):
+            status = daily.get((today - timedelta(days=offset)).isoformat())
+            if status is None:
+                continue
+            logged += 1
+            if status == 'green':
+                open_days += 1
+        percentages[str(window)] = round(open_days / logged * 100) if logged else None
+    return percentages
+
+
+def _current_streak(daily, previous_streak):
+    """Walks back from the latest logged day while the status holds."""
+    if not daily:
+        return None
+
+    latest_day = max(daily)
+    status = daily[latest_day]
+    since = date.fromisoformat(latest_day)
+
+    while True:
+        previous_day = (since - timedelta(days=1)).isoformat()
+        if previous_day not in daily:
+            break
+        if daily[previous_day] != status:
+            break
+        since -= timedelta(days=1)
+
+    # Days older than the retention window have been pruned; carry an older start forward
+    oldest_kept = min(daily)
+    if (since.isoformat() == oldest_kept and previous_streak
+            and previous_streak.get('status') == status and previous_streak['since'] < oldest_kept):
+        since = date.fromisoformat(previous_streak['since'])
+
+    return {
+        'status': status,
+        'since': since.isoformat(),
+        'days': (date.fromisoformat(latest_day) - since).days + 1
+    }
+
+
+def load_rollup(rollup_file=ROLLUP_FILE):
+    try:
+        with open(rollup_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def _row_day_records(rows):
+    """(beach, day, status, timestamp) for each well-formed history row."""
+    for row in rows:
+        try:
+            yield row['beach_name'], _record_date(row).isoformat(), row['status'], row['record_timestamp_utc']
+        except (KeyError, ValueError):
+            continue
+
+
+def _history_day_records(history_file):
+    """Every (beach, day, status, timestamp) in the history, from the interval file when it is current."""
+    history = load_current(history_file)
+    if history is not None:
+        return list(history.iter_day_records())
+    return list(_row_day_records(load_history_rows(history_file)))
+
+
+def update_history_rollup(new_rows, rollup_file=ROLLUP_FILE, history_file=HISTORY_FILE, today=None):
+    """
+    Folds newly appended history rows into the rollup file and refreshes the
+    windowed percentages. Rows are applied in order, so a later record for the
+    same beach and day replaces an earlier one.
+    """
+    rollup = load_rollup(rollup_file)
+    if rollup is None:
+        # First run: seed the rollup from the whole history once
+        print(f"{rollup_file} not found. Building history rollup from {history_file}.")
+        records = _history_day_records(history_file)
+        rollup = {'beaches': {}}
+    else:
+        records = list(_row_day_records(new_rows))
+
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+
+    beaches = rollup['beaches']
+    touched = set()
+    for beach_name, day, status, timestamp in records:
+        beach = beaches.setdefault(beach_name, {'daily': {}, 'streak': None})
+        beach['daily'][day] = status
+        touched.add(beach_name)
+
+        if timestamp > rollup.get('last_record_timestamp_utc', ''):
+            rollup['last_record_timestamp_utc'] = timestamp
+
+    # Retention is measured from the newest logged day, so a paused checker doesn't empty the rollup
+    newest_day = max((max(beach['daily']) for beach in beaches.values() if beach['daily']), default=today.isoformat())
+    cutoff = (date.fromisoformat(newest_day) - timedelta(days=DAILY_RETENTION_DAYS)).isoformat()
+
+    for beach_name, beach in beaches.items():
+        daily = beach['daily']
+        for day in [day for day in daily if day < cutoff]:
+            del daily[day]
+        if beach_name in touched:
+            beach['streak'] = _current_streak(daily, beach.get('streak'))
+        # Windows are relative to today, so they move even for beaches with no new rows
+        beach['open_percentage'] = _open_percentages(daily, today)
+
+    rollup['generated_at'] = datetime.now(timezone.utc).isoformat()
+    rollup['windows'] = OPEN_PERCENTAGE_WINDOWS
+
+    temp_file = rollup_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(rollup, f, separators=(',', ':'), sort_keys=True)
+    os.replace(temp_file, rollup_file)
+    print(f"Updated {rollup_file} with {len(records)} new records for {len(touched)} beaches.")
+    return rollup
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "rebuild":
+        if os.path.exists(ROLLUP_FILE):
+            os.remove(ROLLUP_FILE)
+        update_history_rollup([])
+    else:
+        print("Usage: python history_rollups.py rebuild")
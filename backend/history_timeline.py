@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Point-in-time queries over the history: "what was beach X at time T" and
+"which beaches were in status S at some point between T1 and T2".
+
+The index keeps, per beach, the sorted times at which its status or note
+changed (a beach is assumed to keep the status of its latest record until the
+next one). Those change points are also the beach's intervals: change point i
+covers [times[i], times[i + 1]). A point lookup is one bisection; a window
+query is two bisections per beach that has ever had the status, and returns the
+intervals that overlap the window.
+
+The index is written next to the CSV (historical_status_timeline.idx) as a JSON
+header followed by the raw int64/int32 arrays, and is memory-mapped when opened,
+so opening it reads only the header. The header records how many bytes of the
+CSV it covers (and a hash of the bytes just before that point). On open, rows
+appended since are read from that offset and added to the beaches they touch;
+the whole CSV is only read again if it was rewritten, truncated or had a row
+appended out of time order.
+
+Naive times are read in HISTORY_TIMEZONE (Burlington's local time by default),
+and a bare date as the end of a window includes that whole day.
+
+Usage:
+    python history_timeline.py build [history.csv]
+    python history_timeline.py at "2025-08-09 14:00" [--beach NAME]
+    python history_timeline.py during STATUS START END     # STATUS: green/yellow/red or open/advisory/closed
+    python history_timeline.py bench [beaches] [days]
+"""
+
+import io
+import os
+import csv
+import sys
+import json
+import mmap
+import struct
+import hashlib
+from array import array
+from bisect import bisect_right
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from history_writer import HISTORY_FILE, HISTORY_FIELDNAMES
+
+HISTORY_TIMEZONE = os.environ.get("HISTORY_TIMEZONE", "America/New_York")
+TIMELINE_FORMAT = b"BTLINE01"
+STATUS_ALIASES = {"open": "green", "advisory": "yellow", "closed": "red"}
+# Bytes of the CSV before the covered offset that must be unchanged for a catch-up
+TAIL_CHECK_BYTES = 4096
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def timeline_path(history_file):
+    """historical_status.csv -> historical_status_timeline.idx"""
+    return os.path.splitext(history_file)[0] + "_timeline.idx"
+
+
+def to_micros(moment):
+    """Microseconds since the epoch for a datetime or an ISO string; naive times are in HISTORY_TIMEZONE."""
+    if isinstance(moment, str):
+        moment = datetime.fromisoformat(moment.replace('Z', '+00:00'))
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=ZoneInfo(HISTORY_TIMEZONE))
+    return (moment - _EPOCH) // _MICROSECOND
+
+
+def _end_micros(end):
+    """Like to_micros, but a bare date ("2025-08-09") as the end of a window includes the whole day."""
+    if isinstance(end, str) and len(end) == 10:
+        return to_micros(datetime.fromisoformat(end) + timedelta(days=1)) - 1
+    return to_micros(end)
+
+
+def from_micros(micros):
+    return (_EPOCH + timedelta(microseconds=micros)).isoformat()
+
+
+def _tail_hash(history_file, offset):
+    with open(history_file, 'rb') as f:
+        f.seek(max(0, offset - TAIL_CHECK_BYTES))
+        return hashlib.sha256(f.read(min(offset, TAIL_CHECK_BYTES))).hexdigest()
+
+
+class TimelineIndex:
+    """Per-beach change points: times (int64 microseconds), status and note (indexes into strings)."""
+
+    def __init__(self, history_file=HISTORY_FILE):
+        self.history_file = history_file
+        self.strings = []
+        self._codes = {}
+        # beach -> [times, statuses, notes, last record time, statuses the beach has had]
+        self.beaches = {}
+        self.csv_offset = 0
+        self._mmap = None
+
+    def _code(self, text):
+        code = self._codes.get(text)
+        if code is None:
+            code = self._codes[text] = len(self.strings)
+            self.strings.append(text)
+        return code
+
+    def add_row(self, row):
+        """
+        Adds one history row. Returns False (and adds nothing) if it is older than the
+        beach's latest record, which only a rebuild can place.
+        """
+        micros = to_micros(row['record_timestamp_utc'])
+        status, note = self._code(row['status']), self._code(row['note'])
+        beach = self.beaches.get(row['beach_name'])
+        if beach is None:
+            beach = self.beaches[row['beach_name']] = [array('q'), array('i'), array('i'), micros, set()]
+        elif micros < beach[3]:
+            return False
+        times, statuses, notes = beach[0], beach[1], beach[2]
+        if not isinstance(times, array):
+            # Still a view of the mapped file; appending needs a private copy
+            times, statuses, notes = array('q', times), array('i', statuses), array('i', notes)
+            beach[0], beach[1], beach[2] = times, statuses, notes
+        if not times or statuses[-1] != status or notes[-1] != note:
+            times.append(micros)
+            statuses.append(status)
+            notes.append(note)
+            beach[4].add(status)
+        beach[3] = micros
+        return True
+
+    # ---- building, catching up and persistence ----
+
+    @classmethod
+    def build(cls, history_file=HISTORY_FILE):
+        """Reads the whole CSV. Rows out of time order are placed by timestamp; malformed rows are skipped."""
+        index = cls(history_file)
+        skipped = 0
+        if os.path.isfile(history_file):
+            with open(history_file, 'r', newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+            if any(rows[i]['record_timestamp_utc'] > rows[i + 1]['record_timestamp_utc'] for i in range(len(rows) - 1)):
+                rows.sort(key=_sort_key)
+            for row in rows:
+                try:
+                    skipped += not index.add_row(row)
+                except (KeyError, TypeError, ValueError):
+                    skipped += 1
+            index.csv_offset = os.path.getsize(history_file)
+        if skipped:
+            print(f"⚠️ {skipped} malformed rows of {history_file} were left out of the timeline index.")
+        return index
+
+    def catch_up(self):
+        """
+        Adds the rows appended to the CSV since the index was built. Returns the number
+        of rows added, or None if they can't be added in place and the index must be rebuilt.
+        """
+        try:
+            size = os.path.getsize(self.history_file)
+        except OSError:
+            return None
+        if size == self.csv_offset:
+            return 0
+        if size < self.csv_offset:
+            return None
+        with open(self.history_file, 'rb') as f:
+            f.seek(self.csv_offset)
+            data = f.read(size - self.csv_offset)
+        # A row still being written is left for the next catch-up
+        end = data.rfind(b'\n') + 1
+        added = 0
+        for values in csv.reader(io.StringIO(data[:end].decode('utf-8'), newline='')):
+            if not values or values == HISTORY_FIELDNAMES:
+                continue
+            try:
+                if not self.add_row(dict(zip(HISTORY_FIELDNAMES, values))):
+                    return None
+            except (KeyError, TypeError, ValueError):
+                print(f"⚠️ Skipping malformed history row: {values}")
+                continue
+            added += 1
+        self.csv_offset += end
+        return added
+
+    def save(self, path=None):
+        path = path or timeline_path(self.history_file)
+        layout = {}
+        offset = 0
+        for name, (times, _, _, last_record, seen) in self.beaches.items():
+            layout[name] = {"offset": offset, "count": len(times), "last_record": last_record,
+                            "statuses": sorted(seen)}
+            offset += 16 * len(times)
+        header = json.dumps({
+            "byteorder": sys.byteorder,
+            "csv_offset": self.csv_offset,
+            "csv_tail": _tail_hash(self.history_file, self.csv_offset) if self.csv_offset else None,
+            "strings": self.strings,
+            "beaches": layout,
+        }, ensure_ascii=False).encode('utf-8')
+        # The arrays start on an 8-byte boundary so they can be viewed in place
+        header += b' ' * (-(len(TIMELINE_FORMAT) + 8 + len(header)) % 8)
+
+        temp_file = path + '.tmp'
+        with open(temp_file, 'wb') as f:
+            f.write(TIMELINE_FORMAT + struct.pack('<Q', len(header)) + header)
+            for times, statuses, notes, _, _ in self.beaches.values():
+                f.write(memoryview(times).cast('B'))
+                f.write(memoryview(statuses).cast('B'))
+                f.write(memoryview(notes).cast('B'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+
+    @classmethod
+    def load(cls, history_file=HISTORY_FILE, path=None):
+        """Maps the saved index without checking it against the CSV; None if it is missing or unreadable."""
+        path = path or timeline_path(history_file)
+        try:
+            with open(path, 'rb') as f:
+                if f.read(len(TIMELINE_FORMAT)) != TIMELINE_FORMAT:
+                    return None
+                header_size, = struct.unpack('<Q', f.read(8))
+                header = json.loads(f.read(header_size))
+                if header["byteorder"] != sys.byteorder:
+                    return None
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError, KeyError, struct.error):
+            return None
+
+        index = cls(history_file)
+        index._mmap = mapped
+        index.strings = header["strings"]
+        index._codes = {text: code for code, text in enumerate(index.strings)}
+        index.csv_offset = header["csv_offset"]
+        index._csv_tail = header["csv_tail"]
+        data = memoryview(mapped)[len(TIMELINE_FORMAT) + 8 + header_size:]
+        for name, entry in header["beaches"].items():
+            start, count = entry["offset"], entry["count"]
+            index.beaches[name] = [
+                data[start:start + 8 * count].cast('q'),
+                data[start + 8 * count:start + 12 * count].cast('i'),
+                data[start + 12 * count:start + 16 * count].cast('i'),
+                entry["last_record"],
+                set(entry["statuses"]),
+            ]
+        return index
+
+    @classmethod
+    def open(cls, history_file=HISTORY_FILE, save=True):
+        """
+        The index for history_file, brought up to date with the CSV: catches up on
+        appended rows, or rebuilds if the CSV was rewritten. save writes it back when it changed.
+        """
+        index = cls.load(history_file)
+        added = None
+        if index is not None:
+            try:
+                unchanged = not index.csv_offset or _tail_hash(history_file, index.csv_offset) == index._csv_tail
+            except OSError:
+                unchanged = False
+            if unchanged:
+                added = index.catch_up()
+        if added is None:
+            if index is not None:
+                # The stale index still holds its map (and file descriptor) open
+                index.close()
+            index = cls.build(history_file)
+        if save and added != 0:
+            try:
+                index.save()
+            except OSError as e:
+                # Only costs the next open a rebuild or catch-up
+                print(f"Could not save the timeline index: {e}")
+        return index
+
+    # ---- queries ----
+
+    def _decode(self, name, beach, position):
+        times, statuses, notes = beach[0], beach[1], beach[2]
+        return {
+            "beach": name,
+            "status": self.strings[statuses[position]],
+            "note": self.strings[notes[position]],
+            "since": from_micros(times[position]),
+            "until": from_micros(times[position + 1]) if position + 1 < len(times) else None,
+        }
+
+    def status_at(self, beach_name, moment):
+        """The beach's status at moment (its latest record at or before it), or None before its first record."""
+        beach = self.beaches.get(beach_name)
+        if beach is None:
+            return None
+        position = bisect_right(beach[0], to_micros(moment)) - 1
+        return self._decode(beach_name, beach, position) if position >= 0 else None
+
+    def statuses_at(self, moment):
+        """{beach: status_at(beach, moment)} for every beach that had a record by then."""
+        micros = to_micros(moment)
+        answer = {}
+        for name, beach in self.beaches.items():
+            position = bisect_right(beach[0], micros) - 1
+            if position >= 0:
+                answer[name] = self._decode(name, beach, position)
+        return answer
+
+    def intervals(self, beach_name, start=None, end=None):
+        """The beach's intervals overlapping [start, end] (either may be None for unbounded)."""
+        beach = self.beaches.get(beach_name)
+        if beach is None:
+            return []
+        times = beach[0]
+        first = max(0, bisect_right(times, to_micros(start)) - 1) if start is not None else 0
+        last = bisect_right(times, _end_micros(end)) if end is not None else len(times)
+        return [self._decode(beach_name, beach, position) for position in range(first, last)]
+
+    def beaches_in_status(self, status, start, end):
+        """{beach: [interval, ...]} for every beach that was in status at some point in [start, end]."""
+        status = STATUS_ALIASES.get(status, status)
+        code = self._codes.get(status)
+        if code is None:
+            return {}
+        low, high = to_micros(start), _end_micros(end)
+        answer = {}
+        for name, beach in self.beaches.items():
+            # Beaches that never had the status are skipped without a search
+            if code not in beach[4]:
+                continue
+            times, statuses = beach[0], beach[1]
+            first = max(0, bisect_right(times, low) - 1)
+            last = bisect_right(times, high)
+            matches = [self._decode(name, beach, position) for position in range(first, last)
+                       if statuses[position] == code]
+            if matches:
+                answer[name] = matches
+        return answer
+
+    def close(self):
+        # Views into the map have to go before the map itself
+        self.beaches = {}
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+
+def _sort_key(row):
+    try:
+        return to_micros(row['record_timestamp_utc'])
+    except (KeyError, TypeError, ValueError):
+        return sys.maxsize
+
+
+def _scan_status_at(history_file, beach_name, moment):
+    """The same question answered by reading the whole CSV, for the benchmark."""
+    micros = to_micros(moment)
+    best = None
+    with open(history_file, 'r', newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            if row['beach_name'] == beach_name:
+                row_micros = to_micros(row['record_timestamp_utc'])
+                if row_micros <= micros and (best is None or row_micros >= best[0]):
+                    best = (row_micros, row['status'])
+    return best and best[1]
+
+
+def _bench(beach_count, days):
+    import time
+    import random
+    import tempfile
+    from synthetic_history import synthetic_beach_names, write_synthetic_history, generate_history_lines
+
+    with tempfile.TemporaryDirectory() as directory:
+        history_file = os.path.join(directory, "history.csv")
+        names = synthetic_beach_names(beach_count)
+        start = datetime(2020, 5, 1, 16, tzinfo=timezone.utc)
+        rows = write_synthetic_history(history_file, names, days, start=start, seed=7)
+        size_mb = os.path.getsize(history_file) / 1e6
+        print(f"{rows} rows ({size_mb:.1f} MB), {beach_count} beaches over {days} days")
+
+        began = time.perf_counter()
+        index = TimelineIndex.open(history_file)
+        print(f"  build:        {time.perf_counter() - began:8.3f}s  "
+              f"({sum(len(beach[0]) for beach in index.beaches.values())} change points, "
+              f"{os.path.getsize(timeline_path(history_file)) / 1e6:.2f} MB index)")
+        index.close()
+
+        began = time.perf_counter()
+        index = TimelineIndex.open(history_file)
+        print(f"  open (mmap):  {time.perf_counter() - began:8.3f}s")
+
+        rng = random.Random(1)
+        queries = [(rng.choice(names), start + timedelta(minutes=rng.randrange(days * 1440))) for _ in range(10000)]
+        began = time.perf_counter()
+        for name, moment in queries:
+            index.status_at(name, moment)
+        print(f"  status_at:    {(time.perf_counter() - began) / len(queries) * 1e6:8.1f}us per lookup")
+
+        began = time.perf_counter()
+        for _ in range(100):
+            moment = start + timedelta(days=rng.randrange(days - 7))
+            index.beaches_in_status("red", moment, moment + timedelta(days=7))
+        print(f"  week query:   {(time.perf_counter() - began) / 100 * 1000:8.2f}ms per 'closed this week'")
+
+        name, moment = queries[0]
+        began = time.perf_counter()
+        scanned = _scan_status_at(history_file, name, moment)
+        print(f"  CSV scan:     {time.perf_counter() - began:8.3f}s per lookup (same answer: "
+              f"{scanned == index.status_at(name, moment)['status']})")
+        index.close()
+
+        # One more day appended after the index was saved
+        with open(history_file, 'a', newline='', encoding='utf-8') as f:
+            f.write(next(generate_history_lines(names, 1, start=start + timedelta(days=days), seed=8)))
+        began = time.perf_counter()
+        index = TimelineIndex.open(history_file)
+        print(f"  catch-up:     {time.perf_counter() - began:8.3f}s for {beach_count} appended rows")
+        index.close()
+
+
+def _parse_moment(text):
+    moment = datetime.fromisoformat(text)
+    return moment if moment.tzinfo else moment.replace(tzinfo=ZoneInfo(HISTORY_TIMEZONE))
+
+
+def _print_interval(interval):
+    until = interval['until'] or "now"
+    print(f"  {interval['beach']}: {interval['status'].upper()} ({interval['note']}) {interval['since']} -> {until}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Point-in-time queries over the beach history")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="rebuild the index from the whole CSV")
+    build.add_argument("history_file", nargs="?", default=HISTORY_FILE)
+    at = commands.add_parser("at", help="every beach's (or one beach's) status at a moment")
+    at.add_argument("moment")
+    at.add_argument("--beach")
+    during = commands.add_parser("during", help="beaches that had a status at some point in a window")
+    during.add_argument("status")
+    during.add_argument("start")
+    during.add_argument("end")
+    bench = commands.add_parser("bench", help="index vs. CSV scan on generated history")
+    bench.add_argument("beaches", nargs="?", type=int, default=200)
+    bench.add_argument("days", nargs="?", type=int, default=3650)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        index = TimelineIndex.build(args.history_file)
+        index.save()
+        print(f"Indexed {len(index.beaches)} beaches, "
+              f"{sum(len(beach[0]) for beach in index.beaches.values())} change points "
+              f"-> {timeline_path(args.history_file)}")
+    elif args.command == "at":
+        index = TimelineIndex.open()
+        moment = _parse_moment(args.moment)
+        answer = {args.beach: index.status_at(args.beach, moment)} if args.beach else index.statuses_at(moment)
+        print(f"Status at {moment.isoformat()}:")
+        for name, interval in sorted(answer.items()):
+            if interval is None:
+                print(f"  {name}: no record yet")
+            else:
+                _print_interval(interval)
+    elif args.command == "during":
+        index = TimelineIndex.open()
+        answer = index.beaches_in_status(args.status, args.start, args.end)
+        print(f"{len(answer)} beach(es) {args.status} at some point between {args.start} and {args.end}:")
+        for name in sorted(answer):
+            for interval in answer[name]:
+                _print_interval(interval)
+    else:
+        _bench(args.beaches, args.days)
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Batched, atomic writer for the historical status CSV
+"""
+
+import os
+import io
+import csv
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from history_intervals import intervals_path, extend_intervals
+
+try:
+    import fcntl
+except ImportError:
+    # fcntl is POSIX-only; on other platforms batches are still written in one go, just unlocked
+    fcntl = None
+
+HISTORY_FILE = 'historical_status.csv'
+HISTORY_FIELDNAMES = ['record_timestamp_utc', 'beach_name', 'status', 'last_updated_from_pdf', 'note']
+# csv's default line terminator, which the history file has always used
+HISTORY_HEADER = ','.join(HISTORY_FIELDNAMES) + '\r\n'
+
+
+def batch_marker_path(history_file):
+    """historical_status.csv -> historical_status.csv.batch, present only while a batch is being appended"""
+    return history_file + '.batch'
+
+
+def _roll_back_unfinished_batch(f, history_file, size):
+    """
+    Truncates the file back to where a batch started if the writer of that batch died
+    before committing it. Returns the new size of the file.
+    """
+    marker = batch_marker_path(history_file)
+    try:
+        with open(marker, 'r', encoding='utf-8') as m:
+            batch_start = int(m.read().strip())
+    except FileNotFoundError:
+        return size
+    except ValueError:
+        # The marker itself was torn, so the batch after it was never started
+        batch_start = size
+    if batch_start < size:
+        print(f"Rolling back {size - batch_start} bytes of an unfinished batch at the end of {f.name}")
+        f.truncate(batch_start)
+        f.flush()
+        os.fsync(f.fileno())
+        size = batch_start
+    os.remove(marker)
+    return size
+
+
+def _repair_torn_tail(f, size):
+    """
+    Ends the file on a newline. A last line that is a complete row without its
+    line break (e.g. after a hand edit) gets the break; only a fragment that isn't
+    a whole row is truncated. Returns the new size of the file.
+    """
+    if size == 0:
+        return 0
+
+    f.seek(size - 1)
+    if f.read(1) == b'\n':
+        return size
+
+    # Walk backwards to the end of the last complete line
+    position = size
+    while position > 0:
+        read_size = min(4096, position)
+        position -= read_size
+        f.seek(position)
+        newline = f.read(read_size).rfind(b'\n')
+        if newline != -1:
+            position += newline + 1
+            break
+
+    f.seek(position)
+    tail = f.read(size - position).decode('utf-8', errors='replace')
+    fields = next(csv.reader([tail]), [])
+    if len(fields) == len(HISTORY_FIELDNAMES) and not tail.count('"') % 2:
+        f.seek(0, os.SEEK_END)
+        f.write(b'\r\n')
+        return size + 2
+
+    print(f"Discarding {size - position} bytes of an incomplete write at the end of {f.name}")
+    f.truncate(position)
+    return position
+
+
+@contextmanager
+def locked_append(history_file):
+    """
+    Opens the history file for appending under an exclusive lock, with any torn
+    tail repaired. Yields (file, size); the caller writes the header when size is 0.
+
+    Everything written inside the block is one batch: if the block raises, the file
+    is truncated back to size, and if the process dies first, the batch marker makes
+    the next locked_append() do the same. A batch is therefore all there or not at all.
+    """
+    with open(history_file, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            f.seek(0, os.SEEK_END)
+            size = _roll_back_unfinished_batch(f, history_file, f.tell())
+            size = _repair_torn_tail(f, size)
+
+            marker = batch_marker_path(history_file)
+            with open(marker, 'w', encoding='utf-8') as m:
+                m.write(str(size))
+                m.flush()
+                os.fsync(m.fileno())
+            try:
+                yield f, size
+                f.flush()
+                os.fsync(f.fileno())
+            except BaseException:
+                # If even this fails, the marker stays and the next append rolls the batch back
+                f.truncate(size)
+                os.fsync(f.fileno())
+                os.remove(marker)
+                raise
+            os.remove(marker)
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class HistoryWriter:
+    """
+    Collects the history rows produced by one run and appends them to the CSV
+    in a single buffered write, under an exclusive file lock, followed by one
+    flush and fsync. Overlapping runs queue on the lock instead of interleaving.
+
+    With keep_intervals (or once an interval file exists next to the CSV) the
+    interval-encoded history is extended under the same lock.
+    """
+
+    def __init__(self, history_file=HISTORY_FILE, keep_intervals=False):
+        self.history_file = history_file
+        self.keep_intervals = keep_intervals
+        self.rows = []
+        # Bytes appended to the CSV by this writer so far
+        self.bytes_written = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def add(self, beach_data, record_time=None):
+        """Queues a beach record. record_time defaults to now (UTC)."""
+        if record_time is None:
+            record_time = datetime.now(timezone.utc)
+
+        self.rows.append({
+            'record_timestamp_utc': record_time.isoformat(),
+            'beach_name': beach_data['beach_name'],
+            'status': beach_data['status'],
+            'last_updated_from_pdf': beach_data['date'],
+            'note': beach_data['note']
+        })
+
+    def flush(self):
+        """Writes every queued row and returns the rows that were written."""
+        if not self.rows:
+            return []
+
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=HISTORY_FIELDNAMES)
+        writer.writerows(self.rows)
+        payload = buffer.getvalue()
+
+        with locked_append(self.history_file) as (f, size):
+            if size == 0:
+                # Write headers only if the file is new
+                payload = HISTORY_HEADER + payload
+
+            data = payload.encode('utf-8')
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+            self.bytes_written += len(data)
+
+            if self.keep_intervals or os.path.exists(intervals_path(self.history_file)):
+                try:
+                    extend_intervals(self.history_file, self.rows, size, size + len(data))
+                except Exception as e:
+                    # The CSV is the record; a stale interval file is detected and rebuilt later
+                    print(f"Failed to update interval history: {e}")
+
+        written = self.rows
+        self.rows = []
+        return written
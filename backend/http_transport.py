@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP transport for the checker's outbound calls.
+
+Every request names the endpoint it belongs to ("report", "subscribers",
+"ntfy"), which picks its connect/read timeouts, total deadline, retry count and
+response size limit from ENDPOINTS:
+
+- Connections are kept alive in one pooled session per host, so a watcher
+  reuses its TLS connections from one check to the next.
+- Connection errors, timeouts and 429/5xx answers are retried with jittered
+  exponential backoff (or the server's Retry-After, when it is short enough).
+  POSTs are only retried when the request can't have reached the server.
+  All endpoints share a budget of HTTP_RETRY_BUDGET retries per minute, so an
+  outage fails fast instead of every call sleeping through its retries.
+- A body larger than the endpoint's max_bytes is refused with ResponseTooLarge
+  before it is read into memory.
+- The read timeout only bounds each wait for the next chunk, so a server that
+  trickles its body could hold an attempt forever; an attempt still reading
+  after the endpoint's deadline (seconds, from sending the request) fails
+  with a ReadTimeout.
+- Each attempt is passed to the latency hooks; the built-in one records an
+  "http" metrics stage per endpoint. add_latency_hook() registers more.
+
+With HTTP_TRANSPORT_HTTP2=true and httpx installed (pip install "httpx[http2]"),
+requests go out over HTTP/2 instead. Responses are requests.Response objects
+either way, so callers keep using raise_for_status() and requests' exceptions.
+
+Usage:
+    python http_transport.py get ENDPOINT URL [count]
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib3.exceptions import NewConnectionError, ProtocolError, DecodeError, ReadTimeoutError, SSLError
+
+from metrics import record
+
+try:
+    import httpx
+except ImportError:
+    # httpx is optional; without it every request goes over HTTP/1.1
+    httpx = None
+
+HTTP_POOL_SIZE = int(os.environ.get("HTTP_POOL_SIZE", "4"))
+HTTP_RETRY_BUDGET = int(os.environ.get("HTTP_RETRY_BUDGET", "10"))
+HTTP_TRANSPORT_HTTP2 = os.environ.get("HTTP_TRANSPORT_HTTP2", "false").lower() == "true"
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 8.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# A POST answered with one of these was refused before anything happened, so it is safe to send again
+POST_RETRY_STATUSES = (429, 503)
+USER_AGENT = "beach-status-checker"
+
+ENDPOINTS = {
+    "report": {"connect": 10, "read": 20, "deadline": 90, "retries": 2, "max_bytes": 50 * 1024 * 1024},
+    "subscribers": {"connect": 5, "read": 20, "deadline": 60, "retries": 3, "max_bytes": 20 * 1024 * 1024},
+    "ntfy": {"connect": 5, "read": 10, "deadline": 20, "retries": 2, "max_bytes": 1024 * 1024},
+    "default": {"connect": 5, "read": 20, "deadline": 60, "retries": 1, "max_bytes": 10 * 1024 * 1024},
+}
+
+
+class ResponseTooLarge(requests.exceptions.RequestException):
+    """The response body is larger than the endpoint's max_bytes."""
+
+
+def configure_endpoint(name, **settings):
+    """Sets or overrides connect, read, deadline, retries or max_bytes for one endpoint."""
+    ENDPOINTS[name] = {**ENDPOINTS.get(name, ENDPOINTS["default"]), **settings}
+
+
+class _RetryBudget:
+    """Allows at most `limit` retries in any `window` seconds, across all endpoints."""
+
+    def __init__(self, limit, window=60.0):
+        self.limit = limit
+        self.window = window
+        self._spent = deque()
+        self._lock = threading.Lock()
+
+    def try_spend(self):
+        now = time.monotonic()
+        with self._lock:
+            while self._spent and now - self._spent[0] > self.window:
+                self._spent.popleft()
+            if len(self._spent) >= self.limit:
+                return False
+            self._spent.append(now)
+            return True
+
+
+_retry_budget = _RetryBudget(HTTP_RETRY_BUDGET)
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _new_session():
+    if HTTP_TRANSPORT_HTTP2 and httpx is not None:
+        try:
+            return httpx.Client(http2=True, headers={"User-Agent": USER_AGENT},
+                                limits=httpx.Limits(max_connections=HTTP_POOL_SIZE))
+        except ImportError:
+            # http2=True needs the h2 package as well
+            print("HTTP/2 unavailable (pip install \"httpx[http2]\"); using HTTP/1.1.")
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def session_for(url):
+    """The pooled session for the url's host, created on first use."""
+    parts = urlsplit(url)
+    key = (parts.scheme, parts.netloc)
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = _sessions[key] = _new_session()
+        return session
+
+
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
+
+
+def _latency_to_metrics(endpoint, method, status, seconds, size, attempt, error):
+    failed = error is not None or (status or 0) >= 500
+    record("http", seconds, size, errors=int(failed), endpoint=endpoint)
+
+
+_latency_hooks = [_latency_to_metrics]
+
+
+def add_latency_hook(hook):
+    """
+    hook(endpoint, method, status, seconds, size, attempt, error) is called after
+    every attempt; status is None and error is the exception when no answer came back.
+    """
+    _latency_hooks.append(hook)
+
+
+def remove_latency_hook(hook):
+    _latency_hooks.remove(hook)
+
+
+def _notify_hooks(*observation):
+    for hook in list(_latency_hooks):
+        try:
+            hook(*observation)
+        except Exception as e:
+            print(f"HTTP latency hook failed: {e}")
+
+
+def _read_limited(chunks, max_bytes, url, deadline):
+    """Reads the body, enforcing max_bytes and the attempt's deadline (a time.monotonic() value)."""
+    body = bytearray()
+    for chunk in chunks:
+        body += chunk
+        if len(body) > max_bytes:
+            raise ResponseTooLarge(f"Response from {url} is larger than {max_bytes} bytes")
+        if time.monotonic() > deadline:
+            raise requests.exceptions.ReadTimeout(f"Response from {url} was still arriving at the deadline "
+                                                  f"({len(body)} bytes read)")
+    return bytes(body)
+
+
+def _iter_arriving(response, size=64 * 1024):
+    """
+    The body in pieces as they arrive. iter_content() waits until a whole chunk is in, so
+    a trickled body would never get to the deadline check; read1() returns after one read.
+    """
+    raw = response.raw
+    if not hasattr(raw, "read1"):
+        # urllib3 older than 2.3
+        yield from response.iter_content(size)
+        return
+    try:
+        while True:
+            chunk = raw.read1(size, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+    # The same translation iter_content() does, so callers only see requests' exceptions
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+    except ReadTimeoutError as e:
+        raise requests.exceptions.ReadTimeout(e)
+    except SSLError as e:
+        raise requests.exceptions.SSLError(e)
+
+
+def _send_requests(session, method, url, timeout, max_bytes, deadline, **kwargs):
+    response = session.request(method, url, timeout=timeout, stream=True, **kwargs)
+    try:
+        declared = int(response.headers.get("Content-Length") or 0)
+        if declared > max_bytes:
+            raise ResponseTooLarge(f"Response from {url} declares {declared} bytes (limit {max_bytes})")
+        response._content = _read_limited(_iter_arriving(response), max_bytes, url, deadline)
+    except Exception:
+        response.close()
+        raise
+    return response
+
+
+def _send_httpx(client, method, url, timeout, max_bytes, deadline, headers=None, params=None, data=None):
+    connect, read = timeout
+    try:
+        with client.stream(method, url, headers=headers, params=params, content=data,
+                           timeout=httpx.Timeout(read, connect=connect)) as answer:
+            declared = int(answer.headers.get("Content-Length") or 0)
+            if declared > max_bytes:
+                raise ResponseTooLarge(f"Response from {url} declares {declared} bytes (limit {max_bytes})")
+            body = _read_limited(answer.iter_bytes(), max_bytes, url, deadline)
+    except httpx.ConnectTimeout as e:
+        raise requests.exceptions.ConnectTimeout(str(e)) from e
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.ReadTimeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+    # Callers only ever see requests' response type
+    response = requests.Response()
+    response.status_code = answer.status_code
+    response.headers = CaseInsensitiveDict(answer.headers.items())
+    response.reason = answer.reason_phrase
+    response.url = str(answer.url)
+    response.encoding = answer.encoding
+    response._content = body
+    return response
+
+
+def _wrapped_errors(error):
+    """error and every exception it wraps: chained ones, urllib3's .reason and exceptions passed as args."""
+    pending = [error]
+    seen = set()
+    while pending:
+        error = pending.pop()
+        if not isinstance(error, BaseException) or id(error) in seen:
+            continue
+        seen.add(id(error))
+        yield error
+        pending += [error.__cause__, error.__context__, getattr(error, "reason", None), *error.args]
+
+
+def _not_sent(error):
+    """True when a failed request can't have reached the server."""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    not_connected = (NewConnectionError, httpx.ConnectError) if httpx is not None else NewConnectionError
+    return any(isinstance(wrapped, not_connected) for wrapped in _wrapped_errors(error))
+
+
+def _retry_delay(attempt, response=None):
+    retry_after = response is not None and response.headers.get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        # A server asking for a longer pause than we would back off anyway is not retried
+        return float(retry_after) if float(retry_after) <= BACKOFF_MAX_SECONDS else None
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def request(endpoint, method, url, timeout=None, **kwargs):
+    """
+    Sends one request through the pooled session for the url's host, retrying per
+    the endpoint's settings. timeout overrides the endpoint's read timeout.
+    Raises requests' exceptions (and ResponseTooLarge) once retries are used up.
+    """
+    settings = ENDPOINTS.get(endpoint, ENDPOINTS["default"])
+    timeout = (settings["connect"], timeout or settings["read"])
+    idempotent = method.upper() in ("GET", "HEAD", "PUT", "DELETE", "OPTIONS")
+    session = session_for(url)
+    send = _send_httpx if httpx is not None and isinstance(session, httpx.Client) else _send_requests
+
+    attempt = 0
+    while True:
+        start = time.perf_counter()
+        response = error = None
+        try:
+            response = send(session, method, url, timeout, settings["max_bytes"],
+                            time.monotonic() + settings["deadline"], **kwargs)
+        except ResponseTooLarge as e:
+            _notify_hooks(endpoint, method, None, time.perf_counter() - start, 0, attempt, e)
+            raise
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+        seconds = time.perf_counter() - start
+        status = response.status_code if response is not None else None
+        _notify_hooks(endpoint, method, status, seconds, len(response.content) if response is not None else 0,
+                      attempt, error)
+
+        if error is not None:
+            retryable = idempotent or _not_sent(error)
+        else:
+            retryable = status in (RETRY_STATUSES if idempotent else POST_RETRY_STATUSES)
+        delay = _retry_delay(attempt, response) if retryable else None
+        if delay is None or attempt >= settings["retries"] or not _retry_budget.try_spend():
+            if error is not None:
+                raise error
+            return response
+
+        attempt += 1
+        print(f"{endpoint}: {error or f'HTTP {status}'}; retry {attempt}/{settings['retries']} in {delay:.1f}s")
+        time.sleep(delay)
+
+
+def get(endpoint, url, **kwargs):
+    return request(endpoint, "GET", url, **kwargs)
+
+
+def post(endpoint, url, **kwargs):
+    return request(endpoint, "POST", url, **kwargs)
+
+
+if __name__ == "__main__":
+    import sys
+    import statistics
+
+    if len(sys.argv) < 4 or sys.argv[1] != "get":
+        print("Usage: python http_transport.py get ENDPOINT URL [count]")
+        sys.exit(1)
+    endpoint, url = sys.argv[2], sys.argv[3]
+    count = int(sys.argv[4]) if len(sys.argv) > 4 else 5
+    latencies = []
+    add_latency_hook(lambda *observation: latencies.append(observation[3]))
+    for _ in range(count):
+        response = get(endpoint, url)
+        print(f"HTTP {response.status_code}, {len(response.content)} bytes")
+    print(f"{len(latencies)} attempt(s): first {latencies[0] * 1000:.0f} ms, "
+          f"median of the rest {statistics.median(latencies[1:] or latencies) * 1000:.0f} ms "
+          f"({'HTTP/2' if not isinstance(session_for(url), requests.Session) else 'HTTP/1.1'}, pooled)")
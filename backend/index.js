@@ -8,6 +8,37 @@ function getWindDirection(degrees) {
     return directions[Math.round(degrees / 22.5) % 16];
 }
 
+// --- SUBSCRIBER LIST ---
+
+// KV keys starting with this prefix hold bookkeeping, not subscribers.
+const META_KEY_PREFIX = '__';
+// Timestamp of the last change to the subscriber list; served as the list's ETag.
+const SUBSCRIBERS_VERSION_KEY = '__subscribers_version';
+// An unsubscribe leaves a tombstone under this prefix (metadata.deleted_at) so that
+// incremental syncs learn about the removal; clients full-sync well within its lifetime.
+const TOMBSTONE_KEY_PREFIX = '__deleted:';
+const TOMBSTONE_TTL_SECONDS = 90 * 24 * 60 * 60;
+// KV returns at most 1000 keys per list() call.
+const SUBSCRIBERS_PAGE_LIMIT = 1000;
+// Beaches a subscriber follows when none are given (the beach shown on the main page).
+const DEFAULT_SUBSCRIBED_BEACHES = ['Leddy Beach South'];
+// KV metadata is limited to 1024 bytes, which comfortably fits every beach in the report.
+const MAX_SUBSCRIBED_BEACHES = 20;
+
+// Validates the optional list of beach names sent with a subscription.
+function parseSubscribedBeaches(beaches) {
+    if (beaches === undefined || beaches === null) return DEFAULT_SUBSCRIBED_BEACHES;
+    if (!Array.isArray(beaches) || beaches.length === 0 || beaches.length > MAX_SUBSCRIBED_BEACHES) {
+        throw new Error(`beaches must be a list of 1-${MAX_SUBSCRIBED_BEACHES} beach names`);
+    }
+    const names = beaches.map(name => String(name).trim()).filter(name => name && name.length <= 64);
+    if (names.length !== beaches.length) throw new Error('Invalid beach name');
+    return [...new Set(names)];
+}
+
+// KV pages a single since query may scan (stays well under the per-request subrequest limit).
+const SINCE_SCAN_PAGES = 20;
+
 // --- MAIN WORKER ---
 
 export default {
@@ -132,25 +163,108 @@ export default {
                     const body = await request.json();
                     const email = body.email;
                     if (!email) throw new Error('Email is required');
-                    await env.SUBSCRIBERS.put(email, 'true');
-                    return new Response(JSON.stringify({ message: 'Successfully subscribed!', email: email }), { headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
+                    if (email.startsWith(META_KEY_PREFIX)) throw new Error('Invalid email');
+                    const beaches = parseSubscribedBeaches(body.beaches);
+                    // The metadata comes back with list(), so the checker gets each subscriber's beaches
+                    // without reading every key. updated_at lets clients fetch only what changed since their last sync.
+                    const updatedAt = Date.now();
+                    await env.SUBSCRIBERS.put(email, 'true', { metadata: { updated_at: updatedAt, beaches } });
+                    await env.SUBSCRIBERS.delete(TOMBSTONE_KEY_PREFIX + email);
+                    await env.SUBSCRIBERS.put(SUBSCRIBERS_VERSION_KEY, String(updatedAt));
+                    return new Response(JSON.stringify({ message: 'Successfully subscribed!', email: email, beaches: beaches }), { headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
                 } catch (error) {
                     console.error('Subscription error:', error);
                     return new Response(JSON.stringify({ error: 'Subscription failed', details: error.message }), { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
                 }
             }
 
-            // --- GET SUBSCRIBERS ENDPOINT ---
-            if (path === '/get-subscribers' && request.method === 'GET') {
+            // --- EMAIL UNSUBSCRIBE ENDPOINT ---
+            // Subscribers must be removed here rather than by deleting the KV key: the tombstone
+            // and the version bump are what tell the checker's cached list to drop them.
+            if (path === '/unsubscribe' && request.method === 'POST') {
                 try {
-                    const providedToken = request.headers.get('X-API-Token');
-                    if (providedToken !== env.CF_API_TOKEN) throw new Error('Unauthorized');
-                    const listResult = await env.SUBSCRIBERS.list();
-                    const emails = listResult.keys.map(key => key.name);
-                    return new Response(JSON.stringify({ subscribers: emails }), { headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
+                    const body = await request.json();
+                    const email = body.email;
+                    if (!email) throw new Error('Email is required');
+                    if (email.startsWith(META_KEY_PREFIX)) throw new Error('Invalid email');
+                    const deletedAt = Date.now();
+                    await env.SUBSCRIBERS.delete(email);
+                    await env.SUBSCRIBERS.put(TOMBSTONE_KEY_PREFIX + email, 'true', {
+                        metadata: { deleted_at: deletedAt },
+                        expirationTtl: TOMBSTONE_TTL_SECONDS
+                    });
+                    await env.SUBSCRIBERS.put(SUBSCRIBERS_VERSION_KEY, String(deletedAt));
+                    return new Response(JSON.stringify({ message: 'Successfully unsubscribed.', email: email }), { headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
                 } catch (error) {
-                    return new Response(JSON.stringify({ error: 'Authorization failed', details: error.message }), { status: 401, headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
+                    console.error('Unsubscribe error:', error);
+                    return new Response(JSON.stringify({ error: 'Unsubscribe failed', details: error.message }), { status: 400, headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
+                }
+            }
+
+            // --- GET SUBSCRIBERS ENDPOINT ---
+            // Returns {subscribers: [{email, beaches}], cursor, version}.
+            // Paged: ?cursor=<from the previous page>&limit=<up to 1000>&since=<ms timestamp>.
+            // since returns only subscribers added or updated after that time, and its first page
+            // adds deleted: [email] for everyone unsubscribed after it (deleted_complete is false
+            // if there were too many tombstones to scan, and the client must list everything).
+            // The ETag is the list version, so an unchanged list answers If-None-Match with a 304.
+            if (path === '/get-subscribers' && request.method === 'GET') {
+                const providedToken = request.headers.get('X-API-Token');
+                if (providedToken !== env.CF_API_TOKEN) {
+                    return new Response(JSON.stringify({ error: 'Authorization failed', details: 'Unauthorized' }), { status: 401, headers: { ...corsHeaders, 'Content-Type': 'application/json' } });
+                }
+
+                const version = (await env.SUBSCRIBERS.get(SUBSCRIBERS_VERSION_KEY)) || '0';
+                const etag = `"${version}"`;
+                if (request.headers.get('If-None-Match') === etag) {
+                    return new Response(null, { status: 304, headers: { ...corsHeaders, 'ETag': etag } });
                 }
+
+                const limit = Math.min(Math.max(parseInt(url.searchParams.get('limit'), 10) || SUBSCRIBERS_PAGE_LIMIT, 1), SUBSCRIBERS_PAGE_LIMIT);
+                const since = parseInt(url.searchParams.get('since'), 10) || 0;
+                const cursor = url.searchParams.get('cursor') || undefined;
+
+                // KV can't filter by metadata, so a since query scans several KV pages per response
+                // until it has a page's worth of changes; most keys won't match.
+                const subscribers = [];
+                let listResult = { list_complete: false, cursor };
+                let scanned = 0;
+                do {
+                    listResult = await env.SUBSCRIBERS.list({ limit, cursor: listResult.cursor });
+                    scanned += 1;
+                    for (const key of listResult.keys) {
+                        if (key.name.startsWith(META_KEY_PREFIX)) continue;
+                        const metadata = key.metadata || {};
+                        // Keys written before metadata was added count as changed at time 0
+                        if (since && (metadata.updated_at || 0) <= since) continue;
+                        // Subscribers from before per-beach subscriptions followed the default beach
+                        subscribers.push({ email: key.name, beaches: metadata.beaches || DEFAULT_SUBSCRIBED_BEACHES });
+                    }
+                } while (since && !listResult.list_complete && subscribers.length < limit && scanned < SINCE_SCAN_PAGES);
+
+                const result = {
+                    subscribers: subscribers,
+                    cursor: listResult.list_complete ? null : listResult.cursor,
+                    version: Number(version)
+                };
+                if (since && !cursor) {
+                    const deleted = [];
+                    let tombstones = { list_complete: false, cursor: undefined };
+                    let tombstonePages = 0;
+                    do {
+                        tombstones = await env.SUBSCRIBERS.list({ prefix: TOMBSTONE_KEY_PREFIX, cursor: tombstones.cursor });
+                        tombstonePages += 1;
+                        for (const key of tombstones.keys) {
+                            if (((key.metadata || {}).deleted_at || 0) > since) {
+                                deleted.push(key.name.slice(TOMBSTONE_KEY_PREFIX.length));
+                            }
+                        }
+                    } while (!tombstones.list_complete && tombstonePages < SINCE_SCAN_PAGES);
+                    result.deleted = deleted;
+                    result.deleted_complete = tombstones.list_complete;
+                }
+
+                return new Response(JSON.stringify(result), { headers: { ...corsHeaders, 'Content-Type': 'application/json', 'ETag': etag } });
             }
 
             // Fallback for any other path
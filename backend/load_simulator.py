@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+"""
+End-to-end load simulator: the real check_status pipeline against local stand-ins.
+
+One local HTTP server plays every outside service the checker talks to:
+    /report.pdf        the state report: a generated PDF with an ETag, republished
+                       every --publish-every runs with --churn of the beaches changed
+    /get-subscribers   the Worker's paged subscriber listing (version ETag, since, cursor,
+                       unsubscribe tombstones), with --signups-per-day new subscribers
+                       joining each simulated day
+    /ntfy/TOPIC        the ntfy.sh topic
+and smtp_sink.py takes the email. The checker is pointed at them purely through
+its environment variables and a report_sources.json in a scratch directory, so
+nothing in the repo or in production is touched.
+
+A season is replayed at accelerated time: run N is main(now=start + N * 24h / runs-per-day),
+back to back. Each run's latency, the process's memory high-water mark (ru_maxrss),
+the history file size and the emails delivered are recorded, and the stage timings
+come from the metrics log (metrics.py).
+
+Usage:
+    python load_simulator.py run [--beaches 1000] [--subscribers 50000] [--days 7] [--runs-per-day 24]
+                                 [--publish-every 24] [--churn 0.02] [--csv runs.csv]
+    python load_simulator.py curve --beaches 100,1000 --subscribers 5000,50000 [--days 2]
+"""
+
+import os
+import sys
+import json
+import time
+import bisect
+import random
+import resource
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime, timedelta, timezone
+
+from smtp_sink import SMTPSink
+from synthetic_history import synthetic_beach_names
+from synthetic_report import build_tall_report_pdf, report_rows, SAMPLE_NOTES
+
+SIMULATION_API_TOKEN = "load-simulator-token"
+SIMULATION_START = datetime(2025, 6, 1, 6, tzinfo=timezone.utc)
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", headers=None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/report.pdf":
+            etag, pdf_bytes = self.server.report
+            if self.headers.get("If-None-Match") == etag:
+                self._send(304, headers={"ETag": etag})
+            else:
+                self._send(200, pdf_bytes, {"ETag": etag, "Content-Type": "application/pdf"})
+        elif url.path == "/get-subscribers":
+            if self.headers.get("X-API-Token") != SIMULATION_API_TOKEN:
+                self._send(401, b"Unauthorized")
+                return
+            self.server.subscriber_requests += 1
+            body, etag = self.server.subscriber_page(parse_qs(url.query), self.headers.get("If-None-Match"))
+            if body is None:
+                self._send(304, headers={"ETag": etag})
+            else:
+                self._send(200, body, {"ETag": etag, "Content-Type": "application/json"})
+        else:
+            self._send(404, b"Not found")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.startswith("/ntfy/"):
+            self.server.topic_posts += 1
+            self._send(200, b"{}", {"Content-Type": "application/json"})
+        else:
+            self._send(404, b"Not found")
+
+
+class StandInServer(ThreadingHTTPServer):
+    """The report source, the Worker's subscriber listing and ntfy, served from memory."""
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _StandInHandler)
+        self.report = ('"0"', b"")
+        self._report_version = 0
+        # (updated_ms, email, beaches), kept sorted by updated_ms for the since= filter
+        self.subscribers = []
+        # email -> deleted_ms, the Worker's unsubscribe tombstones
+        self.deleted = {}
+        self.subscriber_version = 0
+        self.subscriber_requests = 0
+        self.topic_posts = 0
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def publish_report(self, pdf_bytes):
+        self._report_version += 1
+        self.report = (f'"{self._report_version}"', pdf_bytes)
+
+    def add_subscribers(self, subscriptions, updated_ms):
+        """subscriptions is [(email, [beach, ...])], all subscribed at updated_ms."""
+        self.subscribers += [(updated_ms, email, beaches) for email, beaches in subscriptions]
+        for email, _ in subscriptions:
+            self.deleted.pop(email, None)
+        self.subscriber_version = max(self.subscriber_version, updated_ms)
+
+    def remove_subscribers(self, emails, deleted_ms, tombstone=True):
+        """Unsubscribes emails at deleted_ms; tombstone=False is a KV key deleted by hand (no version bump)."""
+        emails = set(emails)
+        self.subscribers = [entry for entry in self.subscribers if entry[1] not in emails]
+        if tombstone:
+            self.deleted.update((email, deleted_ms) for email in emails)
+            self.subscriber_version = max(self.subscriber_version, deleted_ms)
+
+    def subscriber_page(self, params, if_none_match):
+        """(JSON body, etag) of one /get-subscribers page, or (None, etag) for a 304."""
+        etag = f'"{self.subscriber_version}"'
+        if if_none_match == etag:
+            return None, etag
+        limit = int(params.get("limit", ["1000"])[0])
+        since = int(params.get("since", ["0"])[0])
+        start = int(params.get("cursor", [None])[0] or bisect.bisect_left(self.subscribers, (since,)))
+        page = self.subscribers[start:start + limit]
+        cursor = str(start + limit) if start + limit < len(self.subscribers) else None
+        body = {"subscribers": [{"email": email, "beaches": beaches} for _, email, beaches in page],
+                "cursor": cursor, "version": self.subscriber_version}
+        if since and "cursor" not in params:
+            body["deleted"] = [email for email, deleted_ms in self.deleted.items() if deleted_ms > since]
+            body["deleted_complete"] = True
+        return json.dumps(body).encode("utf-8"), etag
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+class Simulation:
+    """A season of checks against the stand-ins, in this process (so its memory is what is measured)."""
+
+    def __init__(self, beaches=1000, subscribers=50000, days=7, runs_per_day=24, publish_every=24,
+                 churn=0.02, signups_per_day=100, email_rate=0, settle_minutes=0, seed=1, workdir=None):
+        self.rng = random.Random(seed)
+        self.days = days
+        self.runs_per_day = runs_per_day
+        self.publish_every = max(1, publish_every)
+        self.churn = churn
+        self.signups_per_day = signups_per_day
+        self.subscriber_count = subscribers
+        self.workdir = workdir or tempfile.mkdtemp(prefix="load_simulator_")
+        self.server = StandInServer().start()
+        self.sink = SMTPSink().start()
+        self._configure(email_rate, settle_minutes)
+
+        from check_status import BEACH_COORDINATES, extract_report_table, parse_beach_rows
+        from report_sources import REPORT_SOURCES, load_source_config
+        names = synthetic_beach_names(beaches, BEACH_COORDINATES)
+        self.coordinates = {
+            name: BEACH_COORDINATES.get(name) or {"lat": round(self.rng.uniform(44.0, 45.0), 6),
+                                                  "lon": round(self.rng.uniform(-73.45, -73.2), 6)}
+            for name in names
+        }
+        self.beaches = [{"beach_name": name, "date": SIMULATION_START.strftime('%b %d %Y %I:%M%p'), "note": "Open"}
+                        for name in names]
+        # Subscribers favour a few popular beaches (Zipf-like), as real ones do
+        self.beach_weights = [1 / (rank + 1) for rank in range(len(names))]
+
+        with open("report_sources.json", "w", encoding="utf-8") as f:
+            # Replaces the registered Burlington source with the stand-in report
+            json.dump([{"name": "burlington", "url": f"{self.server.url}/report.pdf",
+                        "coordinates": self.coordinates}], f)
+        load_source_config(default_parser=extract_report_table)
+
+        self.publish()
+        # status.json as a previous run would have left it, so the first run isn't one big change
+        table = extract_report_table(self.server.report[1], REPORT_SOURCES["burlington"])
+        with open(os.path.join(self.workdir, "status.json"), "w", encoding="utf-8") as f:
+            json.dump(parse_beach_rows(table, self.coordinates), f)
+
+    def _configure(self, email_rate, settle_minutes):
+        """Points check_status at the stand-ins. Must run before check_status is first imported."""
+        if "check_status" in sys.modules:
+            raise RuntimeError("check_status was imported before the simulation could configure it")
+        os.environ.update({
+            "CF_API_TOKEN": SIMULATION_API_TOKEN,
+            "CLOUDFLARE_WORKER_URL": self.server.url,
+            "NTFY_URL": f"{self.server.url}/ntfy",
+            "EMAIL_SENDER": "beach-status@load-simulator.test",
+            "EMAIL_PASSWORD": "load-simulator",
+            "SMTP_SERVER": "127.0.0.1",
+            "SMTP_PORT": str(self.sink.port),
+            "SMTP_STARTTLS": "false",
+            "EMAIL_RATE_LIMIT": str(email_rate),
+            "NTFY_RATE_LIMIT": "0",
+            "TEST_MODE": "false",
+            "DAILY_LOGGING": "true",
+            "NOTIFY_SETTLE_MINUTES": str(settle_minutes),
+            "PUBLIC_DATA_DIR": self.workdir,
+            "METRICS_LOG_FILE": os.path.join(self.workdir, "check_metrics.jsonl"),
+            "METRICS_TEXTFILE": "",
+        })
+        # Every relative path the checker writes (history, caches, outbox, archive) lands here
+        os.chdir(self.workdir)
+
+    def publish(self, now=None):
+        """Changes --churn of the beaches (none the first time) and republishes the report."""
+        if now is not None:
+            for beach in self.beaches:
+                if self.rng.random() < self.churn:
+                    beach["note"] = self.rng.choice([note for note in SAMPLE_NOTES if note != beach["note"]])
+                    beach["date"] = now.strftime('%b %d %Y %I:%M%p')
+        self.server.publish_report(build_tall_report_pdf(report_rows(self.beaches)))
+
+    def sign_up(self, count, now):
+        names = list(self.coordinates)
+        start = len(self.server.subscribers)
+        subscriptions = []
+        for number in range(start, start + count):
+            followed = set(self.rng.choices(names, self.beach_weights, k=self.rng.randint(1, 3)))
+            subscriptions.append((f"subscriber{number:06d}@load-simulator.test", sorted(followed)))
+        self.server.add_subscribers(subscriptions, int(now.timestamp() * 1000))
+
+    def run(self, csv_file=None, quiet=True):
+        import io
+        from contextlib import redirect_stdout
+
+        import check_status
+
+        self.sign_up(self.subscriber_count, SIMULATION_START - timedelta(days=1))
+        runs = []
+        step = timedelta(hours=24 / self.runs_per_day)
+        total_runs = self.days * self.runs_per_day
+        history_file = os.path.join(self.workdir, "historical_status.csv")
+
+        for index in range(total_runs):
+            now = SIMULATION_START + index * step
+            if index and index % self.runs_per_day == 0 and self.signups_per_day:
+                self.sign_up(self.signups_per_day, now)
+            if index and index % self.publish_every == 0:
+                self.publish(now)
+
+            emails_before = self.sink.messages
+            start = time.perf_counter()
+            output = io.StringIO()
+            with redirect_stdout(output if quiet else sys.stdout):
+                result = check_status.main(now=now)
+            seconds = time.perf_counter() - start
+            runs.append({
+                "run": index,
+                "time": now.isoformat(),
+                "result": result,
+                "seconds": seconds,
+                "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                "history_bytes": os.path.getsize(history_file) if os.path.exists(history_file) else 0,
+                "emails": self.sink.messages - emails_before,
+            })
+            if not quiet or index % self.runs_per_day == 0 or result == check_status.CHECK_FAILED:
+                print(f"day {index // self.runs_per_day + 1:3d} run {index:5d} {result:9s} {seconds:7.2f}s "
+                      f"rss {runs[-1]['max_rss_mb']:7.1f} MB  history {runs[-1]['history_bytes'] / 1e6:7.1f} MB  "
+                      f"emails {runs[-1]['emails']}", file=sys.stderr if quiet else sys.stdout)
+
+        self._add_stage_timings(runs)
+        if csv_file:
+            import csv
+            with open(csv_file, "w", newline="", encoding="utf-8") as f:
+                writer = csv.DictWriter(f, fieldnames=list(runs[0]))
+                writer.writeheader()
+                writer.writerows(runs)
+        return runs
+
+    def _add_stage_timings(self, runs):
+        """Copies each run's stage seconds from the metrics log into its record."""
+        stages = {}
+        run_ids = []
+        with open(os.environ["METRICS_LOG_FILE"], "r", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry.get("event") == "run":
+                    run_ids.append(entry["run_id"])
+                elif "stage" in entry:
+                    totals = stages.setdefault(entry["run_id"], {})
+                    totals[entry["stage"]] = totals.get(entry["stage"], 0) + entry["seconds"]
+        for record, run_id in zip(runs, run_ids):
+            for name in ("fetch", "parse", "history_write", "subscriber_fetch", "deliver"):
+                record[f"{name}_seconds"] = stages.get(run_id, {}).get(name, 0.0)
+
+    def summarize(self, runs):
+        by_result = {}
+        for record in runs:
+            by_result.setdefault(record["result"], []).append(record["seconds"])
+        emails = sum(record["emails"] for record in runs)
+        deliver_seconds = sum(record["deliver_seconds"] for record in runs)
+        return {
+            "beaches": len(self.beaches),
+            "subscribers": len(self.server.subscribers),
+            "runs": len(runs),
+            "days": self.days,
+            "latency": {result: {"runs": len(values), "p50": _percentile(values, 0.5),
+                                 "p95": _percentile(values, 0.95), "max": max(values)}
+                        for result, values in sorted(by_result.items())},
+            "max_rss_mb": max(record["max_rss_mb"] for record in runs),
+            "history_mb": runs[-1]["history_bytes"] / 1e6,
+            "history_mb_per_day": runs[-1]["history_bytes"] / 1e6 / self.days,
+            "emails": emails,
+            "emails_per_second": emails / deliver_seconds if deliver_seconds else 0.0,
+            "max_emails_per_run": max(record["emails"] for record in runs),
+            "topic_posts": self.server.topic_posts,
+            "subscriber_requests": self.server.subscriber_requests,
+            "parse_seconds_max": max(record["parse_seconds"] for record in runs),
+            "subscriber_fetch_seconds_max": max(record["subscriber_fetch_seconds"] for record in runs),
+        }
+
+
+def print_summary(summary):
+    print(f"{summary['beaches']} beaches, {summary['subscribers']} subscribers, "
+          f"{summary['runs']} runs over {summary['days']} simulated days")
+    for result, latency in summary["latency"].items():
+        print(f"  {result:9s} {latency['runs']:5d} runs  p50 {latency['p50']:6.2f}s  "
+              f"p95 {latency['p95']:6.2f}s  max {latency['max']:6.2f}s")
+    print(f"  memory high-water {summary['max_rss_mb']:.1f} MB; history {summary['history_mb']:.1f} MB "
+          f"({summary['history_mb_per_day']:.2f} MB per day)")
+    print(f"  {summary['emails']} emails at {summary['emails_per_second']:.0f}/s while delivering "
+          f"(max {summary['max_emails_per_run']} in one run), {summary['topic_posts']} topic posts")
+    print(f"  slowest parse {summary['parse_seconds_max']:.2f}s, slowest subscriber sync "
+          f"{summary['subscriber_fetch_seconds_max']:.2f}s ({summary['subscriber_requests']} Worker requests)")
+
+
+def _curve(args):
+    """Runs each combination in its own process (so memory is measured per size) and tabulates them."""
+    import subprocess
+
+    rows = []
+    for beaches in args.beaches.split(","):
+        for subscribers in args.subscribers.split(","):
+            command = [sys.executable, os.path.abspath(__file__), "run", "--json",
+                       "--beaches", beaches, "--subscribers", subscribers, "--days", str(args.days),
+                       "--runs-per-day", str(args.runs_per_day), "--publish-every", str(args.publish_every),
+                       "--churn", str(args.churn)]
+            print(f"Simulating {beaches} beaches, {subscribers} subscribers...", file=sys.stderr)
+            output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+            rows.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'beaches':>8} {'subs':>7} {'p50 quiet':>10} {'p95 publish':>12} {'max run':>8} {'rss MB':>7} "
+          f"{'hist MB/day':>11} {'emails/s':>9} {'max parse':>10}")
+    for summary in rows:
+        latency = summary["latency"]
+        quiet = latency.get("unchanged", {}).get("p50", 0.0)
+        published = max((latency.get(result, {}).get("p95", 0.0) for result in ("updated", "changed")), default=0.0)
+        slowest = max(value["max"] for value in latency.values())
+        print(f"{summary['beaches']:8d} {summary['subscribers']:7d} {quiet:9.2f}s {published:11.2f}s "
+              f"{slowest:7.2f}s {summary['max_rss_mb']:7.1f} {summary['history_mb_per_day']:11.2f} "
+              f"{summary['emails_per_second']:9.0f} {summary['parse_seconds_max']:9.2f}s")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the checker against local stand-ins at scale")
+    commands = parser.add_subparsers(dest="command")
+    for name, help_text in (("run", "simulate one configuration"), ("curve", "simulate several sizes")):
+        command = commands.add_parser(name, help=help_text)
+        if name == "run":
+            command.add_argument("--beaches", type=int, default=1000)
+            command.add_argument("--subscribers", type=int, default=50000)
+            command.add_argument("--signups-per-day", type=int, default=100)
+            command.add_argument("--email-rate", type=float, default=0,
+                                 help="EMAIL_RATE_LIMIT for the run (default 0: unlimited)")
+            command.add_argument("--settle-minutes", type=float, default=0, help="NOTIFY_SETTLE_MINUTES")
+            command.add_argument("--seed", type=int, default=1)
+            command.add_argument("--csv", help="write one row per run to this file")
+            command.add_argument("--json", action="store_true", help="print the summary as JSON")
+            command.add_argument("--verbose", action="store_true", help="show the checker's own output")
+        else:
+            command.add_argument("--beaches", default="100,300,1000")
+            command.add_argument("--subscribers", default="5000,50000")
+        command.add_argument("--days", type=int, default=7 if name == "run" else 2)
+        command.add_argument("--runs-per-day", type=int, default=24)
+        command.add_argument("--publish-every", type=int, default=24, help="runs between report republications")
+        command.add_argument("--churn", type=float, default=0.02, help="share of beaches changed per republication")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        csv_file = args.csv and os.path.abspath(args.csv)
+        simulation = Simulation(args.beaches, args.subscribers, args.days, args.runs_per_day, args.publish_every,
+                                args.churn, args.signups_per_day, args.email_rate, args.settle_minutes, args.seed)
+        print(f"Simulating in {simulation.workdir}", file=sys.stderr)
+        summary = simulation.summarize(simulation.run(csv_file, not args.verbose))
+        if args.json:
+            print(json.dumps(summary))
+        else:
+            print_summary(summary)
+    elif args.command == "curve":
+        _curve(args)
+    else:
+        parser.print_help()
+        sys.exit(1)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and counters for the checker pipeline.
+
+check_status.main() opens a run with begin_run() and closes it with end_run(result).
+In between, each stage (fetch, parse, diff, history_write, rollup, status_write,
+subscriber_fetch, deliver, notify per channel, and http per endpoint) is recorded
+with its duration, byte count, row count and error count:
+
+    with stage("history_write") as info:
+        rows = history.flush()
+        info["rows"] = len(rows)
+
+Every recorded stage becomes one JSON line in METRICS_LOG_FILE. The lines are
+buffered in memory and appended in one write at end_run() (or whenever
+METRICS_LOG_BUFFER_LINES pile up), so a run's thousands of notification and
+HTTP attempts don't each open the file. end_run() also rewrites METRICS_TEXTFILE in the Prometheus textfile format (for
+node_exporter's textfile collector) with the last run's stages and the process's
+run totals. Set METRICS_LOG_FILE=- to print the JSON lines instead, or set either
+variable to an empty string to turn that output off. Outside a run, stage() and
+record() only time the block.
+"""
+
+import os
+import json
+import time
+import uuid
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+METRICS_LOG_FILE = os.environ.get("METRICS_LOG_FILE", "check_metrics.jsonl")
+METRICS_TEXTFILE = os.environ.get("METRICS_TEXTFILE", "check_metrics.prom")
+# The JSON log is moved to METRICS_LOG_FILE + ".1" once it grows past this size
+METRICS_LOG_MAX_BYTES = int(os.environ.get("METRICS_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+# Buffered JSON lines are written out early once there are this many
+METRICS_LOG_BUFFER_LINES = 1000
+METRICS_PREFIX = "beach_checker"
+
+_lock = threading.Lock()
+_run = None
+# Process lifetime totals, so a long-running watcher exports real counters
+_run_totals = {}
+_error_totals = {}
+
+STAGE_FIELDS = ("seconds", "bytes", "rows", "errors", "calls")
+
+
+def _log_line(entry):
+    return json.dumps(entry, separators=(',', ':'), ensure_ascii=False)
+
+
+def _write_log_lines(lines):
+    """Appends buffered JSON lines in one write. Called with _lock held, so writers never interleave."""
+    if not METRICS_LOG_FILE or not lines:
+        return
+    if METRICS_LOG_FILE == "-":
+        print("\n".join(lines))
+        return
+    try:
+        if os.path.exists(METRICS_LOG_FILE) and os.path.getsize(METRICS_LOG_FILE) > METRICS_LOG_MAX_BYTES:
+            os.replace(METRICS_LOG_FILE, METRICS_LOG_FILE + ".1")
+        with open(METRICS_LOG_FILE, 'a', encoding='utf-8') as f:
+            f.write("\n".join(lines) + "\n")
+    except OSError as e:
+        print(f"Failed to write metrics log: {e}")
+
+
+def begin_run():
+    """Starts collecting stages for one check."""
+    global _run
+    with _lock:
+        _run = {
+            "run_id": uuid.uuid4().hex[:12],
+            "started_at": time.time(),
+            "start": time.perf_counter(),
+            "stages": {},
+            # JSON log lines not written yet
+            "lines": [],
+        }
+    return _run["run_id"]
+
+
+def record(name, seconds=0.0, size=0, rows=0, errors=0, **labels):
+    """Adds one observation of a stage to the current run (a no-op outside a run)."""
+    with _lock:
+        if _run is None:
+            return
+        key = (name,) + tuple(sorted(labels.items()))
+        totals = _run["stages"].setdefault(key, dict.fromkeys(STAGE_FIELDS, 0))
+        totals["seconds"] += seconds
+        totals["bytes"] += size
+        totals["rows"] += rows
+        totals["errors"] += errors
+        totals["calls"] += 1
+        if errors:
+            _error_totals[key] = _error_totals.get(key, 0) + errors
+
+        if METRICS_LOG_FILE:
+            lines = _run["lines"]
+            lines.append(_log_line({
+                "time": datetime.now(timezone.utc).isoformat(),
+                "run_id": _run["run_id"],
+                "stage": name,
+                **labels,
+                "seconds": round(seconds, 6),
+                "bytes": size,
+                "rows": rows,
+                "errors": errors,
+            }))
+            if len(lines) >= METRICS_LOG_BUFFER_LINES:
+                _write_log_lines(lines)
+                lines.clear()
+
+
+@contextmanager
+def stage(name, **labels):
+    """
+    Times the block and records it as a stage. The yielded dict takes "bytes"
+    and "rows" (and "errors" for handled failures); an exception counts as one error.
+    """
+    info = {"bytes": 0, "rows": 0, "errors": 0}
+    start = time.perf_counter()
+    try:
+        yield info
+    except Exception:
+        info["errors"] += 1
+        raise
+    finally:
+        record(name, time.perf_counter() - start, info["bytes"], info["rows"], info["errors"], **labels)
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _series(metric, labels, value):
+    label_text = ",".join(f'{key}="{_escape_label(val)}"' for key, val in labels)
+    return f"{METRICS_PREFIX}_{metric}{{{label_text}}} {value}" if label_text else f"{METRICS_PREFIX}_{metric} {value}"
+
+
+def render_textfile(run, result):
+    """The Prometheus text exposition of a finished run plus the process totals."""
+    lines = []
+
+    def family(metric, kind, help_text, samples):
+        lines.append(f"# HELP {METRICS_PREFIX}_{metric} {help_text}")
+        lines.append(f"# TYPE {METRICS_PREFIX}_{metric} {kind}")
+        lines.extend(_series(metric, labels, value) for labels, value in samples)
+
+    stages = sorted(run["stages"].items())
+
+    def stage_labels(key):
+        return [("stage", key[0])] + list(key[1:])
+
+    family("stage_duration_seconds", "gauge", "Time spent in each stage during the last check.",
+           [(stage_labels(key), f"{totals['seconds']:.6f}") for key, totals in stages])
+    family("stage_bytes", "gauge", "Bytes handled by each stage during the last check.",
+           [(stage_labels(key), totals["bytes"]) for key, totals in stages])
+    family("stage_rows", "gauge", "Rows or records handled by each stage during the last check.",
+           [(stage_labels(key), totals["rows"]) for key, totals in stages])
+    family("stage_errors", "gauge", "Errors in each stage during the last check.",
+           [(stage_labels(key), totals["errors"]) for key, totals in stages])
+    family("stage_calls", "gauge", "Times each stage ran during the last check.",
+           [(stage_labels(key), totals["calls"]) for key, totals in stages])
+    family("stage_errors_total", "counter", "Errors in each stage since the process started.",
+           [(stage_labels(key), count) for key, count in sorted(_error_totals.items())])
+    family("last_run_timestamp_seconds", "gauge", "When the last check started (Unix time).",
+           [([], f"{run['started_at']:.3f}")])
+    family("last_run_duration_seconds", "gauge", "How long the last check took.",
+           [([], f"{run['seconds']:.6f}")])
+    family("last_run_result", "gauge", "1 for the result of the last check.",
+           [([("result", result)], 1)])
+    family("runs_total", "counter", "Checks since the process started, by result.",
+           [([("result", name)], count) for name, count in sorted(_run_totals.items())])
+    return "\n".join(lines) + "\n"
+
+
+def end_run(result):
+    """Closes the current run: writes its summary line and the Prometheus textfile."""
+    global _run
+    with _lock:
+        run, _run = _run, None
+        if run is None:
+            return None
+        run["seconds"] = time.perf_counter() - run["start"]
+        _run_totals[result] = _run_totals.get(result, 0) + 1
+
+        run["lines"].append(_log_line({
+            "time": datetime.now(timezone.utc).isoformat(),
+            "run_id": run["run_id"],
+            "event": "run",
+            "result": result,
+            "seconds": round(run["seconds"], 6),
+            "errors": sum(totals["errors"] for totals in run["stages"].values()),
+        }))
+        _write_log_lines(run.pop("lines"))
+
+    if METRICS_TEXTFILE:
+        try:
+            # Written under a temporary name and renamed, so the collector never reads half a file
+            temp_file = METRICS_TEXTFILE + '.tmp'
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(render_textfile(run, result))
+            os.replace(temp_file, METRICS_TEXTFILE)
+        except OSError as e:
+            print(f"Failed to write metrics textfile: {e}")
+    return run
+
+
+def summarize(log_file=METRICS_LOG_FILE, runs=20):
+    """Median seconds per stage over the last `runs` runs in the JSON log."""
+    entries = []
+    try:
+        with open(log_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    except FileNotFoundError:
+        return {}
+
+    run_ids = [entry["run_id"] for entry in entries if entry.get("event") == "run"][-runs:]
+    wanted = set(run_ids)
+    durations = {}
+    for entry in entries:
+        if entry.get("run_id") in wanted and "stage" in entry:
+            durations.setdefault(entry["stage"], []).append(entry["seconds"])
+    return {name: sorted(values)[len(values) // 2] for name, values in durations.items()}
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) > 1 and sys.argv[1] == "summary":
+        runs = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        medians = summarize(runs=runs)
+        if not medians:
+            print(f"No runs recorded in {METRICS_LOG_FILE}")
+        for name, seconds in sorted(medians.items(), key=lambda item: -item[1]):
+            print(f"{name:20s} {seconds * 1000:10.1f} ms (median per observation)")
+    else:
+        print("Usage: python metrics.py summary [runs]")
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Flap damping and per-recipient digests for status-change notifications.
+
+With NOTIFY_SETTLE_MINUTES set, check_status hands status changes to a
+DigestScheduler instead of notifying straight away:
+
+- Each beach remembers the status its subscribers were last told about. A
+  change is held until the beach has kept its new status for the settle window;
+  every further flip restarts the window. A beach that flips back to the status
+  subscribers already know is dropped without a message. A beach that keeps
+  flapping is still reported after NOTIFY_MAX_HOLD_MINUTES, with its status at
+  that point.
+- Released changes are queued per recipient and merged into one digest with
+  the net change of each beach (green -> yellow -> red is one green -> red line).
+  With NOTIFY_DIGEST_INTERVAL_MINUTES set, a recipient gets at most one digest
+  per interval; a beach that changes back before their next digest drops out.
+
+A stable change therefore goes out on the first check after its settle window.
+watcher.py schedules a check for that moment; a cron job that runs every N
+minutes adds up to N minutes on top, which is why the hourly workflow leaves
+digest mode off.
+The state is kept in NOTIFY_DIGEST_STATE_FILE between runs. The file holds
+subscriber addresses, so it is cached like the outbox and never committed.
+
+Usage:
+    python notification_digest.py status
+    python notification_digest.py simulate [days]
+"""
+
+import os
+import json
+from datetime import datetime, timedelta, timezone
+
+NOTIFY_DIGEST_STATE_FILE = os.environ.get("NOTIFY_DIGEST_STATE_FILE", "notification_digest_state.json")
+# 0 turns digest mode off: every change is sent by the run that finds it
+NOTIFY_SETTLE_MINUTES = float(os.environ.get("NOTIFY_SETTLE_MINUTES", "0"))
+NOTIFY_MAX_HOLD_MINUTES = float(os.environ.get("NOTIFY_MAX_HOLD_MINUTES", "180"))
+NOTIFY_DIGEST_INTERVAL_MINUTES = float(os.environ.get("NOTIFY_DIGEST_INTERVAL_MINUTES", "0"))
+
+
+def digest_mode_enabled():
+    return NOTIFY_SETTLE_MINUTES > 0
+
+
+def _parse_time(value):
+    return datetime.fromisoformat(value)
+
+
+class DigestScheduler:
+    """
+    The per-beach and per-recipient notification state. Changes are dictionaries
+    as built by check_status: {"beach_name", "old_status", "new_status", "note"}.
+    """
+
+    def __init__(self, state=None, settle_minutes=None, max_hold_minutes=None, digest_interval_minutes=None,
+                 state_file=NOTIFY_DIGEST_STATE_FILE):
+        state = state or {}
+        self.beaches = state.get("beaches", {})
+        self.recipients = state.get("recipients", {})
+        self.stats = {"observed": 0, "suppressed": 0, "released": 0, "digests": 0, **state.get("stats", {})}
+        self.settle = timedelta(minutes=NOTIFY_SETTLE_MINUTES if settle_minutes is None else settle_minutes)
+        self.max_hold = timedelta(minutes=NOTIFY_MAX_HOLD_MINUTES if max_hold_minutes is None else max_hold_minutes)
+        self.digest_interval = timedelta(minutes=NOTIFY_DIGEST_INTERVAL_MINUTES
+                                         if digest_interval_minutes is None else digest_interval_minutes)
+        self.state_file = state_file
+
+    @classmethod
+    def load(cls, state_file=NOTIFY_DIGEST_STATE_FILE, **settings):
+        try:
+            with open(state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            state = {}
+        return cls(state, state_file=state_file, **settings)
+
+    def save(self):
+        state = {"beaches": self.beaches, "recipients": self.recipients, "stats": self.stats}
+        temp_file = self.state_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f, indent=2, ensure_ascii=False)
+        os.replace(temp_file, self.state_file)
+
+    def held(self):
+        """Names of the beaches with a change waiting to settle."""
+        return [name for name, beach in self.beaches.items() if beach.get("pending")]
+
+    def observe(self, changes, now=None):
+        """
+        Holds each change until it settles; a change back to the notified status cancels it.
+        Returns the names of the beaches whose held change was cancelled.
+        """
+        now = now or datetime.now(timezone.utc)
+        cancelled = []
+        for change in changes:
+            self.stats["observed"] += 1
+            name = change["beach_name"]
+            beach = self.beaches.setdefault(name, {"notified": change["old_status"]})
+            pending = beach.get("pending")
+
+            if change["new_status"] == beach["notified"]:
+                if pending:
+                    self.stats["suppressed"] += pending["changes"] + 1
+                    del beach["pending"]
+                    cancelled.append(name)
+                continue
+
+            if pending:
+                pending.update(status=change["new_status"], note=change["note"], changed_at=now.isoformat())
+                pending["changes"] += 1
+            else:
+                beach["pending"] = {"status": change["new_status"], "note": change["note"],
+                                    "first_seen": now.isoformat(), "changed_at": now.isoformat(), "changes": 1}
+        return cancelled
+
+    def _release_at(self, pending):
+        return min(_parse_time(pending["changed_at"]) + self.settle, _parse_time(pending["first_seen"]) + self.max_hold)
+
+    def has_due_changes(self, now=None):
+        """True if release() would release anything."""
+        now = now or datetime.now(timezone.utc)
+        return any(beach.get("pending") and self._release_at(beach["pending"]) <= now for beach in self.beaches.values())
+
+    def release(self, now=None):
+        """Takes the net change of every beach whose window has passed."""
+        now = now or datetime.now(timezone.utc)
+        released = []
+        for name, beach in self.beaches.items():
+            pending = beach.get("pending")
+            if not pending or self._release_at(pending) > now:
+                continue
+            released.append({"beach_name": name, "old_status": beach["notified"],
+                             "new_status": pending["status"], "note": pending["note"]})
+            # Intermediate flips folded into the net change were never sent
+            self.stats["suppressed"] += pending["changes"] - 1
+            self.stats["released"] += 1
+            beach["notified"] = pending["status"]
+            del beach["pending"]
+        return released
+
+    def queue(self, changes, beach_index):
+        """Adds released changes to the pending digest of each subscriber of the beach."""
+        for change in changes:
+            for email in beach_index.get(change["beach_name"], ()):
+                pending = self.recipients.setdefault(email, {"last_sent": None, "pending": {}})["pending"]
+                earlier = pending.get(change["beach_name"])
+                if earlier is None:
+                    pending[change["beach_name"]] = dict(change)
+                elif earlier["old_status"] == change["new_status"]:
+                    # Changed back before this recipient heard about it
+                    del pending[change["beach_name"]]
+                else:
+                    pending[change["beach_name"]] = {**change, "old_status": earlier["old_status"]}
+
+    def take_digests(self, now=None):
+        """Returns {email: [net change, ...]} for every recipient whose digest is due."""
+        now = now or datetime.now(timezone.utc)
+        digests = {}
+        for email, recipient in list(self.recipients.items()):
+            last_sent = recipient["last_sent"] and _parse_time(recipient["last_sent"])
+            if recipient["pending"] and (not last_sent or now - last_sent >= self.digest_interval):
+                digests[email] = list(recipient["pending"].values())
+                recipient["pending"] = {}
+                recipient["last_sent"] = now.isoformat()
+                last_sent = now
+            if not recipient["pending"] and (not last_sent or now - last_sent >= self.digest_interval):
+                # Nothing can hold this recipient's next digest back, so there is nothing to remember
+                del self.recipients[email]
+        self.stats["digests"] += len(digests)
+        return digests
+
+    def next_due_at(self):
+        """When the next held change or digest becomes due, or None if nothing is held."""
+        times = [self._release_at(beach["pending"]) for beach in self.beaches.values() if beach.get("pending")]
+        times += [_parse_time(recipient["last_sent"]) + self.digest_interval
+                  for recipient in self.recipients.values() if recipient["pending"] and recipient["last_sent"]]
+        return min(times) if times else None
+
+
+def _simulate(days):
+    """Replays seeded flappy days through the scheduler and compares message counts."""
+    import random
+
+    from check_status import BEACH_COORDINATES
+
+    rng = random.Random(1)
+    settle = NOTIFY_SETTLE_MINUTES or 45
+    scheduler = DigestScheduler(settle_minutes=settle, state_file=os.devnull)
+    beaches = list(BEACH_COORDINATES)
+    # Every subscriber follows two to four beaches
+    beach_index = {}
+    for number in range(200):
+        for beach in rng.sample(beaches, rng.randint(2, 4)):
+            beach_index.setdefault(beach, []).append(f"subscriber{number}@example.com")
+
+    status = {beach: "green" for beach in beaches}
+    immediate_messages = digest_messages = 0
+    delays = []
+    changed_at = {}
+    now = datetime(2025, 7, 1, 6, tzinfo=timezone.utc)
+    for check in range(days * 24 * 4):
+        # Checks every 15 minutes; three beaches are in a bloom and bounce between green and yellow
+        changes = []
+        for index, beach in enumerate(beaches):
+            if index < 3:
+                new_status = ("yellow" if status[beach] == "green" else "green") if rng.random() < 0.25 else None
+            elif rng.random() < 0.01:
+                new_status = rng.choice([s for s in ("green", "yellow", "red") if s != status[beach]])
+            else:
+                new_status = None
+            if new_status:
+                changes.append({"beach_name": beach, "old_status": status[beach],
+                                "new_status": new_status, "note": ""})
+                status[beach] = new_status
+                changed_at[beach] = now
+
+        recipients = set()
+        for change in changes:
+            recipients.update(beach_index.get(change["beach_name"], ()))
+        immediate_messages += len(recipients)
+
+        scheduler.observe(changes, now)
+        released = scheduler.release(now)
+        for change in released:
+            delays.append((now - changed_at[change["beach_name"]]).total_seconds() / 60)
+        scheduler.queue(released, beach_index)
+        digest_messages += len(scheduler.take_digests(now))
+        now += timedelta(minutes=15)
+
+    print(f"{days} simulated days, checks every 15 minutes, {settle:g} minute settle window:")
+    print(f"  immediate mode: {immediate_messages} emails")
+    print(f"  digest mode:    {digest_messages} emails "
+          f"({100 * (1 - digest_messages / max(1, immediate_messages)):.0f}% fewer)")
+    print(f"  {scheduler.stats['suppressed']} changes suppressed, {scheduler.stats['released']} net changes sent, "
+          f"sent {min(delays, default=0):.0f}-{max(delays, default=0):.0f} min after the last flip")
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "status":
+        scheduler = DigestScheduler.load()
+        print(f"Settle window {scheduler.settle}, max hold {scheduler.max_hold}, "
+              f"digest interval {scheduler.digest_interval}")
+        for name in scheduler.held():
+            pending = scheduler.beaches[name]["pending"]
+            print(f"  held: {name} {scheduler.beaches[name]['notified'].upper()} -> {pending['status'].upper()} "
+                  f"({pending['changes']} change(s), due {scheduler._release_at(pending).isoformat()})")
+        waiting = sum(1 for recipient in scheduler.recipients.values() if recipient["pending"])
+        print(f"  {waiting} recipient digest(s) waiting; totals: {scheduler.stats}")
+    elif command == "simulate":
+        _simulate(int(sys.argv[2]) if len(sys.argv) > 2 else 7)
+    else:
+        print("Usage: python notification_digest.py status | simulate [days]")
+        sys.exit(1)
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Concurrent notification delivery with retries and an on-disk outbox.
+
+Every notification (the ntfy topic post, each subscriber email) becomes a job
+that a thread pool delivers with at most NOTIFY_CONCURRENCY in flight. Each
+channel has its own rate limit, and a failed send is retried with exponential
+backoff and full jitter. Jobs that still fail are written to the outbox file,
+which the next run of check_status.py drains before doing anything else.
+A sender that finds its whole channel unusable (e.g. the SMTP login is refused)
+raises ChannelUnavailable: the channel is given up on for the rest of the
+dispatch and its jobs go to the outbox without being tried.
+
+A job is a plain dictionary:
+    {"id": ..., "channel": "ntfy" | "email", "recipient": ..., "subject": ...,
+     "body": ..., "attempts": 0, "created_at": ISO timestamp}
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import threading
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import record
+
+OUTBOX_FILE = 'notification_outbox.jsonl'
+
+NOTIFY_CONCURRENCY = int(os.environ.get("NOTIFY_CONCURRENCY", "8"))
+NOTIFY_MAX_ATTEMPTS = int(os.environ.get("NOTIFY_MAX_ATTEMPTS", "4"))
+NOTIFY_BACKOFF_BASE = float(os.environ.get("NOTIFY_BACKOFF_BASE", "1.0"))
+NOTIFY_BACKOFF_MAX = float(os.environ.get("NOTIFY_BACKOFF_MAX", "30.0"))
+# Messages per second for each channel (0 disables the limit)
+CHANNEL_RATE_LIMITS = {
+    "ntfy": float(os.environ.get("NTFY_RATE_LIMIT", "1")),
+    "email": float(os.environ.get("EMAIL_RATE_LIMIT", "10")),
+}
+# Outbox jobs older than this are stale status news and are dropped instead of resent
+OUTBOX_MAX_AGE_HOURS = float(os.environ.get("OUTBOX_MAX_AGE_HOURS", "48"))
+
+
+class PermanentDeliveryError(Exception):
+    """Raised by a sender when retrying can't help (e.g. the address was rejected)."""
+
+
+class ChannelUnavailable(Exception):
+    """Raised by a sender when no job on its channel can be delivered now (e.g. bad SMTP credentials)."""
+
+
+def make_job(channel, recipient, subject, body):
+    return {
+        "id": uuid.uuid4().hex,
+        "channel": channel,
+        "recipient": recipient,
+        "subject": subject,
+        "body": body,
+        "attempts": 0,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+
+
+class RateLimiter:
+    """Token bucket shared by the threads sending on one channel."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def backoff_delay(attempt, base=NOTIFY_BACKOFF_BASE, cap=NOTIFY_BACKOFF_MAX):
+    """Full jitter: a random delay between 0 and base * 2^attempt, capped."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class NotificationDispatcher:
+    """
+    Delivers jobs through per-channel sender functions, sender(job) -> None,
+    which raise on failure.
+    """
+
+    def __init__(self, senders, concurrency=NOTIFY_CONCURRENCY, rate_limits=None,
+                 max_attempts=NOTIFY_MAX_ATTEMPTS, sleep=time.sleep):
+        self.senders = senders
+        self.concurrency = max(1, concurrency)
+        rate_limits = CHANNEL_RATE_LIMITS if rate_limits is None else rate_limits
+        self.limiters = {channel: RateLimiter(rate_limits.get(channel, 0)) for channel in senders}
+        self.max_attempts = max(1, max_attempts)
+        self.sleep = sleep
+        # channel -> the ChannelUnavailable error that took it out for this dispatch
+        self.unavailable = {}
+
+    def _deliver(self, job):
+        """Returns None when delivered, otherwise the last error."""
+        sender = self.senders.get(job["channel"])
+        if sender is None:
+            return ValueError(f"No sender configured for channel {job['channel']!r}")
+
+        error = None
+        for attempt in range(self.max_attempts):
+            if job["channel"] in self.unavailable:
+                return self.unavailable[job["channel"]]
+            self.limiters[job["channel"]].acquire()
+            job["attempts"] += 1
+            start = time.perf_counter()
+            try:
+                sender(job)
+                record("notify", time.perf_counter() - start, size=len(job["body"]), rows=1, channel=job["channel"])
+                return None
+            except PermanentDeliveryError as e:
+                record("notify", time.perf_counter() - start, errors=1, channel=job["channel"])
+                job["permanent"] = True
+                return e
+            except ChannelUnavailable as e:
+                record("notify", time.perf_counter() - start, errors=1, channel=job["channel"])
+                if self.unavailable.setdefault(job["channel"], e) is e:
+                    print(f"⚠️ Giving up on the {job['channel']} channel for this run: {e}")
+                return e
+            except Exception as e:
+                record("notify", time.perf_counter() - start, errors=1, channel=job["channel"])
+                error = e
+            if attempt + 1 < self.max_attempts:
+                self.sleep(backoff_delay(attempt))
+        return error
+
+    def dispatch(self, jobs):
+        """
+        Delivers all jobs, at most `concurrency` at a time.
+        Returns the jobs that should be retried later (permanent failures are not returned).
+        """
+        if not jobs:
+            return []
+
+        undelivered = []
+        dropped = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(jobs))) as executor:
+            for job, error in zip(jobs, executor.map(self._deliver, jobs)):
+                if error is None:
+                    continue
+                job["last_error"] = str(error)
+                if job.pop("permanent", False):
+                    dropped += 1
+                    print(f"Dropping {job['channel']} notification to {job['recipient']}: {error}")
+                elif isinstance(error, ChannelUnavailable):
+                    # Reported once above, not once per job
+                    undelivered.append(job)
+                else:
+                    print(f"Failed to send {job['channel']} notification to {job['recipient']} "
+                          f"after {job['attempts']} attempts: {error}")
+                    undelivered.append(job)
+
+        elapsed = time.perf_counter() - start
+        print(f"Delivered {len(jobs) - len(undelivered) - dropped}/{len(jobs)} notifications in {elapsed:.2f}s "
+              f"({len(undelivered)} queued for retry, {dropped} dropped)")
+        return undelivered
+
+
+def load_outbox(outbox_file=OUTBOX_FILE):
+    jobs = []
+    try:
+        with open(outbox_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    jobs.append(json.loads(line))
+                except json.JSONDecodeError:
+                    print(f"Skipping a corrupt outbox line: {line[:80]}")
+    except FileNotFoundError:
+        pass
+    return jobs
+
+
+def save_outbox(jobs, outbox_file=OUTBOX_FILE):
+    """
+    Rewrites the outbox atomically. An emptied outbox is kept as an empty file
+    so a cached copy of an older outbox can't replace it.
+    """
+    temp_file = outbox_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        for job in jobs:
+            f.write(json.dumps(job, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, outbox_file)
+
+
+def enqueue_outbox(jobs, outbox_file=OUTBOX_FILE):
+    """Adds jobs to the outbox, keeping what is already queued."""
+    if jobs:
+        save_outbox(load_outbox(outbox_file) + jobs, outbox_file)
+        print(f"📮 {len(jobs)} notification(s) saved to {outbox_file} for the next run.")
+
+
+def _expired(job, now):
+    try:
+        created = datetime.fromisoformat(job["created_at"])
+    except (KeyError, TypeError, ValueError):
+        return False
+    return now - created > timedelta(hours=OUTBOX_MAX_AGE_HOURS)
+
+
+def drain_outbox(dispatcher, outbox_file=OUTBOX_FILE):
+    """Retries the queued jobs and keeps whatever still fails."""
+    jobs = load_outbox(outbox_file)
+    if not jobs:
+        return
+
+    now = datetime.now(timezone.utc)
+    fresh = [job for job in jobs if not _expired(job, now)]
+    if len(fresh) < len(jobs):
+        print(f"Dropping {len(jobs) - len(fresh)} outbox notification(s) older than {OUTBOX_MAX_AGE_HOURS:g} hours.")
+
+    print(f"📮 Draining {len(fresh)} queued notification(s) from {outbox_file}...")
+    save_outbox(dispatcher.dispatch(fresh), outbox_file)
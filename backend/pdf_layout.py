@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Layout-template fast path for the report table.
+
+page.extract_table with the "lines" strategy rebuilds the whole cell graph from
+every line intersection on each run, which is the most expensive step of a check.
+The report's layout rarely changes, so after a known-good parse we remember the
+table's bounding box and column x-boundaries. Later parses crop to that box, read
+the row dividers and words inside it, and bucket the words into cells directly.
+
+The caller validates the result against the known beach list and falls back to
+the full extraction (which re-learns the template) when it doesn't match.
+
+Usage:
+    python pdf_layout.py compare REPORT.pdf [runs]
+"""
+
+import os
+import re
+import json
+from bisect import bisect_right
+
+LAYOUT_TEMPLATE_FILE = 'layout_template.json'
+TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}
+
+# Row dividers closer together than this (in points) are treated as one line
+ROW_EDGE_TOLERANCE = 2
+# Words whose tops differ by less than this sit on the same text line within a cell
+LINE_TOLERANCE = 3
+
+# What the Status, Date Updated and Notes cells of a data row look like. A column
+# boundary in the wrong place moves text across cells and breaks at least one of them.
+REPORT_COLUMN_COUNT = 4
+STATUS_CELL = re.compile(r"[^A-Za-z0-9]*")  # an icon glyph, or nothing when the icon is an image
+DATE_CELL = re.compile(r"|N/A|[A-Z][a-z]{2} +\d{1,2} +\d{4}( +\d{1,2}:\d{2} ?[AP]M)?")
+NOTE_CELL = re.compile(r"|[A-Z(].*", re.DOTALL)
+
+
+def load_layout_template(template_file=LAYOUT_TEMPLATE_FILE):
+    try:
+        with open(template_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def save_layout_template(template, template_file=LAYOUT_TEMPLATE_FILE):
+    """Saves the template, skipping the write when it hasn't changed."""
+    if template == load_layout_template(template_file):
+        return
+    temp_file = template_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(template, f, indent=2)
+    os.replace(temp_file, template_file)
+    print(f"Saved report layout template to {template_file}.")
+
+
+def find_report_table(page):
+    """Runs the full "lines" table finder and returns the largest table (or None)."""
+    return page.find_table(table_settings=TABLE_SETTINGS)
+
+
+def learn_layout_template(page, table):
+    """Captures the bounding box and column boundaries of a table found by pdfplumber."""
+    column_edges = sorted({round(cell[0], 1) for cell in table.rows[0].cells if cell}
+                          | {round(table.bbox[2], 1)})
+    return {
+        'page_size': [round(page.width, 1), round(page.height, 1)],
+        'bbox': [round(value, 1) for value in table.bbox],
+        'column_edges': column_edges
+    }
+
+
+def _row_edges(cropped, bbox):
+    """Returns the sorted y positions of the horizontal dividers inside the table."""
+    tops = sorted([bbox[1], bbox[3]] + [edge['top'] for edge in cropped.horizontal_edges])
+    edges = []
+    for top in tops:
+        if not edges or top - edges[-1] > ROW_EDGE_TOLERANCE:
+            edges.append(top)
+    return edges
+
+
+def _cell_text(words):
+    """Joins the words of one cell the way pdfplumber does: spaces within a line, newlines between lines."""
+    lines = []
+    for word in sorted(words, key=lambda w: (w['top'], w['x0'])):
+        if lines and abs(word['top'] - lines[-1][0]) < LINE_TOLERANCE:
+            lines[-1][1].append(word['text'])
+        else:
+            lines.append((word['top'], [word['text']]))
+    return "\n".join(" ".join(text) for _, text in lines)
+
+
+def extract_table_with_template(page, template):
+    """
+    Builds the table rows from the words inside the template's bounding box.
+    Returns None if the page doesn't fit the template at all.
+    """
+    if [round(page.width, 1), round(page.height, 1)] != template['page_size']:
+        return None
+
+    bbox = template['bbox']
+    column_edges = template['column_edges']
+    cropped = page.crop(bbox, strict=False)
+
+    row_edges = _row_edges(cropped, bbox)
+    if len(row_edges) < 3:
+        return None
+
+    row_count = len(row_edges) - 1
+    column_count = len(column_edges) - 1
+    cells = [[[] for _ in range(column_count)] for _ in range(row_count)]
+
+    for word in cropped.extract_words():
+        row = bisect_right(row_edges, (word['top'] + word['bottom']) / 2) - 1
+        column = bisect_right(column_edges, (word['x0'] + word['x1']) / 2) - 1
+        if 0 <= row < row_count and 0 <= column < column_count:
+            cells[row][column].append(word)
+
+    return [[_cell_text(words) for words in row] for row in cells]
+
+
+def _row_cells_fit(row):
+    status, date, note = (str(cell or "").strip() for cell in row[1:REPORT_COLUMN_COUNT])
+    return bool(STATUS_CELL.fullmatch(status) and DATE_CELL.fullmatch(date) and NOTE_CELL.fullmatch(note))
+
+
+def table_matches_beaches(table, known_beaches):
+    """
+    Checks that every data row names a known beach, once, has the report's four
+    columns, and has a status, date and note cell of the expected shape. A new or
+    renamed beach, a shifted or misplaced column boundary or a merged row all fail
+    this check.
+    """
+    if not table or len(table) < 2:
+        return False
+    if any(len(row) != REPORT_COLUMN_COUNT for row in table):
+        return False
+    # Every column has a heading; a boundary inside a heading leaves one empty
+    if not all(str(cell or "").strip() for cell in table[0]):
+        return False
+    rows = [row for row in table[1:] if row[0]]
+    names = [str(row[0]).strip() for row in rows]
+    return (bool(names) and len(names) == len(set(names)) and all(name in known_beaches for name in names)
+            and all(_row_cells_fit(row) for row in rows))
+
+
+if __name__ == "__main__":
+    import io
+    import sys
+    import time
+    import pdfplumber
+    from check_status import BEACH_COORDINATES
+
+    if len(sys.argv) < 3 or sys.argv[1] != "compare":
+        print("Usage: python pdf_layout.py compare REPORT.pdf [runs]")
+        sys.exit(1)
+
+    runs = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+    with open(sys.argv[2], 'rb') as f:
+        pdf_bytes = f.read()
+
+    def time_path(extract):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+                result = extract(pdf.pages[0])
+            timings.append(time.perf_counter() - start)
+        return result, sorted(timings)[len(timings) // 2] * 1000
+
+    full_table, full_ms = time_path(lambda page: page.extract_table(table_settings=TABLE_SETTINGS))
+
+    with pdfplumber.open(io.BytesIO(pdf_bytes)) as pdf:
+        page = pdf.pages[0]
+        template = learn_layout_template(page, find_report_table(page))
+    fast_table, fast_ms = time_path(lambda page: extract_table_with_template(page, template))
+
+    print(f"Full extract_table:  {full_ms:8.2f} ms (median of {runs})")
+    print(f"Layout template:     {fast_ms:8.2f} ms (median of {runs})")
+    print(f"Speedup:             {full_ms / fast_ms:8.1f}x")
+    print(f"Template passes validation: {table_matches_beaches(fast_table, BEACH_COORDINATES)}")
+    print(f"Identical tables:           {fast_table == full_table}")
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+Content-addressed archive of the downloaded reports, and batch reclassification of the history.
+
+Every report the fetcher downloads is stored once, gzip-compressed, under the
+SHA-256 of its bytes (the same content hash report_fetcher.py keeps), and every
+successful fetch appends one line to the manifest, whether or not the report was
+new:
+
+    report_archive/
+        manifest.jsonl                  {"time", "source", "sha256", "bytes", "new"}
+        objects/ab/ab12...ef.pdf.gz     the report bytes
+        tables/ab/ab12...ef.NAME.json.gz  the raw table parsed from it by source NAME
+
+Fetches from one check share the same "time", so the manifest replays as a
+sequence of checks. reclassify() rebuilds the history from it when the status
+rules (validate_status, determine_status_from_indicator) change:
+
+  1. each distinct report is parsed once, in a process pool, into its raw table
+     (tables parsed by an earlier rebuild are reused unless reparse is set);
+  2. the current rules turn each table into beach records, once per report;
+  3. the checks are replayed in time order and the history CSV is written in
+     one streaming pass, with the same change and daily-snapshot rows that
+     check_status writes.
+
+Set REPORT_ARCHIVE_DIR to an empty string to stop archiving.
+
+Usage:
+    python report_archive.py stats
+    python report_archive.py reclassify OUTPUT.csv [--workers N] [--reparse] [--no-daily] [--intervals]
+    python report_archive.py bench [seasons]
+"""
+
+import os
+import io
+import csv
+import json
+import gzip
+import time
+import hashlib
+from datetime import datetime, timezone
+from concurrent.futures import ProcessPoolExecutor
+
+from history_writer import HISTORY_HEADER
+
+REPORT_ARCHIVE_DIR = os.environ.get("REPORT_ARCHIVE_DIR", "report_archive")
+# History rows are written in chunks of about this many bytes
+WRITE_CHUNK_BYTES = 1 << 20
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_file = f"{path}.{os.getpid()}.tmp"
+    with open(temp_file, 'wb') as f:
+        f.write(data)
+    os.replace(temp_file, path)
+
+
+class ReportArchive:
+    """A directory of compressed reports keyed by content hash, plus the fetch manifest."""
+
+    def __init__(self, root=REPORT_ARCHIVE_DIR):
+        self.root = root
+        self.manifest_file = os.path.join(root, "manifest.jsonl")
+
+    def object_path(self, sha256):
+        return os.path.join(self.root, "objects", sha256[:2], f"{sha256}.pdf.gz")
+
+    def table_path(self, sha256, source_name):
+        return os.path.join(self.root, "tables", sha256[:2], f"{sha256}.{source_name}.json.gz")
+
+    def has(self, sha256):
+        return os.path.exists(self.object_path(sha256))
+
+    def put(self, pdf_bytes, sha256=None):
+        """Stores the report unless an identical one is already archived. Returns (sha256, stored)."""
+        sha256 = sha256 or hashlib.sha256(pdf_bytes).hexdigest()
+        if self.has(sha256):
+            return sha256, False
+        _write_atomic(self.object_path(sha256), gzip.compress(pdf_bytes, compresslevel=6))
+        return sha256, True
+
+    def get(self, sha256):
+        with open(self.object_path(sha256), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def record(self, source_name, sha256, size, new, fetched_at):
+        """Appends one fetch to the manifest."""
+        os.makedirs(self.root, exist_ok=True)
+        entry = {"time": fetched_at, "source": source_name, "sha256": sha256, "bytes": size, "new": new}
+        with open(self.manifest_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, separators=(',', ':')) + "\n")
+
+    def observations(self):
+        """The manifest entries in time order (fetches from one check stay together)."""
+        entries = []
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A line torn by a crash mid-append
+                        continue
+        except FileNotFoundError:
+            return []
+        entries.sort(key=lambda entry: entry["time"])
+        return entries
+
+    def load_table(self, sha256, source_name):
+        try:
+            with open(self.table_path(sha256, source_name), 'rb') as f:
+                return json.loads(gzip.decompress(f.read()))
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    def save_table(self, sha256, source_name, table):
+        data = json.dumps(table, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+        _write_atomic(self.table_path(sha256, source_name), gzip.compress(data, compresslevel=6))
+
+
+def archive_fetch(source, pdf_bytes, validators, fetched_at, archive_dir=None):
+    """
+    Called by report_sources.fetch_sources for each successful fetch: stores new
+    report bytes and records the fetch. A not-modified fetch is only recorded when
+    the report it refers to is in the archive. Never raises.
+    """
+    archive_dir = REPORT_ARCHIVE_DIR if archive_dir is None else archive_dir
+    if not archive_dir:
+        return None
+    try:
+        archive = ReportArchive(archive_dir)
+        if pdf_bytes is not None:
+            sha256, _ = archive.put(pdf_bytes, validators.get('content_hash'))
+            archive.record(source["name"], sha256, len(pdf_bytes), True, fetched_at)
+            return sha256
+        sha256 = validators.get('content_hash')
+        if sha256 and archive.has(sha256):
+            archive.record(source["name"], sha256, 0, False, fetched_at)
+        return sha256
+    except OSError as e:
+        print(f"Failed to archive the {source['name']} report: {e}")
+        return None
+
+
+def missing_from_archive(sha256, archive_dir=None):
+    """
+    True when archiving is on but the report with this content hash (None if unknown)
+    isn't archived, so a not-modified fetch of it has nothing to refer to.
+    """
+    archive_dir = REPORT_ARCHIVE_DIR if archive_dir is None else archive_dir
+    if not archive_dir:
+        return False
+    return not (sha256 and ReportArchive(archive_dir).has(sha256))
+
+
+def warn_if_archive_lost(report_cache, archive_dir=None):
+    """
+    Warns when the report cache has entries but the manifest is empty: the archive
+    directory was lost (e.g. an Actions cache miss) while the cache survived in git.
+    """
+    archive_dir = REPORT_ARCHIVE_DIR if archive_dir is None else archive_dir
+    if not archive_dir or not report_cache:
+        return
+    manifest_file = ReportArchive(archive_dir).manifest_file
+    if not os.path.exists(manifest_file) or os.path.getsize(manifest_file) == 0:
+        print(f"⚠️ The report archive at {archive_dir} is empty but the report cache isn't; "
+              f"reports are downloaded in full this run so they get archived again.")
+
+
+def _parse_archived(job):
+    """Runs in a parse worker: (sha256, source name, table or None, seconds, error)."""
+    root, sha256, source = job
+    start = time.perf_counter()
+    try:
+        pdf_bytes = ReportArchive(root).get(sha256)
+        table = source["parser"](pdf_bytes, source, False)
+        return sha256, source["name"], table, time.perf_counter() - start, None
+    except Exception as e:
+        return sha256, source["name"], None, time.perf_counter() - start, str(e)
+
+
+def _merge(sources_in_order, state):
+    """Beach records of the latest report of each source, first source winning, as check_status merges them."""
+    beaches = []
+    seen = set()
+    for name in sources_in_order:
+        for beach in state.get(name, ()):
+            if beach["beach_name"] not in seen:
+                seen.add(beach["beach_name"])
+                beaches.append(beach)
+    return beaches
+
+
+def reclassify(output_file, row_parser, sources, archive=None, workers=0, reparse=False, daily_snapshots=True):
+    """
+    Rebuilds the history from the archive into output_file (replaced atomically)
+    and returns a dict of counts and timings.
+
+    row_parser(table, coordinates) applies the current status rules to a raw table
+    (check_status.parse_beach_rows). sources is the registry ({name: source});
+    fetches of sources no longer registered are skipped.
+    """
+    archive = archive or ReportArchive()
+    stats = {"checks": 0, "fetches": 0, "reports": 0, "parsed": 0, "parse_failures": 0,
+             "skipped_fetches": 0, "rows": 0}
+    began = time.perf_counter()
+
+    observations = archive.observations()
+    stats["fetches"] = len(observations)
+    distinct = []
+    seen = set()
+    for entry in observations:
+        key = (entry["sha256"], entry["source"])
+        if entry["source"] in sources and key not in seen:
+            seen.add(key)
+            distinct.append(key)
+    stats["reports"] = len(distinct)
+
+    # 1. Raw tables: reuse earlier parses, parse the rest of the reports in a process pool
+    tables = {}
+    to_parse = []
+    for sha256, name in distinct:
+        table = None if reparse else archive.load_table(sha256, name)
+        if table is None:
+            to_parse.append((archive.root, sha256, sources[name]))
+        else:
+            tables[(sha256, name)] = table
+
+    parse_start = time.perf_counter()
+    if to_parse:
+        workers = min(workers or os.cpu_count() or 1, len(to_parse))
+        if workers == 1:
+            results = map(_parse_archived, to_parse)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_parse_archived, to_parse, chunksize=max(1, len(to_parse) // (workers * 8)))
+        for sha256, name, table, _, error in results:
+            if error or not table:
+                print(f"Could not parse archived {name} report {sha256[:12]}: {error or 'no table found'}")
+                stats["parse_failures"] += 1
+                continue
+            tables[(sha256, name)] = table
+            archive.save_table(sha256, name, table)
+            stats["parsed"] += 1
+        if workers > 1:
+            pool.shutdown()
+    stats["parse_seconds"] = time.perf_counter() - parse_start
+
+    # 2. The current rules, applied once per distinct report
+    classify_start = time.perf_counter()
+    classified = {key: row_parser(table, sources[key[1]]["coordinates"]) for key, table in tables.items()}
+    stats["classify_seconds"] = time.perf_counter() - classify_start
+
+    # 3. Replay the checks and stream the rows out
+    replay_start = time.perf_counter()
+    source_order = list(sources)
+    state = {}
+    last_record = {}
+    last_logged = {}
+    temp_file = output_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8', newline='') as f:
+        f.write(HISTORY_HEADER)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        index = 0
+        while index < len(observations):
+            check_time = observations[index]["time"]
+            changed = False
+            while index < len(observations) and observations[index]["time"] == check_time:
+                entry = observations[index]
+                index += 1
+                beaches = classified.get((entry["sha256"], entry["source"]))
+                if not beaches:
+                    stats["skipped_fetches"] += 1
+                    continue
+                if state.get(entry["source"]) is not beaches:
+                    state[entry["source"]] = beaches
+                    changed = True
+            stats["checks"] += 1
+            if not changed and not daily_snapshots:
+                continue
+
+            day = check_time[:10]
+            for beach in _merge(source_order, state):
+                name = beach["beach_name"]
+                current = (beach["status"], beach["note"])
+                if last_record.get(name) != current:
+                    # A status or note change, as check_status logs it
+                    last_record[name] = current
+                elif not daily_snapshots or last_logged.get(name) == day:
+                    continue
+                last_logged[name] = day
+                writer.writerow([check_time, name, beach["status"], beach["date"], beach["note"]])
+                stats["rows"] += 1
+
+            if buffer.tell() >= WRITE_CHUNK_BYTES:
+                f.write(buffer.getvalue())
+                buffer.seek(0)
+                buffer.truncate()
+        f.write(buffer.getvalue())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, output_file)
+    stats["replay_seconds"] = time.perf_counter() - replay_start
+    stats["seconds"] = time.perf_counter() - began
+    return stats
+
+
+def archive_stats(archive=None):
+    """Counts and sizes of the archive."""
+    archive = archive or ReportArchive()
+    observations = archive.observations()
+    objects = stored_bytes = 0
+    for directory, _, files in os.walk(os.path.join(archive.root, "objects")):
+        for name in files:
+            objects += 1
+            stored_bytes += os.path.getsize(os.path.join(directory, name))
+    return {
+        "fetches": len(observations),
+        "downloads": sum(1 for entry in observations if entry.get("new")),
+        "downloaded_bytes": sum(entry.get("bytes", 0) for entry in observations),
+        "reports": objects,
+        "stored_bytes": stored_bytes,
+        "first": observations[0]["time"] if observations else None,
+        "last": observations[-1]["time"] if observations else None,
+    }
+
+
+def _print_reclassify_stats(stats, output_file):
+    print(f"✅ Rebuilt {output_file}: {stats['rows']} rows from {stats['checks']} checks "
+          f"({stats['fetches']} fetches, {stats['reports']} distinct reports) in {stats['seconds']:.1f}s")
+    print(f"   parse {stats['parse_seconds']:.1f}s ({stats['parsed']} parsed, "
+          f"{stats['reports'] - stats['parsed'] - stats['parse_failures']} reused, "
+          f"{stats['parse_failures']} failed), classify {stats['classify_seconds']:.2f}s, "
+          f"replay {stats['replay_seconds']:.2f}s")
+
+
+def _bench(seasons):
+    """Builds an archive of hourly checks over `seasons` 120-day seasons and rebuilds it twice."""
+    import random
+    import tempfile
+    from datetime import timedelta
+
+    from check_status import BEACH_COORDINATES, parse_beach_rows
+    from report_sources import REPORT_SOURCES
+    from synthetic_report import build_report_pdf, report_rows, SAMPLE_NOTES
+
+    rng = random.Random(1)
+    root = tempfile.mkdtemp(prefix="report_archive_bench_")
+    archive = ReportArchive(os.path.join(root, "archive"))
+    source = REPORT_SOURCES["burlington"]
+    beaches = [{"beach_name": name, "date": "Jun 01 2023 09:00AM", "note": "Open"} for name in BEACH_COORDINATES]
+
+    start = time.perf_counter()
+    last_sha = None
+    for season in range(seasons):
+        check_time = datetime(2023 + season, 6, 1, tzinfo=timezone.utc)
+        for hour in range(120 * 24):
+            if hour % 24 == 9:
+                # The state republishes once a day; a few beaches change
+                for beach in beaches:
+                    if rng.random() < 0.15:
+                        beach["note"] = rng.choice(SAMPLE_NOTES)
+                        beach["date"] = check_time.strftime('%b %d %Y %I:%M%p')
+                pdf_bytes = build_report_pdf(report_rows(beaches))
+                last_sha, _ = archive.put(pdf_bytes)
+                archive.record("burlington", last_sha, len(pdf_bytes), True, check_time.isoformat())
+            elif last_sha:
+                archive.record("burlington", last_sha, 0, False, check_time.isoformat())
+            check_time += timedelta(hours=1)
+    stats = archive_stats(archive)
+    print(f"Archived {stats['fetches']} hourly fetches of {stats['reports']} distinct reports "
+          f"({stats['downloaded_bytes'] / 1e6:.1f} MB downloaded, {stats['stored_bytes'] / 1e6:.1f} MB stored) "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    output_file = os.path.join(root, "historical_status.csv")
+    sources = {"burlington": source}
+    _print_reclassify_stats(reclassify(output_file, parse_beach_rows, sources, archive), output_file)
+    print("Again with the parsed tables cached (a rules-only change):")
+    _print_reclassify_stats(reclassify(output_file, parse_beach_rows, sources, archive), output_file)
+    print(f"Bench files are in {root}")
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report archive and history reclassification")
+    commands = parser.add_subparsers(dest="command")
+    commands.add_parser("stats", help="show what the archive holds")
+    reclassify_command = commands.add_parser("reclassify",
+                                             help="rebuild the history from the archive with the current rules")
+    reclassify_command.add_argument("output", help="CSV file to write (replaced if it exists)")
+    reclassify_command.add_argument("--workers", type=int, default=0, help="parse processes (default: every core)")
+    reclassify_command.add_argument("--reparse", action="store_true",
+                                    help="parse every report again instead of reusing cached tables")
+    reclassify_command.add_argument("--no-daily", action="store_true",
+                                    help="only write change rows, as with DAILY_LOGGING=false")
+    reclassify_command.add_argument("--intervals", action="store_true",
+                                    help="also write the interval-encoded history next to OUTPUT")
+    bench_command = commands.add_parser("bench", help="rebuild a synthetic archive of hourly checks")
+    bench_command.add_argument("seasons", nargs="?", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        stats = archive_stats()
+        if not stats["fetches"]:
+            print(f"No fetches recorded in {REPORT_ARCHIVE_DIR}")
+            sys.exit(0)
+        print(f"{stats['fetches']} fetches from {stats['first']} to {stats['last']}, {stats['downloads']} downloads")
+        print(f"{stats['reports']} distinct reports: {stats['downloaded_bytes'] / 1e6:.1f} MB downloaded, "
+              f"{stats['stored_bytes'] / 1e6:.1f} MB stored")
+    elif args.command == "reclassify":
+        from check_status import parse_beach_rows
+        from report_sources import REPORT_SOURCES
+
+        stats = reclassify(args.output, parse_beach_rows, REPORT_SOURCES, workers=args.workers,
+                           reparse=args.reparse, daily_snapshots=not args.no_daily)
+        _print_reclassify_stats(stats, args.output)
+        if args.intervals:
+            from history_intervals import intervals_path, build_from_csv
+            build_from_csv(args.output).save(intervals_path(args.output))
+            print(f"Wrote {intervals_path(args.output)}")
+    elif args.command == "bench":
+        _bench(args.seasons)
+    else:
+        parser.print_help()
+        sys.exit(1)
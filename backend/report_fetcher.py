@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Conditional fetching of the beach report.
+
+The validators (ETag, Last-Modified) and a SHA-256 of the report bytes are kept
+in report_cache.json together with the raw table rows parsed from that report,
+so a run where the state hasn't republished costs one 304 (or one hash compare)
+instead of a full PDF parse.
+"""
+
+import os
+import json
+import hashlib
+
+import http_transport
+
+REPORT_CACHE_FILE = 'report_cache.json'
+
+
+def load_report_cache(cache_file=REPORT_CACHE_FILE):
+    """Returns the cache as {url: entry}, or an empty dict if there isn't one yet."""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def save_report_cache(cache, cache_file=REPORT_CACHE_FILE):
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, ensure_ascii=False)
+    os.replace(temp_file, cache_file)
+
+
+def fetch_report(url, cache_entry=None, timeout=20):
+    """
+    Downloads a report, sending conditional headers from cache_entry.
+
+    Returns (content, validators). content is None when the server answered
+    304 Not Modified or the downloaded bytes hash the same as the cached report.
+    validators holds the etag, last_modified and content_hash to store for next time.
+    """
+    cache_entry = cache_entry or {}
+    headers = {}
+    if cache_entry.get('etag'):
+        headers['If-None-Match'] = cache_entry['etag']
+    if cache_entry.get('last_modified'):
+        headers['If-Modified-Since'] = cache_entry['last_modified']
+
+    response = http_transport.get("report", url, headers=headers, timeout=timeout)
+
+    validators = {
+        'etag': response.headers.get('ETag', cache_entry.get('etag')),
+        'last_modified': response.headers.get('Last-Modified', cache_entry.get('last_modified')),
+        'content_hash': cache_entry.get('content_hash')
+    }
+
+    if response.status_code == 304:
+        print("Report not modified since last fetch (304).")
+        return None, validators
+
+    response.raise_for_status()
+
+    content_hash = hashlib.sha256(response.content).hexdigest()
+    validators['content_hash'] = content_hash
+    if content_hash == cache_entry.get('content_hash'):
+        print("Report bytes unchanged since last fetch (same content hash).")
+        return None, validators
+
+    return response.content, validators
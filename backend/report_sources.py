@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Registry of swim-water reports to watch, fetched concurrently and parsed in a process pool.
+
+Each source has a URL, a parser and the coordinate map of the beaches it reports on:
+
+    register_source("burlington", PDF_URL, extract_report_table, BEACH_COORDINATES)
+
+A parser is a module-level function parser(pdf_bytes, source, save_template) that
+returns the raw table rows (header included); it runs in a worker process, so it
+has to be importable by name. Sources can also be listed in a JSON file
+(REPORT_SOURCES_FILE) as
+    [{"name": ..., "url": ..., "coordinates": {beach: {"lat", "lon"}},
+      "parser": "module:function", "page": 0, "timeout": 20}]
+where parser defaults to the Burlington report parser.
+
+fetch_sources() downloads every report at once (each request is conditional, see
+report_fetcher.py), hands the reports that changed to a process pool, and merges
+the parsed beaches in registry order. A source that fails or doesn't finish within
+its time budget falls back to the table cached from its last good parse, so one
+slow or broken report never holds up or blanks out the others. Only when every
+source fails is the result empty.
+"""
+
+import os
+import json
+import time
+import importlib
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+
+from datetime import datetime, timezone
+
+from report_fetcher import fetch_report, load_report_cache, save_report_cache, REPORT_CACHE_FILE
+from report_archive import archive_fetch, missing_from_archive, warn_if_archive_lost
+from metrics import record
+
+REPORT_SOURCES_FILE = os.environ.get("REPORT_SOURCES_FILE", "report_sources.json")
+REPORT_FETCH_CONCURRENCY = int(os.environ.get("REPORT_FETCH_CONCURRENCY", "8"))
+# Parse workers; 0 uses every core
+REPORT_PARSE_WORKERS = int(os.environ.get("REPORT_PARSE_WORKERS", "0"))
+# Seconds parsing may still take once the last download is done; workers still busy then are killed
+REPORT_PARSE_TIMEOUT = float(os.environ.get("REPORT_PARSE_TIMEOUT", "60"))
+
+REPORT_SOURCES = {}
+
+
+def register_source(name, url, parser, coordinates, page=0, timeout=20, template_file=None):
+    """Adds (or replaces) a report source. template_file is where its layout template is cached."""
+    REPORT_SOURCES[name] = {
+        "name": name,
+        "url": url,
+        "parser": parser,
+        "coordinates": coordinates,
+        "page": page,
+        "timeout": timeout,
+        "template_file": template_file or f"layout_template_{name}.json",
+    }
+    return REPORT_SOURCES[name]
+
+
+def _resolve_parser(spec):
+    module_name, _, function_name = spec.partition(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+
+def load_source_config(config_file=REPORT_SOURCES_FILE, default_parser=None):
+    """
+    Registers the sources listed in config_file, if it exists. Returns their names.
+    A config that can't be read or has a bad entry is reported and ignored as a whole,
+    so the sources registered in code are still watched.
+    """
+    try:
+        with open(config_file, 'r', encoding='utf-8') as f:
+            entries = json.load(f)
+        configured = [
+            (entry["name"], entry["url"],
+             _resolve_parser(entry["parser"]) if entry.get("parser") else default_parser,
+             entry.get("coordinates", {}), entry.get("page", 0), entry.get("timeout", 20),
+             entry.get("template_file"))
+            for entry in entries
+        ]
+    except FileNotFoundError:
+        return []
+    except (OSError, ValueError, KeyError, TypeError, ImportError, AttributeError) as e:
+        print(f"⚠️ Ignoring {config_file}: {type(e).__name__}: {e}")
+        return []
+
+    for name, url, parser, coordinates, page, timeout, template_file in configured:
+        register_source(name, url, parser, coordinates, page=page, timeout=timeout, template_file=template_file)
+    return [name for name, *_ in configured]
+
+
+def _fetch(source, cache_entry, archive=True):
+    """Runs in a fetch thread: (pdf_bytes or None, validators, fetch seconds)."""
+    start = time.perf_counter()
+    try:
+        pdf_bytes, validators = fetch_report(source["url"], cache_entry, timeout=source["timeout"])
+        # Download it in full when there is no cached table to reuse (e.g. the cache file was
+        # removed) or when the archive lost the report (e.g. its Actions cache wasn't restored)
+        if pdf_bytes is None and (not cache_entry.get('table')
+                                  or (archive and missing_from_archive(validators.get('content_hash')))):
+            pdf_bytes, validators = fetch_report(source["url"], None, timeout=source["timeout"])
+    except Exception:
+        record("fetch", time.perf_counter() - start, errors=1, source=source["name"])
+        raise
+    seconds = time.perf_counter() - start
+    record("fetch", seconds, size=len(pdf_bytes or b''), source=source["name"])
+    return pdf_bytes, validators, seconds
+
+
+def _parse(source, pdf_bytes, save_template):
+    """Runs in a parse worker: (table, parse seconds)."""
+    start = time.perf_counter()
+    table = source["parser"](pdf_bytes, source, save_template)
+    return table, time.perf_counter() - start
+
+
+def _parse_in_pool(pool, source, pdf_bytes, save_template):
+    """Submits a parse to the worker pool; the Future is resolved by the pool's result thread."""
+    future = Future()
+    pool.apply_async(_parse, (source, pdf_bytes, save_template),
+                     callback=future.set_result, error_callback=future.set_exception)
+    return future
+
+
+def _parse_inline(source, pdf_bytes, save_template):
+    """Parses in this process, wrapped in a finished Future like the pool's results."""
+    future = Future()
+    try:
+        future.set_result(_parse(source, pdf_bytes, save_template))
+    except Exception as e:
+        future.set_exception(e)
+    return future
+
+
+def fetch_sources(row_parser, sources=None, cache_file=REPORT_CACHE_FILE, force=False, dry_run=False):
+    """
+    Fetches and parses every source and returns (beaches, report_changed, cache_update).
+
+    row_parser(table, coordinates) turns a source's raw table into beach records.
+    report_changed is True when at least one report had to be parsed. Cache
+    semantics are those of check_status.fetch_beach_statuses: cache_file=None
+    (or dry_run) leaves the cache alone, force ignores the cached validators.
+
+    The cache is not written here. cache_update holds the new validators and
+    tables (None if nothing changed) and is saved with commit_report_cache() once
+    the caller has acted on the reports; a run that dies before then fetches and
+    parses them again instead of getting a 304 for a report it never published.
+    """
+    sources = list(REPORT_SOURCES.values()) if sources is None else sources
+    if dry_run:
+        cache_file = None
+    cache = load_report_cache(cache_file) if cache_file else {}
+    if not dry_run:
+        warn_if_archive_lost(cache)
+    cache_dirty = False
+    # Every fetch of this check is archived under the same time
+    fetched_at = datetime.now(timezone.utc).isoformat()
+    tables = {}
+    failed = set()
+    report_changed = False
+
+    # Downloads run one thread each, bounded by the per-source request timeout. A report is
+    # handed to the parse pool as soon as it arrives, so a slow download doesn't hold up the
+    # parsing of the others; with a single source it is parsed in this process instead.
+    to_parse = {}
+    parse_futures = {}
+    parse_pool = None
+    fetchers = ThreadPoolExecutor(max_workers=max(1, min(REPORT_FETCH_CONCURRENCY, len(sources))))
+    fetches = {
+        fetchers.submit(_fetch, source, {} if force else cache.get(source["url"], {}), not dry_run): source
+        for source in sources
+    }
+    for future in as_completed(fetches):
+        source = fetches[future]
+        name = source["name"]
+        cache_entry = cache.get(source["url"], {})
+        try:
+            pdf_bytes, validators, seconds = future.result()
+        except Exception as e:
+            print(f"Error fetching the {name} report: {e}")
+            failed.add(name)
+            tables[name] = cache_entry.get('table')
+            continue
+
+        if not dry_run:
+            archive_fetch(source, pdf_bytes, validators, fetched_at)
+        if pdf_bytes is None:
+            tables[name] = cache_entry.get('table')
+            if validators != {key: cache_entry.get(key) for key in validators}:
+                cache[source["url"]] = {**cache_entry, **validators}
+                cache_dirty = True
+            continue
+
+        print(f"Fetched the {name} report ({len(pdf_bytes)} bytes in {seconds:.1f}s)")
+        to_parse[name] = (source, len(pdf_bytes), validators)
+        if len(sources) == 1:
+            parse_futures[name] = _parse_inline(source, pdf_bytes, not dry_run)
+        else:
+            if parse_pool is None:
+                workers = min(REPORT_PARSE_WORKERS or os.cpu_count() or 1, len(sources))
+                # Spawned, not forked: the fetch threads are still running, and a forked
+                # child could inherit a lock one of them holds
+                parse_pool = multiprocessing.get_context("spawn").Pool(workers)
+            parse_futures[name] = _parse_in_pool(parse_pool, source, pdf_bytes, not dry_run)
+    fetchers.shutdown()
+
+    wait(parse_futures.values(), timeout=REPORT_PARSE_TIMEOUT)
+    parsed = {}
+    for name, future in parse_futures.items():
+        if not future.done():
+            print(f"Parsing the {name} report took longer than {REPORT_PARSE_TIMEOUT:.0f}s; using its last parse.")
+            record("parse", REPORT_PARSE_TIMEOUT, errors=1, source=name)
+            continue
+        try:
+            parsed[name], seconds = future.result()
+        except Exception as e:
+            print(f"Error parsing the {name} report: {e}")
+            record("parse", errors=1, source=name)
+            continue
+        record("parse", seconds, size=to_parse[name][1], rows=max(0, len(parsed[name] or []) - 1), source=name)
+    if parse_pool:
+        # Every result is in or given up on, so this only kills parses that overran their budget
+        parse_pool.terminate()
+        parse_pool.join()
+
+    source_beaches = {}
+    for name, (source, _, validators) in to_parse.items():
+        table = parsed.get(name)
+        beaches = row_parser(table, source["coordinates"]) if table else []
+        if beaches:
+            source_beaches[name] = beaches
+            tables[name] = table
+            report_changed = True
+            cache[source["url"]] = {**validators, 'table': table}
+            cache_dirty = True
+        else:
+            if name in parsed:
+                print(f"No beaches found in the {name} report.")
+            failed.add(name)
+            tables[name] = cache.get(source["url"], {}).get('table')
+
+    cache_update = {"file": cache_file, "cache": cache} if cache_file and cache_dirty else None
+
+    if failed and len(failed) == len(sources):
+        # Nothing usable this run; stale tables alone would hide the failure from the caller
+        return [], False, cache_update
+
+    # Merge in registry order; a beach listed by two sources keeps its first record
+    beaches = []
+    seen = set()
+    for source in sources:
+        if source["name"] in source_beaches:
+            parsed_beaches = source_beaches[source["name"]]
+        elif tables.get(source["name"]):
+            parsed_beaches = row_parser(tables[source["name"]], source["coordinates"])
+        else:
+            continue
+        for beach in parsed_beaches:
+            if beach["beach_name"] not in seen:
+                seen.add(beach["beach_name"])
+                beaches.append(beach)
+    return beaches, report_changed, cache_update
+
+
+def commit_report_cache(cache_update):
+    """Saves a cache_update returned by fetch_sources (None is a no-op)."""
+    if cache_update:
+        save_report_cache(cache_update["cache"], cache_update["file"])
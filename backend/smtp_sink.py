@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+A minimal local SMTP server that accepts and counts every message.
+
+It stands in for the real mail provider when testing or benchmarking email
+delivery: no TLS, any AUTH PLAIN/LOGIN credentials are accepted (or, with
+reject_logins, every login is refused with 535), and messages are discarded
+after counting.
+
+Usage:
+    python smtp_sink.py [port]
+"""
+
+import threading
+import socketserver
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(line.encode('ascii') + b"\r\n")
+
+    def handle(self):
+        self._reply("220 smtp-sink ready")
+        recipients = 0
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', errors='replace').strip().upper()
+
+            if command.startswith("EHLO"):
+                self.wfile.write(b"250-smtp-sink\r\n250-PIPELINING\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME\r\n")
+            elif command.startswith("HELO"):
+                self._reply("250 smtp-sink")
+            elif command.startswith("AUTH"):
+                # Read (and ignore) whatever credentials the client still has to send
+                mechanism = command.split()
+                prompts = 2 if mechanism[1:2] == ["LOGIN"] else (1 if len(mechanism) == 2 else 0)
+                for _ in range(prompts):
+                    self._reply("334 ")
+                    self.rfile.readline()
+                if self.server.login():
+                    self._reply("235 Authentication successful")
+                else:
+                    self._reply("535 5.7.8 Username and Password not accepted")
+            elif command.startswith("MAIL FROM"):
+                recipients = 0
+                self._reply("250 OK")
+            elif command.startswith("RCPT TO"):
+                recipients += 1
+                self._reply("250 OK")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                self.server.record(recipients)
+                self._reply("250 OK: queued")
+            elif command in ("RSET", "NOOP"):
+                self._reply("250 OK")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("502 Command not implemented")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Threaded sink server; messages, recipients and logins hold running totals."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host='127.0.0.1', port=0, reject_logins=False):
+        super().__init__((host, port), _SinkHandler)
+        self.messages = 0
+        self.recipients = 0
+        self.logins = 0
+        self.reject_logins = reject_logins
+        self._lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def login(self):
+        """Counts a login attempt; False if it is refused."""
+        with self._lock:
+            self.logins += 1
+        return not self.reject_logins
+
+    def record(self, recipients):
+        with self._lock:
+            self.messages += 1
+            self.recipients += recipients
+
+    def start(self):
+        """Serves in a background thread and returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    sink = SMTPSink(port=int(sys.argv[1]) if len(sys.argv) > 1 else 8025).start()
+    print(f"SMTP sink listening on 127.0.0.1:{sink.port} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(5)
+            print(f"{sink.messages} messages received")
+    except KeyboardInterrupt:
+        sink.shutdown()
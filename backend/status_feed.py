@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Publishes status.json together with a change feed and a small meta file.
+
+- status.json is only rewritten when the hash of its content changes, so runs
+  where the report was republished without any real change leave git alone.
+- status_changes.jsonl gets one compact line per publish:
+      {"seq": 42, "time": ..., "hash": ..., "changes": [beach records that differ]}
+  where a removed beach appears as {"beach_name": ..., "removed": true}.
+- status.meta.json holds the current sequence number and hash, plus the oldest
+  sequence still in the feed (older entries are compacted away).
+
+A client remembers the last seq it applied, reads the meta file, and then either
+does nothing (same seq), applies the feed entries after its seq, or reloads
+status.json when its seq is older than first_seq.
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUBLIC_DATA_DIR = os.environ.get("PUBLIC_DATA_DIR", PROJECT_ROOT)
+STATUS_META_FILE = os.path.join(PUBLIC_DATA_DIR, "status.meta.json")
+CHANGE_FEED_FILE = os.path.join(PUBLIC_DATA_DIR, "status_changes.jsonl")
+
+# The feed is trimmed back to FEED_KEEP_ENTRIES once it holds twice that many
+FEED_KEEP_ENTRIES = 500
+
+
+def status_hash(beaches):
+    """A short SHA-256 over the canonical JSON of the beach list."""
+    canonical = json.dumps(beaches, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()[:16]
+
+
+def load_status_meta(meta_file=STATUS_META_FILE):
+    try:
+        with open(meta_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {"seq": 0, "hash": None, "first_seq": 1}
+
+
+def _write_json(path, data, indent=None):
+    temp_file = path + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(temp_file, path)
+
+
+def _read_feed(feed_file):
+    entries = []
+    try:
+        with open(feed_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        # A torn last line from an interrupted append
+                        continue
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _last_feed_seq(feed_file, block_size=64 * 1024):
+    """Sequence number of the last complete line in the feed (0 if there isn't one)."""
+    try:
+        with open(feed_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(0, f.tell() - block_size))
+            lines = f.read().splitlines()
+    except FileNotFoundError:
+        return 0
+    for line in reversed(lines):
+        try:
+            return json.loads(line)["seq"]
+        except (ValueError, KeyError, TypeError):
+            continue
+    return 0
+
+
+def diff_beaches(previous_states, beaches):
+    """Beach records that are new or differ from previous_states ({name: record}), plus removals."""
+    changes = [beach for beach in beaches if previous_states.get(beach['beach_name']) != beach]
+    current_names = {beach['beach_name'] for beach in beaches}
+    changes += [{"beach_name": name, "removed": True} for name in previous_states if name not in current_names]
+    return changes
+
+
+def publish_status(beaches, previous_states, status_file, meta_file=STATUS_META_FILE,
+                   feed_file=CHANGE_FEED_FILE):
+    """
+    Writes status.json, a feed entry and the meta file if the content changed.
+    Returns the new sequence number, or None when nothing had to be written.
+    """
+    new_hash = status_hash(beaches)
+    meta = load_status_meta(meta_file)
+    if meta.get("hash") == new_hash and os.path.exists(status_file):
+        return None
+
+    # The feed is appended before the meta file is replaced, so after an interrupted
+    # publish the feed may be one entry ahead of the meta file; never reuse that seq
+    seq = max(meta.get("seq", 0), _last_feed_seq(feed_file)) + 1
+    now = datetime.now(timezone.utc).isoformat()
+    entry = {"seq": seq, "time": now, "hash": new_hash, "changes": diff_beaches(previous_states, beaches)}
+
+    with open(feed_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, separators=(',', ':'), ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+    first_seq = meta.get("first_seq", 1)
+    if seq - first_seq + 1 > 2 * FEED_KEEP_ENTRIES:
+        kept = [e for e in _read_feed(feed_file) if e["seq"] > seq - FEED_KEEP_ENTRIES]
+        temp_file = feed_file + '.tmp'
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            for e in kept:
+                f.write(json.dumps(e, separators=(',', ':'), ensure_ascii=False) + "\n")
+        os.replace(temp_file, feed_file)
+        first_seq = kept[0]["seq"]
+
+    _write_json(status_file, beaches, indent=2)
+    _write_json(meta_file, {
+        "seq": seq,
+        "hash": new_hash,
+        "first_seq": first_seq,
+        "updated_at": now,
+        "beaches": len(beaches)
+    }, indent=2)
+    return seq
+
+
+def read_changes_since(cursor, meta_file=STATUS_META_FILE, feed_file=CHANGE_FEED_FILE):
+    """
+    Feed entries after cursor (a seq the caller has already applied).
+    Returns None when the cursor predates the feed and status.json has to be reloaded.
+    """
+    meta = load_status_meta(meta_file)
+    if cursor >= meta["seq"]:
+        return []
+    if cursor + 1 < meta.get("first_seq", 1):
+        return None
+    return [entry for entry in _read_feed(feed_file) if cursor < entry["seq"] <= meta["seq"]]
+
+
+def apply_changes(beaches, entries):
+    """Applies feed entries to a beach list, keeping the order of existing beaches."""
+    by_name = {beach['beach_name']: beach for beach in beaches}
+    for entry in entries:
+        for change in entry["changes"]:
+            if change.get("removed"):
+                by_name.pop(change['beach_name'], None)
+            else:
+                by_name[change['beach_name']] = change
+    return list(by_name.values())
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("meta", "since"):
+        print("Usage: python status_feed.py meta | since SEQ")
+        sys.exit(1)
+    if sys.argv[1] == "meta":
+        print(json.dumps(load_status_meta(), indent=2))
+    else:
+        changes = read_changes_since(int(sys.argv[2]))
+        if changes is None:
+            print("Cursor is older than the feed; reload status.json.")
+        else:
+            for entry in changes:
+                print(json.dumps(entry, ensure_ascii=False))
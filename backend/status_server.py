@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Small asyncio HTTP server for the current statuses and the history.
+
+The frontends read status.json and the history from raw.githubusercontent with
+cache-busting query strings, so no cache between them and GitHub ever helps.
+This server keeps the data in memory and answers from there:
+
+    GET /status                         the status.json beach list
+    GET /status/{beach}                 one beach record
+    GET /history?beach=&from=&to=       history rows as JSON (all optional; from/to are
+                                        dates or timestamps, to is inclusive)
+    GET /history/at?time=&beach=        every beach's (or one beach's) status at a moment
+    GET /history/during?status=&from=&to=
+                                        beaches that had a status at some point in a window
+                                        (see history_timeline.py; naive times are local)
+    GET /nearest?lat=&lon=&k=&radius=&status=
+                                        closest beaches (see geo_index.py); status is a
+                                        comma-separated list, "any", or open (green) by default
+
+Every response carries a strong ETag and "Cache-Control: no-cache", so browsers
+revalidate with If-None-Match and get a bodiless 304 while nothing changed.
+Bodies are serialized and gzip-compressed once per data version, not per request.
+
+The files the checker writes are polled every STATUS_SERVER_POLL seconds (one
+stat each). status.json is reloaded when it changes; history rows appended to
+the CSV are read from the previous end of the file, so a check costs the server
+only the new rows.
+
+The point-in-time index behind /history/at and /history/during is opened in a
+worker thread at startup (and again if the CSV is rewritten), since building it
+reads the whole CSV; those two endpoints answer 503 until it is ready. The
+first load of status.json and the history rows runs in a worker thread too,
+once the server is already listening; every endpoint answers 503 until then.
+
+Usage:
+    python status_server.py serve [--host 127.0.0.1] [--port 8080]
+    python status_server.py bench [--requests 20000] [--connections 50]
+"""
+
+import os
+import io
+import csv
+import gzip
+import json
+import math
+import time
+import bisect
+import asyncio
+import hashlib
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs, unquote
+
+from history_writer import HISTORY_FILE, HISTORY_FIELDNAMES
+from geo_index import GeoIndex, OPEN_STATUSES
+from history_timeline import TimelineIndex, to_micros
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PUBLIC_DATA_DIR = os.environ.get("PUBLIC_DATA_DIR", PROJECT_ROOT)
+STATUS_FILE = os.path.join(PUBLIC_DATA_DIR, "status.json")
+
+STATUS_SERVER_HOST = os.environ.get("STATUS_SERVER_HOST", "127.0.0.1")
+STATUS_SERVER_PORT = int(os.environ.get("STATUS_SERVER_PORT", "8080"))
+STATUS_SERVER_POLL = float(os.environ.get("STATUS_SERVER_POLL", "1"))
+# Origins allowed to read the API from a browser
+STATUS_SERVER_CORS_ORIGIN = os.environ.get("STATUS_SERVER_CORS_ORIGIN", "*")
+# Distinct /history queries kept serialized per data version
+HISTORY_QUERY_CACHE_SIZE = 256
+# Bodies smaller than this aren't worth compressing
+GZIP_MIN_BYTES = 256
+
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           411: "Length Required", 503: "Service Unavailable"}
+
+
+class Resource:
+    """A response body serialized once, with its ETag and gzip variant."""
+
+    def __init__(self, payload, status=200):
+        self.status = status
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.etag = '"' + hashlib.sha256(self.body).hexdigest()[:20] + '"'
+        self.gzip_body = gzip.compress(self.body, 6, mtime=0) if len(self.body) >= GZIP_MIN_BYTES else None
+        self.gzip_etag = self.etag[:-1] + '-gz"'
+        self._heads = {}
+
+    def head(self, gzipped, not_modified=False):
+        """The status line and headers for one variant, built on first use."""
+        key = (gzipped, not_modified)
+        if key not in self._heads:
+            status = 304 if not_modified else self.status
+            lines = [
+                f"HTTP/1.1 {status} {REASONS[status]}",
+                f"ETag: {self.gzip_etag if gzipped else self.etag}",
+                "Cache-Control: no-cache",
+                "Vary: Accept-Encoding",
+                f"Access-Control-Allow-Origin: {STATUS_SERVER_CORS_ORIGIN}",
+                "Access-Control-Expose-Headers: ETag",
+            ]
+            if not not_modified:
+                lines.append("Content-Type: application/json; charset=utf-8")
+                if gzipped:
+                    lines.append("Content-Encoding: gzip")
+                lines.append(f"Content-Length: {len(self.gzip_body if gzipped else self.body)}")
+            else:
+                lines.append("Content-Length: 0")
+            self._heads[key] = ("\r\n".join(lines) + "\r\n").encode('ascii')
+        return self._heads[key]
+
+
+def _error(status, message):
+    return Resource({"error": message}, status=status)
+
+
+class StatusStore:
+    """The in-memory copy of status.json and the history CSV, refreshed from disk."""
+
+    def __init__(self, status_file=STATUS_FILE, history_file=HISTORY_FILE):
+        self.status_file = status_file
+        self.history_file = history_file
+        self.status = _error(404, "status.json not found")
+        self.beaches = {}
+        self.geo = GeoIndex([])
+        self._status_stamp = None
+        # All rows in timestamp order, plus the same per beach; *_keys hold the timestamps for bisect
+        self.rows, self.row_keys = [], []
+        self.beach_rows, self.beach_keys = {}, {}
+        self._history_stamp = None
+        self._history_offset = 0
+        self._history_queries = OrderedDict()
+        # False until the first refresh has read the whole CSV (see StatusServer.serve)
+        self.loaded = False
+        self._timeline = None
+
+    # --- loading ---
+
+    def refresh(self):
+        """Reloads whatever changed on disk. Returns True if anything did."""
+        return self._refresh_status() | self._refresh_history()
+
+    def _refresh_status(self):
+        try:
+            stat = os.stat(self.status_file)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._status_stamp:
+            return False
+        try:
+            with open(self.status_file, 'r', encoding='utf-8') as f:
+                beaches = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            # Caught between writes; the next poll tries again
+            print(f"Could not read {self.status_file}: {e}")
+            return False
+        self._status_stamp = stamp
+        self.status = Resource(beaches)
+        self.beaches = {beach['beach_name']: Resource(beach) for beach in beaches}
+        self.geo = GeoIndex(beaches)
+        print(f"Loaded {len(beaches)} beaches from {self.status_file}")
+        return True
+
+    def _refresh_history(self):
+        try:
+            stat = os.stat(self.history_file)
+        except FileNotFoundError:
+            return False
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        if stamp == self._history_stamp:
+            return False
+
+        if stat.st_size < self._history_offset:
+            # Truncated or replaced rather than appended to: start over
+            self.rows, self.row_keys = [], []
+            self.beach_rows, self.beach_keys = {}, {}
+            self._history_offset = 0
+            self._drop_timeline()
+
+        with open(self.history_file, 'rb') as f:
+            f.seek(self._history_offset)
+            data = f.read(stat.st_size - self._history_offset)
+        # Rows end in \r\n; anything after the last one is a write still in progress
+        end = data.rfind(b'\r\n') + 2 if b'\r\n' in data else 0
+        if end == 0:
+            return False
+        text = data[:end].decode('utf-8', errors='replace')
+        reader = csv.DictReader(io.StringIO(text), fieldnames=HISTORY_FIELDNAMES)
+        added = 0
+        for row in reader:
+            if row['record_timestamp_utc'] == 'record_timestamp_utc' or not row['beach_name']:
+                continue
+            self._add_row(row)
+            added += 1
+
+        self._history_offset += end
+        self._history_stamp = stamp if self._history_offset == stat.st_size else None
+        self._history_queries.clear()
+        if self._timeline is not None and self._timeline.catch_up() is None:
+            # Rewritten rather than appended to; the server opens it again in a worker thread
+            self._drop_timeline()
+        print(f"Loaded {added} history rows ({len(self.rows)} in memory)")
+        return True
+
+    def _add_row(self, row):
+        key = row['record_timestamp_utc']
+        keys = self.beach_keys.setdefault(row['beach_name'], [])
+        rows = self.beach_rows.setdefault(row['beach_name'], [])
+        for index_keys, index_rows in ((self.row_keys, self.rows), (keys, rows)):
+            if not index_keys or index_keys[-1] <= key:
+                index_keys.append(key)
+                index_rows.append(row)
+            else:
+                # Out of order (e.g. a backfill of past days)
+                position = bisect.bisect_right(index_keys, key)
+                index_keys.insert(position, key)
+                index_rows.insert(position, row)
+
+    # --- queries ---
+
+    def history(self, beach=None, start=None, end=None):
+        cache_key = (beach, start, end)
+        resource = self._history_queries.get(cache_key)
+        if resource is not None:
+            self._history_queries.move_to_end(cache_key)
+            return resource
+
+        if beach is None:
+            keys, rows = self.row_keys, self.rows
+        else:
+            keys, rows = self.beach_keys.get(beach, []), self.beach_rows.get(beach, [])
+        low = bisect.bisect_left(keys, start) if start else 0
+        # A bare date includes the whole day
+        high = bisect.bisect_right(keys, end + '\uffff' if len(end) == 10 else end) if end else len(keys)
+        resource = Resource(rows[low:high])
+
+        self._history_queries[cache_key] = resource
+        if len(self._history_queries) > HISTORY_QUERY_CACHE_SIZE:
+            self._history_queries.popitem(last=False)
+        return resource
+
+    def timeline(self):
+        """The point-in-time index, or None until the server has opened it (see StatusServer._open_timeline)."""
+        return self._timeline
+
+    def use_timeline(self, index):
+        """
+        Takes an index opened off the event loop and catches it up on rows appended
+        meanwhile; caught up on every history refresh after that. False if it is already stale.
+        """
+        if index.catch_up() is None:
+            index.close()
+            return False
+        self._drop_timeline()
+        self._timeline = index
+        return True
+
+    def _drop_timeline(self):
+        if self._timeline is not None:
+            self._timeline.close()
+            self._timeline = None
+
+    def status_at(self, query):
+        try:
+            moment = query['time'][0]
+            to_micros(moment)
+        except (KeyError, ValueError):
+            return _error(400, "time is required as an ISO date or timestamp")
+        timeline = self.timeline()
+        if timeline is None:
+            return _error(503, "the history index is still loading; try again shortly")
+        beach = query.get('beach', [None])[0]
+        if beach is None:
+            return Resource(timeline.statuses_at(moment))
+        return Resource(timeline.status_at(beach, moment)) if beach in timeline.beaches \
+            else _error(404, f"unknown beach {beach!r}")
+
+    def beaches_in_status(self, query):
+        try:
+            status, start, end = query['status'][0], query['from'][0], query['to'][0]
+            to_micros(start), to_micros(end)
+        except (KeyError, ValueError):
+            return _error(400, "status, from and to are required; from and to as ISO dates or timestamps")
+        timeline = self.timeline()
+        if timeline is None:
+            return _error(503, "the history index is still loading; try again shortly")
+        return Resource(timeline.beaches_in_status(status, start, end))
+
+    def nearest(self, query):
+        try:
+            lat, lon = float(query['lat'][0]), float(query['lon'][0])
+            k = int(query.get('k', ['1'])[0])
+            radius = float(query['radius'][0]) if 'radius' in query else None
+        except (KeyError, ValueError):
+            return _error(400, "lat and lon are required; k and radius must be numbers")
+        if not (math.isfinite(lat) and -90 <= lat <= 90 and math.isfinite(lon) and -180 <= lon <= 180):
+            return _error(400, "lat must be within [-90, 90] and lon within [-180, 180]")
+        if k < 1:
+            return _error(400, "k must be at least 1")
+        if radius is not None and not (math.isfinite(radius) and radius >= 0):
+            return _error(400, "radius must be a non-negative number of km")
+        status = query.get('status', [None])[0]
+        statuses = None if status == 'any' else (status.split(',') if status else OPEN_STATUSES)
+
+        if radius is None:
+            results = self.geo.nearest(lat, lon, k, statuses)
+        else:
+            # Everything in the radius, unless k is given as well
+            results = self.geo.within(lat, lon, radius, statuses)
+            if 'k' in query:
+                results = results[:k]
+        return Resource([{"distance_km": round(km, 3), **beach} for km, beach in results])
+
+    def route(self, target):
+        """The Resource for a request target."""
+        parts = urlsplit(target)
+        path = parts.path.rstrip('/') or '/'
+        if not self.loaded:
+            return _error(503, "the data is still loading; try again shortly")
+        if path == '/status':
+            return self.status
+        if path.startswith('/status/'):
+            beach = unquote(path[len('/status/'):])
+            return self.beaches.get(beach) or _error(404, f"unknown beach {beach!r}")
+        if path == '/history':
+            query = parse_qs(parts.query)
+            return self.history(query.get('beach', [None])[0], query.get('from', [None])[0],
+                                query.get('to', [None])[0])
+        if path == '/history/at':
+            return self.status_at(parse_qs(parts.query))
+        if path == '/history/during':
+            return self.beaches_in_status(parse_qs(parts.query))
+        if path == '/nearest':
+            return self.nearest(parse_qs(parts.query))
+        return _error(404, "try /status, /status/{beach}, /history?beach=&from=&to= or /nearest?lat=&lon=")
+
+
+def _etag_matches(header, etag):
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    return etag in (candidate.strip() for candidate in header.split(','))
+
+
+class StatusServer:
+    def __init__(self, store, host=STATUS_SERVER_HOST, port=STATUS_SERVER_PORT, poll=STATUS_SERVER_POLL):
+        self.store = store
+        self.host = host
+        self.port = port
+        self.poll = poll
+        self.requests = 0
+        self._timeline_task = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    resource = _error(400, "malformed request line")
+                    writer.write(resource.head(False) + b'\r\n' + resource.body)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                # A body is skipped, not read, so its length has to be known up front
+                length = headers.get('content-length', '0')
+                if 'transfer-encoding' in headers or not (length.isascii() and length.isdigit()):
+                    if 'transfer-encoding' in headers:
+                        resource = _error(411, "request bodies need a Content-Length")
+                    else:
+                        resource = _error(400, "invalid Content-Length")
+                    writer.write(resource.head(False) + b'\r\n' + resource.body)
+                    break
+                if int(length):
+                    await reader.readexactly(int(length))
+
+                self.requests += 1
+                if method not in ('GET', 'HEAD'):
+                    resource = _error(405, "only GET and HEAD are supported")
+                else:
+                    resource = self.store.route(target)
+
+                gzipped = resource.gzip_body is not None and 'gzip' in headers.get('accept-encoding', '')
+                etag = resource.gzip_etag if gzipped else resource.etag
+                if resource.status == 200 and _etag_matches(headers.get('if-none-match'), etag):
+                    writer.write(resource.head(gzipped, not_modified=True) + b'\r\n')
+                elif method == 'HEAD':
+                    writer.write(resource.head(gzipped) + b'\r\n')
+                else:
+                    writer.write(resource.head(gzipped) + b'\r\n' + (resource.gzip_body if gzipped else resource.body))
+
+                connection = headers.get('connection', '').lower()
+                if connection == 'close' or (version == 'HTTP/1.0' and connection != 'keep-alive'):
+                    break
+                await writer.drain()
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _open_timeline(self):
+        """
+        Opens the point-in-time index in a worker thread: building it reads the whole CSV,
+        which would stall every request on the event loop. A built or caught-up index is
+        saved, so the next start only maps it.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                index = await loop.run_in_executor(None, TimelineIndex.open, self.store.history_file)
+            except Exception as e:
+                print(f"Failed to open the history timeline index: {e}")
+                return
+            if self.store.use_timeline(index):
+                print(f"History timeline index ready ({len(index.beaches)} beaches)")
+                return
+
+    def _ensure_timeline(self):
+        if self.store.timeline() is None and (self._timeline_task is None or self._timeline_task.done()):
+            self._timeline_task = asyncio.create_task(self._open_timeline())
+
+    async def _watch(self):
+        while True:
+            await asyncio.sleep(self.poll)
+            try:
+                self.store.refresh()
+            except Exception as e:
+                print(f"Failed to refresh the status data: {e}")
+            self._ensure_timeline()
+
+    async def serve(self, ready=None):
+        """Serves until cancelled; ready (a threading.Event) is set once the data is loaded."""
+        server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = server.sockets[0].getsockname()[1]
+        print(f"🌐 Serving beach status on http://{self.host}:{self.port}/status")
+        watcher = None
+        try:
+            async with server:
+                # The first load reads the whole history CSV; requests are answered meanwhile.
+                # Polling and the timeline index wait for it, as both touch the same rows.
+                await asyncio.get_running_loop().run_in_executor(None, self.store.refresh)
+                self.store.loaded = True
+                watcher = asyncio.create_task(self._watch())
+                self._ensure_timeline()
+                if ready:
+                    ready.set()
+                await server.serve_forever()
+        finally:
+            if watcher:
+                watcher.cancel()
+
+
+async def _bench(url_paths, requests, connections, host, port):
+    """Keep-alive GETs spread over `connections` connections; returns requests per second."""
+    per_connection = requests // connections
+
+    async def client(index):
+        reader, writer = await asyncio.open_connection(host, port)
+        etag = {}
+        for n in range(per_connection):
+            path = url_paths[(index + n) % len(url_paths)]
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\nAccept-Encoding: gzip\r\n"
+            if path in etag and n % 2:
+                request += f"If-None-Match: {etag[path]}\r\n"
+            writer.write((request + "\r\n").encode('latin-1'))
+            head = await reader.readuntil(b'\r\n\r\n')
+            length = 0
+            for line in head.split(b'\r\n'):
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':')[1])
+                elif line.lower().startswith(b'etag:'):
+                    etag[path] = line.split(b':', 1)[1].strip().decode()
+            await reader.readexactly(length)
+        writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(connections)))
+    return per_connection * connections / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    import sys
+    import argparse
+    import threading
+
+    parser = argparse.ArgumentParser(description="Serve the beach status and history over HTTP")
+    commands = parser.add_subparsers(dest="command")
+    serve_command = commands.add_parser("serve", help="run the server")
+    serve_command.add_argument("--host", default=STATUS_SERVER_HOST)
+    serve_command.add_argument("--port", type=int, default=STATUS_SERVER_PORT)
+    bench_command = commands.add_parser("bench", help="measure requests per second against an in-process server")
+    bench_command.add_argument("--requests", type=int, default=20000)
+    bench_command.add_argument("--connections", type=int, default=50)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            asyncio.run(StatusServer(StatusStore(), args.host, args.port).serve())
+        except KeyboardInterrupt:
+            pass
+    elif args.command == "bench":
+        # The server runs in its own thread and event loop so the clients don't share its CPU time slices
+        server = StatusServer(StatusStore(), "127.0.0.1", 0)
+        ready = threading.Event()
+        threading.Thread(target=lambda: asyncio.run(server.serve(ready)), daemon=True).start()
+        ready.wait()
+        paths = ["/status", "/status/Leddy%20Beach%20South", "/history?beach=Leddy%20Beach%20South",
+                 "/history?from=2025-08-01&to=2025-08-31"]
+        rate = asyncio.run(_bench(paths, args.requests, args.connections, "127.0.0.1", server.port))
+        print(f"{rate:,.0f} requests/s over {args.connections} keep-alive connections "
+              f"(half of them conditional), {server.requests} served")
+    else:
+        parser.print_help()
+        sys.exit(1)
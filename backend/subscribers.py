@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Paged, cached download of the subscriber list from the Cloudflare Worker.
+
+/get-subscribers returns up to 1000 subscribers ({email, beaches}) per page plus
+a cursor for the next page, and an ETag holding the list version (the time of
+the last subscription). The last full list is kept in subscriber_cache.json:
+
+- If the Worker answers the cached version with 304, nothing is downloaded.
+- Otherwise only subscribers added or updated since the cached version are
+  paged in and merged into the cache, and those unsubscribed since then (the
+  Worker's tombstones) are removed from it.
+- Every SUBSCRIBER_FULL_SYNC_DAYS the whole list is downloaded again, which also
+  drops anyone whose KV key was deleted by hand instead of through /unsubscribe.
+
+Usage:
+    python subscribers.py sync [--full]
+"""
+
+import os
+import json
+import time
+
+import http_transport
+
+SUBSCRIBER_CACHE_FILE = 'subscriber_cache.json'
+SUBSCRIBERS_PAGE_SIZE = 1000
+# Bumped when the cache layout changes; an older cache is replaced by a full sync
+SUBSCRIBER_CACHE_FORMAT = 3
+# Must stay well below the Worker's tombstone lifetime (90 days)
+SUBSCRIBER_FULL_SYNC_DAYS = 7
+# Beach followed by subscribers who signed up before per-beach subscriptions
+DEFAULT_SUBSCRIBED_BEACH = "Leddy Beach South"
+# KV listings are eventually consistent, so incremental syncs re-read a window
+# before the cached version; re-reading an address is harmless.
+SYNC_OVERLAP_MS = 10 * 60 * 1000
+
+
+def load_subscriber_cache(cache_file=SUBSCRIBER_CACHE_FILE):
+    """Returns {"format", "version", "full_synced_at", "subscriptions": {email: [beach, ...]}} or None."""
+    try:
+        with open(cache_file, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+    return cache if cache.get("format") == SUBSCRIBER_CACHE_FORMAT else None
+
+
+def save_subscriber_cache(cache, cache_file=SUBSCRIBER_CACHE_FILE):
+    temp_file = cache_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(temp_file, cache_file)
+
+
+def iter_subscriber_pages(worker_url, api_token, since=None, etag=None,
+                          page_size=SUBSCRIBERS_PAGE_SIZE, timeout=None):
+    """
+    Yields (subscribers, deleted, version) for each page as it arrives, where
+    subscribers is a list of {"email": ..., "beaches": [...]} and deleted lists
+    the emails unsubscribed after since (first page only). deleted is None when
+    the Worker couldn't list every removal, so only a full sync is accurate.
+    Yields nothing if etag matches the Worker's current version (304 Not Modified).
+    Raises requests.exceptions.HTTPError for error responses.
+    """
+    url = f"{worker_url}/get-subscribers"
+    params = {"limit": page_size}
+    if since:
+        params["since"] = since
+    headers = {"X-API-Token": api_token}
+    if etag:
+        headers["If-None-Match"] = etag
+
+    while True:
+        response = http_transport.get("subscribers", url, params=params, headers=headers, timeout=timeout)
+        if response.status_code == 304:
+            return
+        response.raise_for_status()
+        data = response.json()
+        deleted = data.get("deleted", []) if data.get("deleted_complete", True) else None
+        yield data.get("subscribers", []), deleted, data.get("version", 0)
+
+        if not data.get("cursor"):
+            return
+        params["cursor"] = data["cursor"]
+        # The version may change mid-listing; later pages must not be answered with a 304
+        headers.pop("If-None-Match", None)
+
+
+def _subscription(entry):
+    """Normalizes one subscriber from the Worker; plain strings come from Workers without per-beach subscriptions."""
+    if isinstance(entry, str):
+        return entry, [DEFAULT_SUBSCRIBED_BEACH]
+    return entry["email"], entry.get("beaches") or [DEFAULT_SUBSCRIBED_BEACH]
+
+
+def sync_subscribers(worker_url, api_token, cache_file=SUBSCRIBER_CACHE_FILE, full=False):
+    """
+    Brings the cached subscriber list up to date and returns {email: [beach, ...]}.
+    full ignores the cache and downloads every page; so does a cache whose last
+    full sync is more than SUBSCRIBER_FULL_SYNC_DAYS old.
+    """
+    cache = None if full else load_subscriber_cache(cache_file)
+    now_ms = int(time.time() * 1000)
+    if cache and now_ms - cache["full_synced_at"] > SUBSCRIBER_FULL_SYNC_DAYS * 24 * 60 * 60 * 1000:
+        print(f"Subscriber cache was last fully synced over {SUBSCRIBER_FULL_SYNC_DAYS} days ago; downloading the whole list.")
+        cache = None
+
+    if cache:
+        etag = f'"{cache["version"]}"'
+        since = max(0, cache["version"] - SYNC_OVERLAP_MS)
+        subscriptions = dict(cache["subscriptions"])
+        full_synced_at = cache["full_synced_at"]
+    else:
+        etag = since = None
+        subscriptions = {}
+        full_synced_at = now_ms
+
+    version = None
+    pages = removed = 0
+    for page, deleted, page_version in iter_subscriber_pages(worker_url, api_token, since=since, etag=etag):
+        if deleted is None:
+            print("Too many unsubscribes to sync incrementally; downloading the whole list.")
+            return sync_subscribers(worker_url, api_token, cache_file, full=True)
+        pages += 1
+        # The first page's version is the one the whole listing is consistent with
+        version = page_version if version is None else version
+        # Removals come with the first page; anyone who subscribed again is listed after them
+        for email in deleted:
+            removed += subscriptions.pop(email, None) is not None
+        subscriptions.update(_subscription(entry) for entry in page)
+
+    if version is None:
+        print(f"Subscriber list unchanged (version {cache['version']}); using {len(subscriptions)} cached subscribers.")
+        return subscriptions
+
+    added = len(subscriptions) + removed - (len(cache["subscriptions"]) if cache else 0)
+    print(f"Fetched {pages} page(s) of subscribers: {added} new, {removed} removed, {len(subscriptions)} total.")
+    save_subscriber_cache({"format": SUBSCRIBER_CACHE_FORMAT, "version": version, "full_synced_at": full_synced_at,
+                           "subscriptions": subscriptions}, cache_file)
+    return subscriptions
+
+
+def build_beach_index(subscriptions):
+    """Inverts {email: [beach, ...]} into {beach: [email, ...]}."""
+    index = {}
+    for email, beaches in subscriptions.items():
+        for beach in beaches:
+            index.setdefault(beach, []).append(email)
+    return index
+
+
+if __name__ == "__main__":
+    import sys
+    from check_status import CLOUDFLARE_WORKER_URL, CF_API_TOKEN
+
+    if len(sys.argv) < 2 or sys.argv[1] != "sync":
+        print("Usage: python subscribers.py sync [--full]")
+        sys.exit(1)
+    subscriptions = sync_subscribers(CLOUDFLARE_WORKER_URL, CF_API_TOKEN, full="--full" in sys.argv)
+    print(f"{len(subscriptions)} subscribers cached in {SUBSCRIBER_CACHE_FILE}.")
+    for beach, emails in sorted(build_beach_index(subscriptions).items()):
+        print(f"  {beach}: {len(emails)}")
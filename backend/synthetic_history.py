@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Generates simulated history rows offline, for backfills and load tests.
+
+Each beach is simulated day by day as a sequence of events rather than
+independent daily draws: a beach stays green until an advisory (yellow) or a
+closure (red) starts, and that event then lasts a random number of days from
+OUTAGE_DAYS before the beach reopens. Event start rates are derived from the
+status weights so that, over a long run, the share of days in each status
+matches the weights.
+
+The same seed, beach list and start date always produce the same rows. Rows are
+formatted straight into CSV lines (one record per beach per day) and appended
+in large buffered writes under the history file lock, so ten years of a
+thousand beaches takes seconds rather than the minutes a row-by-row writer needs.
+
+Usage:
+    python synthetic_history.py generate OUTPUT.csv [--days N] [--beaches N] [--seed N]
+"""
+
+import io
+import os
+import csv
+import random
+from datetime import datetime, timedelta, timezone
+
+from history_writer import HISTORY_HEADER, locked_append
+from history_intervals import intervals_path, build_from_csv
+
+# Share of days spent in each status over a long run
+DEFAULT_STATUS_WEIGHTS = {'green': 85, 'yellow': 12, 'red': 3}
+# Inclusive (min, max) length in days of an advisory or closure
+OUTAGE_DAYS = {'yellow': (1, 4), 'red': (2, 7)}
+
+EVENT_NOTES = {
+    'green': ['Open'],
+    'yellow': ['Alert Category 1 BGA level', 'Advisory posted'],
+    'red': ['Alert Category 3 BGA level', 'Closed due to contamination'],
+}
+
+# Rows are written in chunks of about this many bytes
+WRITE_CHUNK_BYTES = 1 << 20
+
+
+def synthetic_beach_names(count, known_names=()):
+    """known_names first, then numbered placeholder beaches up to count."""
+    names = list(known_names)[:count]
+    names += [f"Synthetic Beach {index:04d}" for index in range(len(names) + 1, count + 1)]
+    return names
+
+
+def _csv_field(text):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='').writerow([text])
+    return buffer.getvalue()
+
+
+def event_start_rates(status_weights=None, outage_days=None):
+    """
+    Per-day probability that an event of each non-green status starts on a green day.
+    A status with share f and mean length D starts with probability f / (f_green * D).
+    """
+    status_weights = status_weights or DEFAULT_STATUS_WEIGHTS
+    outage_days = outage_days or OUTAGE_DAYS
+    total = sum(status_weights.values())
+    green_share = status_weights.get('green', 0) / total
+    if green_share <= 0:
+        raise ValueError("status_weights needs a positive weight for green")
+
+    rates = []
+    for status, weight in status_weights.items():
+        if status == 'green' or weight <= 0:
+            continue
+        low, high = outage_days[status]
+        rates.append((status, weight / total / (green_share * (low + high) / 2)))
+    if sum(rate for _, rate in rates) >= 1:
+        raise ValueError("status weights leave too few green days for the outage durations")
+    return rates
+
+
+def generate_history_lines(beach_names, days, start=None, seed=None, status_weights=None, outage_days=None):
+    """
+    Yields one chunk of CSV lines (str, header excluded) per simulated day.
+    Every beach gets one record per day at the same time of day as start.
+    """
+    rng = random.Random(seed)
+    outage_days = outage_days or OUTAGE_DAYS
+    rates = event_start_rates(status_weights, outage_days)
+    if start is None:
+        start = datetime.now(timezone.utc).replace(microsecond=0) - timedelta(days=days)
+
+    # Everything that doesn't change from row to row is formatted once
+    quoted_names = [_csv_field(name) for name in beach_names]
+    quoted_notes = {status: [_csv_field(note) for note in notes] for status, notes in EVENT_NOTES.items()}
+    open_suffix = f",green,{{}},{quoted_notes['green'][0]}\r\n"
+
+    # Per beach: days left in the current event, and the ",status,pdf date,note" tail of its rows
+    remaining = [0] * len(beach_names)
+    first_pdf_date = start.strftime('%b %d %Y %I:%M%p')
+    tails = [open_suffix.format(first_pdf_date)] * len(beach_names)
+
+    for day in range(days):
+        record_time = start + timedelta(days=day)
+        timestamp = record_time.isoformat()
+        pdf_date = None
+        lines = []
+        for index in range(len(beach_names)):
+            left = remaining[index]
+            if left > 1:
+                remaining[index] = left - 1
+            else:
+                if left == 1:
+                    # The event ends today: the beach reopens and the report row is updated
+                    remaining[index] = 0
+                    pdf_date = pdf_date or record_time.strftime('%b %d %Y %I:%M%p')
+                    tails[index] = open_suffix.format(pdf_date)
+                draw = rng.random()
+                for status, rate in rates:
+                    if draw < rate:
+                        low, high = outage_days[status]
+                        remaining[index] = rng.randint(low, high)
+                        pdf_date = pdf_date or record_time.strftime('%b %d %Y %I:%M%p')
+                        note = rng.choice(quoted_notes[status])
+                        tails[index] = f",{status},{pdf_date},{note}\r\n"
+                        break
+                    draw -= rate
+            lines.append(timestamp + ',' + quoted_names[index] + tails[index])
+        yield ''.join(lines)
+
+
+def write_synthetic_history(history_file, beach_names, days, start=None, seed=None,
+                            status_weights=None, outage_days=None, keep_intervals=False):
+    """
+    Appends generated rows to history_file (writing the header if it is new) and
+    returns the number of rows written. As with HistoryWriter, the interval file
+    is brought up to date when keep_intervals is set or it already exists.
+    """
+    with locked_append(history_file) as (f, size):
+        if size == 0:
+            f.write(HISTORY_HEADER.encode('utf-8'))
+
+        pending = []
+        pending_bytes = 0
+        for chunk in generate_history_lines(beach_names, days, start, seed, status_weights, outage_days):
+            pending.append(chunk)
+            pending_bytes += len(chunk)
+            if pending_bytes >= WRITE_CHUNK_BYTES:
+                f.write(''.join(pending).encode('utf-8'))
+                pending, pending_bytes = [], 0
+        f.write(''.join(pending).encode('utf-8'))
+        f.flush()
+        os.fsync(f.fileno())
+
+        if keep_intervals or os.path.exists(intervals_path(history_file)):
+            build_from_csv(history_file).save(intervals_path(history_file))
+
+    return len(beach_names) * days
+
+
+if __name__ == "__main__":
+    import sys
+    import time
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate simulated beach history offline")
+    commands = parser.add_subparsers(dest="command")
+    generate_command = commands.add_parser("generate", help="append simulated rows to a history CSV")
+    generate_command.add_argument("output", help="CSV file to append to (created with a header if missing)")
+    generate_command.add_argument("--days", type=int, default=365)
+    generate_command.add_argument("--beaches", type=int, default=None,
+                                  help="number of beaches (default: the beaches in BEACH_COORDINATES)")
+    generate_command.add_argument("--seed", type=int, default=None)
+    generate_command.add_argument("--start", help="first day as YYYY-MM-DD (default: DAYS days ago)")
+    args = parser.parse_args()
+
+    if args.command != "generate":
+        parser.print_help()
+        sys.exit(1)
+
+    from check_status import BEACH_COORDINATES
+    names = synthetic_beach_names(args.beaches or len(BEACH_COORDINATES), BEACH_COORDINATES)
+    start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc) if args.start else None
+
+    began = time.perf_counter()
+    rows = write_synthetic_history(args.output, names, args.days, start=start, seed=args.seed)
+    print(f"✅ Wrote {rows} rows ({len(names)} beaches x {args.days} days) to {args.output} "
+          f"in {time.perf_counter() - began:.1f}s")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Builds small PDFs shaped like the City of Burlington swim-water report:
+one page, one ruled table with Beach / Status / Date Updated / Notes columns.
+
+They are used as offline fixtures for the parsing benchmarks, so they only rely on
+the standard Helvetica font (the status column carries no emoji indicators; the
+note text decides the status, as it does in validate_status).
+
+Usage:
+    python synthetic_report.py fixtures [output_dir]
+"""
+
+import os
+
+COLUMN_HEADERS = ['Beach', 'Status', 'Date Updated', 'Notes']
+DEFAULT_COLUMN_WIDTHS = (170, 60, 110, 200)
+
+# A fixed mix of notes so fixtures cover every status validate_status can return
+SAMPLE_NOTES = [
+    'Open',
+    'Alert Category 2 BGA level',
+    'Open',
+    'Closed due to E. coli levels above the state standard',
+    'Open',
+    'Alert Category 1 BGA level',
+]
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def build_report_pdf(rows, column_widths=DEFAULT_COLUMN_WIDTHS, row_height=22, left=40, top=700,
+                     font_size=9, page_height=792):
+    """
+    Returns the bytes of a one-page PDF with rows (header included) drawn as a ruled table.
+    A cell may contain newlines; each line is drawn below the previous one.
+    """
+    ops = ["0.5 w"]
+    table_width = sum(column_widths)
+    table_height = row_height * len(rows)
+
+    for index in range(len(rows) + 1):
+        y = top - index * row_height
+        ops.append(f"{left} {y} m {left + table_width} {y} l S")
+    x = left
+    for width in (0,) + tuple(column_widths):
+        x += width
+        ops.append(f"{x} {top} m {x} {top - table_height} l S")
+
+    for row_index, row in enumerate(rows):
+        x = left
+        for column_index, width in enumerate(column_widths):
+            cell = row[column_index] if column_index < len(row) else None
+            if cell:
+                lines = str(cell).split("\n")
+                first_baseline = top - row_index * row_height - font_size - 2
+                for line_index, line in enumerate(lines):
+                    y = first_baseline - line_index * (font_size + 1)
+                    ops.append(f"BT /F1 {font_size} Tf {x + 4} {y} Td ({_escape(line)}) Tj ET")
+            x += width
+
+    content = "\n".join(ops).encode('latin-1', errors='replace')
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 " + str(page_height).encode() + b"] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(content)).encode() + b" >>\nstream\n" + content + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+    ]
+
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        pdf += f"{offset:010d} 00000 n \n".encode()
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return pdf
+
+
+def report_rows(beaches):
+    """Turns status.json-style beach dictionaries into report table rows, header included."""
+    return [COLUMN_HEADERS] + [[beach['beach_name'], '', beach['date'], beach['note']] for beach in beaches]
+
+
+def build_tall_report_pdf(rows, row_height=14, font_size=7):
+    """A report with a page tall enough for every row, for tables too long for a letter-size page."""
+    top = row_height * len(rows) + 40
+    return build_report_pdf(rows, row_height=row_height, font_size=font_size, top=top, page_height=top + 40)
+
+
+def sample_beaches(beach_names):
+    """Deterministic beach records for the given names, cycling through SAMPLE_NOTES."""
+    return [
+        {
+            'beach_name': name,
+            'date': f"Aug {index % 28 + 1} 2025 {index % 12 + 1}:{index * 7 % 60:02d}AM",
+            'note': SAMPLE_NOTES[index % len(SAMPLE_NOTES)]
+        }
+        for index, name in enumerate(beach_names)
+    ]
+
+
+def write_fixtures(output_dir, beach_names):
+    """Writes the benchmark fixture set: standard and alternative layouts plus malformed rows."""
+    os.makedirs(output_dir, exist_ok=True)
+    rows = report_rows(sample_beaches(beach_names))
+
+    multiline = [list(row) for row in rows]
+    for row in multiline[1:]:
+        if len(row[3]) > 12:
+            words = row[3].split(" ")
+            row[3] = " ".join(words[:2]) + "\n" + " ".join(words[2:])
+
+    malformed = [list(row) for row in rows]
+    malformed[3] = ['', '', '', '']                               # blank row
+    malformed[5] = [malformed[5][0], '', '', '']                  # missing date and note
+    malformed.insert(7, ['Unlisted Beach', '', 'N/A', 'Closed'])  # beach missing from BEACH_COORDINATES
+
+    many = [COLUMN_HEADERS] + [row for _ in range(4) for row in rows[1:]]
+
+    fixtures = {
+        'standard.pdf': build_report_pdf(rows),
+        'wide_layout.pdf': build_report_pdf(rows, column_widths=(140, 40, 150, 220), row_height=30, top=650),
+        'multiline_notes.pdf': build_report_pdf(multiline, row_height=30),
+        'malformed_rows.pdf': build_report_pdf(malformed),
+        'many_rows.pdf': build_report_pdf(many, row_height=15, font_size=8, top=740),
+    }
+    for name, pdf in fixtures.items():
+        with open(os.path.join(output_dir, name), 'wb') as f:
+            f.write(pdf)
+        print(f"Wrote {os.path.join(output_dir, name)} ({len(pdf)} bytes)")
+
+
+if __name__ == "__main__":
+    import sys
+    if len(sys.argv) > 1 and sys.argv[1] == "fixtures":
+        from check_status import BEACH_COORDINATES
+        output_dir = sys.argv[2] if len(sys.argv) > 2 else 'report_fixtures'
+        write_fixtures(output_dir, list(BEACH_COORDINATES))
+    else:
+        print("Usage: python synthetic_report.py fixtures [output_dir]")
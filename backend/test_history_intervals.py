@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the interval-encoded history (history_intervals.py).
+
+Run with: python -m pytest test_history_intervals.py
+"""
+
+import os
+import csv
+import random
+from datetime import datetime, timedelta, timezone
+
+from history_writer import HistoryWriter
+from history_intervals import (build_from_csv, load_current, load_latest_intervals, intervals_path,
+                               open_intervals_path, OpenIntervals)
+
+START = datetime(2025, 6, 1, 12, tzinfo=timezone.utc)
+BEACHES = ["Leddy Beach North", "Leddy Beach South", "North Beach", "Oakledge Cove"]
+
+
+def _rows(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def _check(history_file, rng, runs, first_run=0, flappy=True):
+    """Appends one row per beach per run, like the checker; Leddy Beach North never changes."""
+    status = dict.fromkeys(BEACHES, "green")
+    for run in range(first_run, first_run + runs):
+        # Real checks don't land on exact 15-minute marks
+        moment = START + timedelta(minutes=15 * run, seconds=rng.randint(0, 59))
+        writer = HistoryWriter(history_file, keep_intervals=True)
+        for position, beach in enumerate(BEACHES):
+            if flappy and beach != "Leddy Beach North" and rng.random() < 0.1:
+                status[beach] = rng.choice(["green", "yellow", "red"])
+            writer.add({'beach_name': beach, 'status': status[beach], 'date': f"Jun 1 2025 0{run % 9 + 1}:00AM",
+                        'note': status[beach].title()}, moment + timedelta(microseconds=position))
+        writer.flush()
+
+
+def test_appended_history_matches_a_fresh_build(tmp_path):
+    history_file = str(tmp_path / 'historical_status.csv')
+    _check(history_file, random.Random(7), 300)
+
+    history = load_current(history_file)
+    fresh = build_from_csv(history_file)
+    assert list(history.iter_rows()) == _rows(history_file)
+    assert sorted(map(repr, history.intervals)) == sorted(map(repr, fresh.intervals))
+    assert load_latest_intervals(history_file)["Leddy Beach North"]["count"] == 300
+    # Closed intervals were folded out of the tail and the old generations removed
+    assert OpenIntervals.load(intervals_path(history_file)).generation > 0
+    assert len([name for name in os.listdir(tmp_path) if '_tail' in name]) == 1
+
+
+def test_open_interval_file_does_not_grow_with_the_interval(tmp_path):
+    history_file = str(tmp_path / 'historical_status.csv')
+    rng = random.Random(3)
+    _check(history_file, rng, 10, flappy=False)
+    size = os.path.getsize(open_intervals_path(intervals_path(history_file)))
+    _check(history_file, rng, 200, first_run=10, flappy=False)
+
+    # Only the counts' digits can add a byte or two
+    assert os.path.getsize(open_intervals_path(intervals_path(history_file))) <= size + len(BEACHES) * 2
+    assert list(load_current(history_file).iter_rows()) == _rows(history_file)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the history CSV appends (history_writer.py).
+
+Run with: python -m pytest test_history_writer.py
+"""
+
+import os
+import csv
+import shutil
+
+import pytest
+
+from history_writer import HistoryWriter, HISTORY_HEADER, locked_append, batch_marker_path
+
+FAKE_HISTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fake_historical_status.csv')
+BEACH = {'beach_name': 'Oakledge Cove', 'status': 'green', 'date': 'Aug 2 2025 8:00AM', 'note': 'Open'}
+
+
+def _rows(path):
+    with open(path, 'r', newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_last_row_without_newline_is_kept(tmp_path):
+    history_file = str(tmp_path / 'history.csv')
+    shutil.copy(FAKE_HISTORY, history_file)
+    with open(history_file, 'rb') as f:
+        assert not f.read().endswith(b'\n')
+    before = _rows(history_file)
+
+    writer = HistoryWriter(history_file)
+    writer.add(BEACH)
+    writer.flush()
+
+    after = _rows(history_file)
+    assert after[:-1] == before
+    assert after[-1]['beach_name'] == 'Oakledge Cove'
+    assert before[-1]['beach_name'] == 'Blodgett Water Access Point'
+
+
+def test_failed_batch_is_rolled_back(tmp_path):
+    history_file = str(tmp_path / 'history.csv')
+    writer = HistoryWriter(history_file)
+    writer.add(BEACH)
+    writer.flush()
+    with open(history_file, 'rb') as f:
+        committed = f.read()
+
+    with pytest.raises(RuntimeError):
+        with locked_append(history_file) as (f, size):
+            # Two whole rows and part of a third, then the writer fails
+            f.write(b'2025-08-03T00:00:00+00:00,A,green,x,Open\r\n2025-08-03T00:00:00+00:00,B,green,x,Open\r\n2025-08')
+            raise RuntimeError("disk full")
+
+    with open(history_file, 'rb') as f:
+        assert f.read() == committed
+    assert not os.path.exists(batch_marker_path(history_file))
+
+
+def test_batch_of_a_crashed_writer_is_rolled_back(tmp_path):
+    history_file = str(tmp_path / 'history.csv')
+    with open(history_file, 'w', newline='', encoding='utf-8') as f:
+        f.write(HISTORY_HEADER)
+    size = os.path.getsize(history_file)
+
+    # A writer died after appending complete rows of its batch but before committing it
+    with open(batch_marker_path(history_file), 'w', encoding='utf-8') as f:
+        f.write(str(size))
+    with open(history_file, 'a', newline='', encoding='utf-8') as f:
+        f.write('2025-08-03T00:00:00+00:00,A,green,x,Open\r\n')
+
+    writer = HistoryWriter(history_file)
+    writer.add(BEACH)
+    writer.flush()
+
+    assert [row['beach_name'] for row in _rows(history_file)] == ['Oakledge Cove']
+    assert not os.path.exists(batch_marker_path(history_file))
+
+
+def test_torn_fragment_is_discarded(tmp_path):
+    history_file = str(tmp_path / 'history.csv')
+    with open(history_file, 'w', newline='', encoding='utf-8') as f:
+        f.write(HISTORY_HEADER + '2025-08-03T00:00:00+00:00,A,green,x,Open\r\n2025-08-04T00:00:00+00:00,B,gr')
+
+    writer = HistoryWriter(history_file)
+    writer.add(BEACH)
+    writer.flush()
+
+    assert [row['beach_name'] for row in _rows(history_file)] == ['A', 'Oakledge Cove']
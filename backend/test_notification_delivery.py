@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Regression tests for pooled email delivery through the dispatcher
+(email_delivery.py, notification_dispatcher.py), against the local smtp_sink.
+
+Run with: python -m pytest test_notification_delivery.py
+"""
+
+import pytest
+
+from smtp_sink import SMTPSink
+from email_delivery import SMTPPool, make_email_sender
+from notification_dispatcher import NotificationDispatcher, make_job
+
+SENDER = "beach-status@example.com"
+
+
+@pytest.fixture
+def sink(request):
+    server = SMTPSink(reject_logins=getattr(request, "param", False)).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _dispatch(sink, recipients, size=2):
+    pool = SMTPPool('127.0.0.1', sink.port, SENDER, "password", size=size, use_starttls=False)
+    dispatcher = NotificationDispatcher({"email": make_email_sender(pool, SENDER)}, concurrency=4,
+                                        rate_limits={}, max_attempts=4, sleep=lambda seconds: None)
+    jobs = [make_job("email", recipient, "Beach Status Change!", "Leddy Park Beach is now RED.")
+            for recipient in recipients]
+    try:
+        return dispatcher.dispatch(jobs)
+    finally:
+        pool.close()
+
+
+def test_emails_are_delivered_over_pooled_sessions(sink):
+    undelivered = _dispatch(sink, [f"subscriber{i}@example.com" for i in range(20)])
+
+    assert undelivered == []
+    assert sink.messages == 20
+    assert sink.logins <= 2
+
+
+@pytest.mark.parametrize("sink", [True], indirect=True)
+def test_refused_login_stops_the_dispatch_once(sink):
+    recipients = [f"subscriber{i}@example.com" for i in range(50)]
+    undelivered = _dispatch(sink, recipients)
+
+    # At most one refused login per pooled session (smtplib tries both PLAIN
+    # and LOGIN), not several per job
+    assert sink.logins <= 2 * 2
+    assert sink.messages == 0
+    assert sorted(job["recipient"] for job in undelivered) == sorted(recipients)
+    assert all(job["attempts"] <= 1 for job in undelivered)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the cached subscriber sync (subscribers.py), against the
+stand-in Worker from load_simulator.py.
+
+Run with: python -m pytest test_subscribers.py
+"""
+
+import pytest
+
+from load_simulator import StandInServer, SIMULATION_API_TOKEN
+from subscribers import sync_subscribers, load_subscriber_cache, save_subscriber_cache, build_beach_index
+from check_status import group_changes_by_recipient
+from notification_dispatcher import NotificationDispatcher, make_job
+
+BEACH = "Leddy Beach South"
+KEPT = "kept@example.com"
+REMOVED = "removed@example.com"
+SIGNED_UP_MS = 1_750_000_000_000
+
+
+@pytest.fixture
+def worker():
+    server = StandInServer().start()
+    server.add_subscribers([(KEPT, [BEACH]), (REMOVED, [BEACH])], SIGNED_UP_MS)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    return str(tmp_path / "subscriber_cache.json")
+
+
+def _emailed(subscribers):
+    """Recipients the checker would email for a status change at BEACH."""
+    change = {"beach_name": BEACH, "old_status": "green", "new_status": "red", "note": "Closed"}
+    sent = []
+    dispatcher = NotificationDispatcher({"email": lambda job: sent.append(job["recipient"])}, rate_limits={})
+    jobs = [make_job("email", email, "Beach Status Change!", message)
+            for message, emails in group_changes_by_recipient([change], build_beach_index(subscribers)).items()
+            for email in emails]
+    assert dispatcher.dispatch(jobs) == []
+    return sent
+
+
+def test_unsubscribed_subscriber_is_not_emailed(worker, cache_file):
+    assert sorted(_emailed(sync_subscribers(worker.url, SIMULATION_API_TOKEN, cache_file))) == [KEPT, REMOVED]
+
+    worker.remove_subscribers([REMOVED], SIGNED_UP_MS + 60_000)
+    subscribers = sync_subscribers(worker.url, SIMULATION_API_TOKEN, cache_file)
+
+    assert _emailed(subscribers) == [KEPT]
+    assert list(load_subscriber_cache(cache_file)["subscriptions"]) == [KEPT]
+
+
+def test_resubscribing_after_unsubscribing_keeps_the_subscriber(worker, cache_file):
+    sync_subscribers(worker.url, SIMULATION_API_TOKEN, cache_file)
+    worker.remove_subscribers([REMOVED], SIGNED_UP_MS + 60_000)
+    worker.add_subscribers([(REMOVED, [BEACH])], SIGNED_UP_MS + 120_000)
+
+    assert sorted(sync_subscribers(worker.url, SIMULATION_API_TOKEN, cache_file)) == [KEPT, REMOVED]
+
+
+def test_stale_cache_is_fully_resynced(worker, cache_file):
+    sync_subscribers(worker.url, SIMULATION_API_TOKEN, cache_file)
+    # A KV key deleted by hand leaves no tombstone and doesn't change the version
+    worker.remove_subscribers([REMOVED], SIGNED_UP_MS + 60_000, tombstone=False)
+    assert sorted(sync_subscribers(worker.url, SIMULATION_API_TOKEN, cache_file)) == [KEPT, REMOVED]
+
+    cache = load_subscriber_cache(cache_file)
+    cache["full_synced_at"] = 0
+    save_subscriber_cache(cache, cache_file)
+
+    assert _emailed(sync_subscribers(worker.url, SIMULATION_API_TOKEN, cache_file)) == [KEPT]
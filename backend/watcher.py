@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Long-running watcher that runs the status check on an adaptive schedule.
+
+The hourly workflow pays for a checkout, a pip install and a cold interpreter
+on every run, and a change can sit unnoticed for up to an hour. The watcher
+keeps one process (and its HTTP connection) alive and polls:
+
+- every WATCH_FAST_INTERVAL seconds during swim-season daytime,
+- every WATCH_SLOW_INTERVAL seconds at night, WATCH_OFF_SEASON_INTERVAL off season,
+- every WATCH_AFTER_CHANGE_INTERVAL seconds for a while after a status change,
+
+stretching the interval (up to WATCH_UNCHANGED_MAX_FACTOR times) while the report
+stays unchanged, and backing off exponentially while checks fail. Each check is a
+conditional request, so a quiet poll costs one 304 and no PDF parse. In digest
+mode (see notification_digest.py) the next check is also brought forward to
+when held notifications are due.
+
+After every check a heartbeat is written to WATCH_HEARTBEAT_FILE; `health`
+exits non-zero when it is older than the expected next check.
+
+Usage:
+    python watcher.py run
+    python watcher.py health [grace_seconds]
+"""
+
+import os
+import json
+import time
+import random
+import signal
+import threading
+from datetime import datetime, timedelta, timezone
+
+from notification_digest import DigestScheduler, digest_mode_enabled
+
+try:
+    from zoneinfo import ZoneInfo
+    LOCAL_TZ = ZoneInfo(os.environ.get("WATCH_TIMEZONE", "America/New_York"))
+except Exception:
+    # No tz database available; fall back to the machine's local time
+    LOCAL_TZ = None
+
+WATCH_HEARTBEAT_FILE = os.environ.get("WATCH_HEARTBEAT_FILE", "watcher_heartbeat.json")
+
+WATCH_FAST_INTERVAL = int(os.environ.get("WATCH_FAST_INTERVAL", "180"))
+WATCH_SLOW_INTERVAL = int(os.environ.get("WATCH_SLOW_INTERVAL", "900"))
+WATCH_OFF_SEASON_INTERVAL = int(os.environ.get("WATCH_OFF_SEASON_INTERVAL", "3600"))
+WATCH_AFTER_CHANGE_INTERVAL = int(os.environ.get("WATCH_AFTER_CHANGE_INTERVAL", "90"))
+# How long after a change the watcher keeps polling at the after-change interval
+WATCH_AFTER_CHANGE_WINDOW = int(os.environ.get("WATCH_AFTER_CHANGE_WINDOW", "1800"))
+WATCH_UNCHANGED_MAX_FACTOR = float(os.environ.get("WATCH_UNCHANGED_MAX_FACTOR", "2"))
+WATCH_MAX_FAILURE_INTERVAL = int(os.environ.get("WATCH_MAX_FAILURE_INTERVAL", "3600"))
+
+# Swim season as MM-DD (inclusive) and daytime as local hours [start, end)
+WATCH_SEASON = (os.environ.get("WATCH_SEASON_START", "05-25"), os.environ.get("WATCH_SEASON_END", "09-15"))
+WATCH_DAY_HOURS = (int(os.environ.get("WATCH_DAY_START", "7")), int(os.environ.get("WATCH_DAY_END", "21")))
+
+
+def _local_now(now):
+    return now.astimezone(LOCAL_TZ) if LOCAL_TZ else now.astimezone()
+
+
+def base_interval(now):
+    """The polling interval for the time of year and day, before any adjustment."""
+    local = _local_now(now)
+    if not WATCH_SEASON[0] <= local.strftime("%m-%d") <= WATCH_SEASON[1]:
+        return WATCH_OFF_SEASON_INTERVAL
+    if WATCH_DAY_HOURS[0] <= local.hour < WATCH_DAY_HOURS[1]:
+        return WATCH_FAST_INTERVAL
+    return WATCH_SLOW_INTERVAL
+
+
+def next_interval(now, result, state):
+    """
+    Picks the delay before the next check from the last result and the
+    watcher's state (consecutive failures, unchanged streak, last change).
+    """
+    from check_status import CHECK_FAILED
+
+    if result == CHECK_FAILED:
+        delay = WATCH_FAST_INTERVAL * 2 ** (state["failures"] - 1)
+        # Jitter so a recovering source isn't hit on a fixed beat
+        return min(WATCH_MAX_FAILURE_INTERVAL, delay * random.uniform(0.8, 1.2))
+
+    if state["last_change_at"] and now - state["last_change_at"] < timedelta(seconds=WATCH_AFTER_CHANGE_WINDOW):
+        return WATCH_AFTER_CHANGE_INTERVAL
+
+    # Each unchanged check stretches the interval by 10%, up to the cap
+    factor = min(WATCH_UNCHANGED_MAX_FACTOR, 1.1 ** state["unchanged"])
+    return base_interval(now) * factor
+
+
+def write_heartbeat(state, heartbeat_file=WATCH_HEARTBEAT_FILE):
+    heartbeat = {
+        key: value.isoformat() if isinstance(value, datetime) else value
+        for key, value in state.items()
+    }
+    temp_file = heartbeat_file + '.tmp'
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(heartbeat, f, indent=2)
+    os.replace(temp_file, heartbeat_file)
+
+
+def check_health(grace_seconds=300, heartbeat_file=WATCH_HEARTBEAT_FILE):
+    """Returns (healthy, reason) from the heartbeat file."""
+    try:
+        with open(heartbeat_file, 'r', encoding='utf-8') as f:
+            heartbeat = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False, f"no heartbeat in {heartbeat_file}"
+
+    next_check_at = datetime.fromisoformat(heartbeat["next_check_at"])
+    overdue = (datetime.now(timezone.utc) - next_check_at).total_seconds()
+    if overdue > grace_seconds:
+        return False, f"next check was due {overdue:.0f}s ago (pid {heartbeat['pid']})"
+    return True, (f"last check {heartbeat['last_check_at']} was {heartbeat['last_result']}, "
+                  f"{heartbeat['failures']} consecutive failures")
+
+
+def run_watcher(heartbeat_file=WATCH_HEARTBEAT_FILE):
+    # Imported once here so every check runs in the same warm process
+    import check_status
+
+    stop = threading.Event()
+
+    def request_stop(signum, frame):
+        print(f"Received signal {signum}; stopping after the current check.")
+        stop.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    state = {
+        "pid": os.getpid(),
+        "started_at": datetime.now(timezone.utc),
+        "checks": 0,
+        "failures": 0,
+        "unchanged": 0,
+        "last_check_at": None,
+        "last_result": None,
+        "last_change_at": None,
+        "next_check_at": datetime.now(timezone.utc),
+    }
+    print(f"👀 Watching the beach report (pid {state['pid']}, heartbeat {heartbeat_file})")
+
+    while not stop.is_set():
+        start = time.perf_counter()
+        try:
+            result = check_status.main()
+        except Exception as e:
+            print(f"Check failed with an unexpected error: {e}")
+            result = check_status.CHECK_FAILED
+
+        now = datetime.now(timezone.utc)
+        state["checks"] += 1
+        state["last_check_at"] = now
+        state["last_result"] = result
+        state["failures"] = state["failures"] + 1 if result == check_status.CHECK_FAILED else 0
+        state["unchanged"] = state["unchanged"] + 1 if result == check_status.CHECK_UNCHANGED else 0
+        if result == check_status.CHECK_CHANGED:
+            state["last_change_at"] = now
+
+        delay = next_interval(now, result, state)
+        if digest_mode_enabled():
+            # Wake up in time to send held notifications once they settle
+            due_at = DigestScheduler.load().next_due_at()
+            if due_at:
+                delay = max(1, min(delay, (due_at - now).total_seconds()))
+        state["next_check_at"] = now + timedelta(seconds=delay)
+        write_heartbeat(state, heartbeat_file)
+        print(f"Check #{state['checks']} {result} in {time.perf_counter() - start:.1f}s; "
+              f"next check in {delay:.0f}s")
+
+        stop.wait(delay)
+
+    print("Watcher stopped.")
+
+
+if __name__ == "__main__":
+    import sys
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command == "run":
+        run_watcher()
+    elif command == "health":
+        healthy, reason = check_health(int(sys.argv[2]) if len(sys.argv) > 2 else 300)
+        print(("✅ healthy: " if healthy else "❌ unhealthy: ") + reason)
+        sys.exit(0 if healthy else 1)
+    else:
+        print("Usage: python watcher.py run | health [grace_seconds]")
+        sys.exit(1)